@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark covariance assembly on a synthetic errorr-like block structure.
+
+Compares the original pandas-query assembly (reproduced below) against
+`openmc_uq.covariance.BlockCov`, for both the dense matrix and the
+(MAT, MT, E) MultiIndex built in `get_cov`.
+
+    python3 benchmarks/bench_cov_assembly.py --n-mt 40 --n-groups 33
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from openmc_uq.covariance import BlockCov
+
+
+def synthetic_blocks(n_mt: int, n_groups: int, density: float = 0.2, seed: int = 0):
+    """Random MF33-like blocks: every MT has a variance block, a fraction are cross-correlated."""
+    rng = np.random.default_rng(seed)
+    mts = sorted(rng.choice(np.arange(1, 900), size=n_mt, replace=False).tolist())
+
+    blocks = {}
+    for i, mt in enumerate(mts):
+        a = rng.standard_normal((n_groups, n_groups)) * 0.01
+        blocks[(mt, mt)] = a @ a.T
+        for mt1 in mts[i + 1:]:
+            if rng.random() < density:
+                blocks[(mt, mt1)] = rng.standard_normal((n_groups, n_groups)) * 1e-5
+
+    energy_grid = np.logspace(-5, 7.3, n_groups + 1)
+    return 125, mts, energy_grid, blocks
+
+
+def legacy_assembly(mat, mts, energy_grid, blocks):
+    """The original `_build_cov_matrix` + `get_cov` index construction."""
+    eg = pd.IntervalIndex.from_breaks(energy_grid)
+
+    ix = pd.DataFrame([(mat, 33, mt) for mt in mts], columns=["MAT", "MF", "MT"])[["MAT", "MT"]]
+    ix["IMIN"] = ix.index * eg.size
+    ix["IMAX"] = (ix.index + 1) * eg.size
+
+    nsize = ix.shape[0] * eg.size
+    c = np.zeros((nsize, nsize))
+
+    for (mt, mt1), cov in blocks.items():
+        ivals = ix.query("MAT==@mat & MT==@mt").squeeze()
+        jvals = ix.query("MAT==@mat & MT==@mt1").squeeze()
+        c[ivals.IMIN:ivals.IMAX, jvals.IMIN:jvals.IMAX] = cov
+        if mt != mt1:
+            c[jvals.IMIN:jvals.IMAX, ivals.IMIN:ivals.IMAX] = cov.T
+
+    idx = pd.MultiIndex.from_tuples(
+        [(mat, mt, e) for _, (mat, mt) in ix[["MAT", "MT"]].iterrows() for e in eg],
+        names=["MAT", "MT", "E"],
+    )
+    return c, idx
+
+
+def blockcov_assembly(mat, mts, energy_grid, blocks):
+    block_cov = BlockCov(mat, mts, energy_grid, blocks)
+    return block_cov.to_dense(), block_cov.index()
+
+
+def _time(func, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-mt", type=int, nargs="+", default=[10, 40, 80])
+    parser.add_argument("--n-groups", type=int, default=33)
+    parser.add_argument("--density", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'MTs':>5} {'blocks':>7} {'size':>6} {'legacy [s]':>11} {'BlockCov [s]':>13} {'speedup':>8}")
+    for n_mt in args.n_mt:
+        data = synthetic_blocks(n_mt, args.n_groups, args.density)
+
+        t_old, (c_old, idx_old) = _time(legacy_assembly, *data)
+        t_new, (c_new, idx_new) = _time(blockcov_assembly, *data)
+
+        if not (np.array_equal(c_old, c_new) and idx_old.equals(idx_new)):
+            raise RuntimeError(f"Assemblies differ for {n_mt} MTs")
+
+        print(
+            f"{n_mt:>5} {len(data[3]):>7} {c_new.shape[0]:>6} "
+            f"{t_old:>11.4f} {t_new:>13.4f} {t_old / t_new:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
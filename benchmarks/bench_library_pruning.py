@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Benchmark the per-sample cross section library against the model-pruned one.
+
+On a synthetic library the size of TENDL and a synthetic model, times
+writing a sample's `cross_sections_rand.xml` (the original DataLibrary
+round trip if OpenMC is installed, the cached base library, and the cached
+library pruned to the model closure) and parsing the result, which OpenMC
+does at every start-up.
+
+With a real model and library, `--model` also measures the initialisation
+time and peak memory of `openmc.lib.init` in a fresh process for both
+libraries, and `--nuclide` the file size and read time of a reference
+nuclide before and after temperature pruning.
+
+    python3 benchmarks/bench_library_pruning.py --n-entries 2800 --n-model 40
+    python3 benchmarks/bench_library_pruning.py --model model_dir --cross-sections /data/tendl/cross_sections.xml --nuclide Fe56
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from openmc_uq.library import BaseLibrary, ModelClosure, load_library, model_closure, write_model_library
+
+
+def synthetic_library(directory: Path, n_entries: int) -> Path:
+    """A cross_sections.xml with `n_entries` neutron entries, plus thermal and photon data."""
+    lines = ["<?xml version='1.0' encoding='utf-8'?>", "<cross_sections>", "  <directory>data</directory>"]
+    for i in range(n_entries):
+        lines.append(f'  <library materials="X{i}" path="X{i}.h5" type="neutron" />')
+    for i in range(n_entries // 10):
+        lines.append(f'  <library materials="c_X{i}" path="c_X{i}.h5" type="thermal" />')
+        lines.append(f'  <library materials="E{i}" path="E{i}.h5" type="photon" />')
+    lines.append("</cross_sections>")
+    path = directory / "cross_sections.xml"
+    path.write_text("\n".join(lines))
+    return path
+
+
+def _time(func, *args, repeat: int = 5):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def legacy_write(cross_sections_xml, perturbed: dict, out_file):
+    """The original `_write_library`, minus `register_file` which needs real HDF5 files."""
+    import openmc.data
+
+    lib = openmc.data.DataLibrary.from_xml(cross_sections_xml)
+    for name, path in perturbed.items():
+        lib.libraries.append({"materials": [name], "path": str(path), "type": "neutron"})
+    lib.export_to_xml(out_file)
+    return out_file
+
+
+def bench_synthetic(n_entries: int, n_model: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cross_sections = synthetic_library(tmp, n_entries)
+        names = [f"X{i}" for i in np.linspace(0, n_entries - 1, n_model, dtype=int)]
+        closure = ModelClosure(names, thermal=["c_X0"])
+        perturbed = {f"{name}-rand0": tmp / f"{name}-rand0.h5" for name in names[:3]}
+
+        t_parse, library = _time(BaseLibrary, cross_sections)
+        rows = []
+        try:
+            t, out = _time(legacy_write, cross_sections, perturbed, tmp / "legacy.xml")
+            rows.append(("DataLibrary round trip", t, out))
+        except ImportError:
+            print("OpenMC not installed, skipping the DataLibrary round trip")
+        t, out = _time(library.write, tmp / "full.xml", perturbed)
+        rows.append(("cached base library", t, out))
+        t, out = _time(library.write, tmp / "pruned.xml", perturbed, closure)
+        rows.append(("cached, pruned", t, out))
+
+        print(f"{n_entries} entries, {n_model} model nuclides, base library parsed once in {t_parse:.4f} s")
+        print(f"  {'library':<24}{'write [s]':>11}{'entries':>9}{'size [kB]':>11}{'parse [s]':>11}")
+        for label, t, out in rows:
+            t_read, root = _time(lambda p: ET.parse(p).getroot(), out)
+            print(f"  {label:<24}{t:>11.4f}{len(root.findall('library')):>9}"
+                  f"{out.stat().st_size / 1e3:>11.1f}{t_read:>11.4f}")
+
+
+_INIT = """
+import json, os, resource, sys, time
+import openmc.lib
+os.chdir(sys.argv[1])
+start = time.perf_counter()
+openmc.lib.init(["-s", "1"])
+elapsed = time.perf_counter() - start
+openmc.lib.finalize()
+print(json.dumps({"init": elapsed, "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def bench_openmc_init(model: Path, cross_sections: Path, repeat: int) -> None:
+    """`openmc.lib.init` time and peak RSS with the full and the model-pruned library."""
+    from openmc_uq.model_xml import write_model_inputs
+    from openmc_uq.staging import stage_model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pruned = write_model_library(cross_sections, model, tmp / "cross_sections_model.xml")
+        print(f"  {'library':<10}{'init [s]':>10}{'peak RSS [MB]':>15}")
+        for label, library in (("full", cross_sections), ("pruned", pruned)):
+            run_dir = stage_model(model, tmp / label, mutable_files=("settings.xml",))
+            write_model_inputs(model, run_dir, {}, cross_sections=Path(library).resolve())
+            runs = []
+            for _ in range(repeat):
+                out = subprocess.run([sys.executable, "-c", _INIT, str(run_dir)], check=True,
+                                     capture_output=True, text=True).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+            print(f"  {label:<10}{min(r['init'] for r in runs):>10.3f}{min(r['maxrss_mb'] for r in runs):>15.1f}")
+
+
+def bench_temperatures(model: Path, cross_sections: Path, nuclide: str) -> None:
+    """Size and read time of a reference nuclide before and after temperature pruning."""
+    import openmc.data
+    from openmc_uq.direct import prune_temperatures
+
+    source = load_library(cross_sections).get(nuclide)
+    if source is None:
+        raise ValueError(f"{nuclide} is not in {cross_sections}")
+    data = openmc.data.IncidentNeutron.from_hdf5(source)
+    pruned = prune_temperatures(data, model_closure(model))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"  {'data':<8}{'temperatures':<40}{'size [MB]':>10}{'write [s]':>11}{'read [s]':>10}")
+        for label, d in (("full", data), ("pruned", pruned)):
+            path = os.path.join(tmp, f"{label}.h5")
+            t_write, _ = _time(d.export_to_hdf5, path, "w", repeat=1)
+            t_read, _ = _time(openmc.data.IncidentNeutron.from_hdf5, path, repeat=3)
+            print(f"  {label:<8}{' '.join(d.temperatures):<40}{os.path.getsize(path) / 1e6:>10.2f}"
+                  f"{t_write:>11.3f}{t_read:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-entries", type=int, default=2800, help="Neutron entries of the synthetic library")
+    parser.add_argument("--n-model", type=int, default=40, help="Nuclides of the synthetic model")
+    parser.add_argument("--model", type=Path, default=None, help="OpenMC model directory to initialise")
+    parser.add_argument("--cross-sections", type=Path, default=None, help="Library of --model")
+    parser.add_argument("--nuclide", default=None, help="Reference nuclide to prune temperatures of")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bench_synthetic(args.n_entries, args.n_model)
+
+    if args.model is not None:
+        if args.cross_sections is None:
+            parser.error("--model needs --cross-sections")
+        print(f"OpenMC initialisation of {args.model}")
+        bench_openmc_init(args.model.resolve(), args.cross_sections.resolve(), args.repeat)
+        if args.nuclide is not None:
+            print(f"Temperature pruning of {args.nuclide}")
+            bench_temperatures(args.model.resolve(), args.cross_sections.resolve(), args.nuclide)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+"""
+Offline benchmark suite of the sampling and run pipeline.
+
+Times each stage on synthetic data at several scales, without TENDL, NJOY
+or OpenMC: covariances and tapes come from `synthetic.py`, and NJOY,
+OpenMC and mpirun are replaced by the stand-ins in `benchmarks/stubs`
+(put first on PATH). Stages whose dependencies are missing (e.g. SANDY)
+are reported as skipped.
+
+Every run appends one JSON line per (scale, stage) to `--output`, with the
+commit, host and best/median times, and is compared with the previous run
+on the same host, flagging stages slower by more than `--threshold`:
+
+    python3 benchmarks/run_benchmarks.py --scales small medium
+    python3 benchmarks/run_benchmarks.py --only covariance run_openmc --repeat 5
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+from synthetic import (
+    synthetic_block_cov,
+    synthetic_mts,
+    synthetic_xs,
+    write_endf_dir,
+    write_errorr,
+    write_library,
+    write_model,
+    write_pendf,
+    write_statepoint,
+)
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+STUB_DIR = BENCHMARK_DIR / "stubs"
+
+SCALES = {
+    "small": {"n_mt": 10, "n_groups": 33, "n_points": 2000, "n_nuclides": 50, "n_model": 10,
+              "n_entries": 500, "mesh": 10, "n_samples": 10},
+    "medium": {"n_mt": 40, "n_groups": 33, "n_points": 20000, "n_nuclides": 500, "n_model": 40,
+               "n_entries": 2800, "mesh": 50, "n_samples": 100},
+    "large": {"n_mt": 80, "n_groups": 44, "n_points": 100000, "n_nuclides": 2800, "n_model": 100,
+              "n_entries": 2800, "mesh": 200, "n_samples": 1000},
+}
+
+
+def _time(func, *args, repeat: int = 3, **kwargs):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return times, out
+
+
+def bench_covariance(scale: dict, tmp: Path, repeat: int) -> dict:
+    """Covariance assembly, decomposition, SVD file I/O and the KL expansion."""
+    from openmc_uq.decomposition import decompose_blocks
+    from openmc_uq.svd_file import read_kl_basis, write_svd
+
+    block_cov = synthetic_block_cov(scale["n_mt"], scale["n_groups"])
+    timings = {}
+    timings["cov_assembly"], _ = _time(block_cov.to_dense, repeat=repeat)
+    timings["cov_index"], _ = _time(block_cov.index, repeat=repeat)
+    timings["decompose"], basis = _time(decompose_blocks, block_cov, "eigh", 99.9, repeat=repeat)
+
+    layout = block_cov.layout()
+    n_trunc = basis.n_truncated(99.9)
+    svd_file = tmp / "synthetic_SVD.h5"
+    timings["write_svd"], _ = _time(write_svd, svd_file, basis, n_trunc, layout=layout, repeat=repeat)
+    timings["read_kl_basis"], basis = _time(read_kl_basis, svd_file, n_trunc, repeat=repeat)
+
+    z = np.random.default_rng(0).standard_normal((n_trunc, scale["n_samples"]))
+    timings["kl_expand"], x = _time(basis.expand, z, repeat=repeat)
+    timings["kl_factors"], _ = _time(lambda: [layout.factors(x[:, i]) for i in range(x.shape[1])], repeat=repeat)
+    return timings
+
+
+def bench_errorr(scale: dict, tmp: Path, repeat: int) -> dict:
+    """Parsing of an errorr tape and extraction of its blocks, as in `svd_and_save_error`."""
+    import sandy
+    from openmc_uq.utils import get_block_cov
+
+    errorr_file = write_errorr(tmp / "synthetic.error", synthetic_block_cov(scale["n_mt"], scale["n_groups"]))
+    timings = {}
+    timings["parse_errorr"], errorr = _time(sandy.errorr.Errorr.from_file, errorr_file, repeat=repeat)
+    timings["get_block_cov"], _ = _time(get_block_cov, errorr, repeat=repeat)
+    return timings
+
+
+def bench_perturbation(scale: dict, tmp: Path, repeat: int) -> dict:
+    """The group-wise perturbation of pointwise cross sections."""
+    import pandas as pd
+    import sandy
+    from openmc_uq.sample_nuclide import _apply_perturbation
+
+    block_cov = synthetic_block_cov(scale["n_mt"], scale["n_groups"])
+    layout = block_cov.layout()
+    energy, values = synthetic_xs(layout.mts, scale["n_points"])
+    columns = pd.MultiIndex.from_arrays([[layout.mat] * len(layout.mts), layout.mts], names=["MAT", "MT"])
+    xs = sandy.Xs(pd.DataFrame(values, index=energy, columns=columns))
+
+    factors = layout.factors(np.random.default_rng(0).normal(0.0, 0.05, layout.size))
+    times, _ = _time(_apply_perturbation, xs, layout, factors, layout.mts, repeat=repeat)
+    return {"apply_perturbation": times}
+
+
+def bench_endf(scale: dict, tmp: Path, repeat: int) -> dict:
+    """ENDF file lookup (index build and per-nuclide queries) and covariance size estimates."""
+    from openmc_uq import endf_index
+    from openmc_uq.utils import get_nuclide_paths
+
+    endf_dir = tmp / "endf"
+    nuclides = write_endf_dir(endf_dir, scale["n_nuclides"], n_mt=10, n_points=100)
+    timings = {}
+
+    def cold_index():
+        endf_index._indices.clear()
+        for file in Path(os.environ["OPENMC_UQ_CACHE_DIR"]).glob("endf_index_*.json"):
+            file.unlink()
+        return endf_index.build_endf_index(endf_dir)
+
+    timings["endf_index_build"], _ = _time(cold_index, repeat=repeat)
+    timings["get_nuclide_paths"], paths = _time(get_nuclide_paths, str(endf_dir), nuclides, repeat=repeat)
+    if not all(paths):
+        raise RuntimeError("Synthetic nuclides not found in their ENDF directory")
+
+    from openmc_uq.scheduler import estimate_dimension
+
+    save_path = tmp / "processed"
+    save_path.mkdir()
+    sample = nuclides[:min(len(nuclides), 50)]
+    timings["estimate_dimension"], _ = _time(
+        lambda: [estimate_dimension(nuc, str(endf_dir), save_path, cache=None) for nuc in sample], repeat=repeat
+    )
+    return timings
+
+
+def bench_tallies(scale: dict, tmp: Path, repeat: int) -> dict:
+    """Statepoint extraction of a model with a `mesh`^3 mesh tally."""
+    from openmc_uq.tallies import read_tallies
+
+    model = write_model(tmp / "model", ["Fe56", "W184"], mesh=scale["mesh"])
+    statepoint = write_statepoint(tmp / "statepoint.10.h5", model / "tallies.xml")
+    times, _ = _time(read_tallies, statepoint, ["TBR", "flux_mesh", "reactions"], repeat=repeat)
+    return {"read_tallies": times}
+
+
+def bench_run_openmc(scale: dict, tmp: Path, repeat: int) -> dict:
+    """
+    `run_openmc` with the subprocess backend on the stub OpenMC, with and
+    without library pruning: staging, library and XML writing, the (stub)
+    OpenMC run and tally extraction, timed through the profiling traces.
+    """
+    from openmc_uq.profiling import load_trace, set_context
+    from openmc_uq.run_openmc import run_openmc
+    from openmc_uq.tallies import latest_statepoint, read_tallies
+
+    names = [f"N{i}" for i in range(scale["n_model"])]
+    model = write_model(tmp / "model", names, mesh=scale["mesh"])
+    library = write_library(tmp / "library", names, scale["n_entries"])
+
+    (tmp / "samples").mkdir()
+    perturbed = []
+    for name in names[:10]:
+        path = tmp / "samples" / f"{name}-rand.h5"
+        path.touch()
+        perturbed.append(SimpleNamespace(nuclide=name, perturbed_name=f"{name}-rand", path=path))
+
+    trace_dir = tmp / "trace"
+    os.environ["OPENMC_UQ_TRACE_DIR"] = str(trace_dir)
+    try:
+        for prune in (False, True):
+            set_context(pruned=prune)
+            for _ in range(repeat):
+                run_openmc(model, perturbed, library, threads=1, n_mpi=1, run_dir=tmp / "run",
+                           prune_library=prune)
+                read_tallies(latest_statepoint(tmp / "run"), ["TBR", "flux_mesh", "reactions"])
+    finally:
+        set_context()
+        del os.environ["OPENMC_UQ_TRACE_DIR"]
+
+    timings = {}
+    for event in load_trace(trace_dir):
+        name = event["name"] + ("_pruned" if event.get("pruned") else "")
+        timings.setdefault(name, []).append(event["wall"])
+    return timings
+
+
+def bench_njoy(scale: dict, tmp: Path, repeat: int) -> dict:
+    """PENDF writing and the NJOY round trip of a perturbed sample, on the stub NJOY."""
+    import sandy
+
+    mts = synthetic_mts(scale["n_mt"])
+    endf_dir = tmp / "endf"
+    write_endf_dir(endf_dir, 1, n_mt=scale["n_mt"], n_points=200, n_groups=scale["n_groups"])
+    endf_file = next(endf_dir.iterdir())
+    pendf = sandy.Endf6.from_file(write_pendf(tmp / "synthetic.pendf", 125, mts, scale["n_points"], z=1, a=2))
+
+    timings = {}
+    timings["parse_pendf"], xs = _time(sandy.Xs.from_endf6, pendf, repeat=repeat)
+    pendf_tape = tmp / "pendf_rand"
+    timings["write_pendf"], _ = _time(lambda: xs.to_endf6(pendf).to_file(pendf_tape), repeat=repeat)
+    timings["njoy"], _ = _time(
+        sandy.njoy.process_neutron, str(endf_file), pendftape=str(pendf_tape), wdir=tmp,
+        keep_pendf=False, temperatures=[293.6], verbose=False, repeat=repeat,
+    )
+    return timings
+
+
+BENCHMARKS = {
+    "covariance": bench_covariance,
+    "errorr": bench_errorr,
+    "perturbation": bench_perturbation,
+    "endf": bench_endf,
+    "tallies": bench_tallies,
+    "run_openmc": bench_run_openmc,
+    "njoy": bench_njoy,
+}
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BENCHMARK_DIR,
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def load_records(path: str | Path) -> list[dict]:
+    """Every recorded benchmark result."""
+    if not Path(path).is_file():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _previous(records: list[dict], record: dict) -> dict | None:
+    """The latest earlier record of the same stage, scale and parameters on the same host."""
+    fields = ("host", "benchmark", "stage", "scale", "params")
+    matches = [r for r in records if all(r.get(field) == record[field] for field in fields)]
+    return max(matches, key=lambda r: r["timestamp"]) if matches else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["small"])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=BENCHMARK_DIR / "results.jsonl",
+                        help="JSON lines file the results are appended to")
+    parser.add_argument("--no-record", action="store_true", help="Do not append the results to --output")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Flag stages whose best time grew by more than this factor")
+    parser.add_argument("--min-time", type=float, default=0.01,
+                        help="Do not flag stages faster than this, in seconds, as their timings are noise")
+    args = parser.parse_args()
+
+    # Stand-ins first on PATH, and the ENDF index kept out of the user cache
+    os.environ["PATH"] = f"{STUB_DIR}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ.setdefault("NJOY", str(STUB_DIR / "njoy"))
+
+    previous = load_records(args.output)
+    meta = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "host": socket.gethostname(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    print(f"Benchmarking {meta['commit']} on {meta['host']} ({meta['cpus']} CPUs)")
+
+    records, failed = [], []
+    for scale in args.scales:
+        for name in args.only:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.environ["OPENMC_UQ_CACHE_DIR"] = str(Path(tmp) / "cache")
+                try:
+                    timings = BENCHMARKS[name](SCALES[scale], Path(tmp), args.repeat)
+                except ImportError as exc:
+                    print(f"[{scale}] {name}: skipped ({exc})")
+                    continue
+                except Exception as exc:
+                    print(f"[{scale}] {name}: FAILED ({type(exc).__name__}: {exc})")
+                    failed.append(f"{scale}/{name}")
+                    continue
+                finally:
+                    del os.environ["OPENMC_UQ_CACHE_DIR"]
+
+            for stage, times in timings.items():
+                records.append({
+                    **meta,
+                    "benchmark": name,
+                    "scale": scale,
+                    "params": SCALES[scale],
+                    "stage": stage,
+                    "best": min(times),
+                    "median": float(np.median(times)),
+                    "repeat": len(times),
+                })
+
+    print()
+    print(f"{'scale':<8}{'stage':<36}{'best [s]':>11}{'median [s]':>12}{'previous':>11}{'ratio':>8}")
+    regressions = []
+    for record in records:
+        prev = _previous(previous, record)
+        stage = f"{record['benchmark']}/{record['stage']}"
+        line = f"{record['scale']:<8}{stage:<36}{record['best']:>11.4f}{record['median']:>12.4f}"
+        if prev is not None:
+            ratio = record["best"] / max(prev["best"], 1e-9)
+            flag = "  slower" if ratio > args.threshold and record["best"] > args.min_time else ""
+            line += f"{prev['best']:>11.4f}{ratio:>8.2f}{flag}"
+            if flag:
+                regressions.append(f"{record['scale']}/{stage}")
+        print(line)
+
+    if not args.no_record and records:
+        with open(args.output, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        print(f"Recorded {len(records)} results in {args.output}")
+
+    if regressions:
+        print(f"Slower than the previous run by more than {args.threshold}x: {', '.join(regressions)}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Synthetic inputs for the benchmarks: covariance structures, ENDF-6, errorr
+and pendf tapes, directories of them, OpenMC models and libraries, and
+statepoint files in the layout OpenMC writes.
+
+The tapes follow the ENDF-6 record layout (80 columns, MAT/MF/MT/NS
+fields, 6 fields of 11 characters) with random but well-formed contents,
+so they have the size and section structure of real data without being
+physically meaningful.
+"""
+from pathlib import Path
+import xml.etree.ElementTree as ET
+import h5py
+import numpy as np
+
+# (symbol, Z) of the elements synthetic nuclides are drawn from
+ELEMENTS = [
+    ("H", 1), ("Li", 3), ("Be", 4), ("B", 5), ("C", 6), ("N", 7), ("O", 8), ("Na", 11),
+    ("Mg", 12), ("Al", 13), ("Si", 14), ("Cr", 24), ("Mn", 25), ("Fe", 26), ("Ni", 28),
+    ("Cu", 29), ("Zr", 40), ("Nb", 41), ("Mo", 42), ("Sn", 50), ("Ta", 73), ("W", 74),
+    ("Pb", 82), ("Bi", 83),
+]
+
+# Reactions carrying covariances in typical evaluations, in ENDF order
+COVARIANCE_MTS = [1, 2, 4, 16, 17, 22, 28, 51, 52, 53, 54, 55, 91, 102, 103, 104, 105, 106, 107, 111, 112]
+
+
+def synthetic_nuclides(n: int) -> list[tuple[str, int, int]]:
+    """`n` distinct (name, Z, A) nuclides, e.g. ("Fe56", 26, 56)."""
+    nuclides = []
+    for k in range(n):
+        symbol, z = ELEMENTS[k % len(ELEMENTS)]
+        a = 2 * z + k // len(ELEMENTS)
+        nuclides.append((f"{symbol}{a}", z, a))
+    return nuclides
+
+
+def synthetic_mts(n_mt: int) -> list[int]:
+    """The first `n_mt` covariance MTs, extended with discrete inelastic levels."""
+    extra = [mt for mt in range(56, 91)] + [mt for mt in range(600, 850)]
+    return sorted((COVARIANCE_MTS + extra)[:n_mt])
+
+
+def synthetic_block_cov(n_mt: int, n_groups: int, density: float = 0.2, mat: int = 2631, seed: int = 0):
+    """
+    Errorr-like `BlockCov`: a relative variance block per MT, and
+    cross-covariance blocks between a fraction `density` of the MT pairs.
+    """
+    # Imported here so the stub executables do not need openmc_uq
+    from openmc_uq.covariance import BlockCov
+
+    rng = np.random.default_rng(seed)
+    mts = synthetic_mts(n_mt)
+
+    blocks = {}
+    for i, mt in enumerate(mts):
+        a = rng.standard_normal((n_groups, n_groups)) * 0.05 / np.sqrt(n_groups)
+        blocks[(mt, mt)] = a @ a.T
+        for mt1 in mts[i + 1:]:
+            if rng.random() < density:
+                blocks[(mt, mt1)] = rng.standard_normal((n_groups, n_groups)) * 1e-5
+
+    energy_grid = np.logspace(-5, np.log10(2e7), n_groups + 1)
+    return BlockCov(mat, mts, energy_grid, blocks)
+
+
+def synthetic_xs(mts: list[int], n_points: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Pointwise energy grid and cross sections (one column per MT) of a pendf-like tape."""
+    rng = np.random.default_rng(seed)
+    energy = np.logspace(-5, np.log10(2e7), n_points)
+    xs = np.exp(rng.normal(0.0, 1.0, (n_points, len(mts)))) / np.sqrt(energy)[:, None] + 0.1
+    return energy, xs
+
+
+# --- ENDF-6 records ---------------------------------------------------------
+
+
+def _float(x: float) -> str:
+    """An 11-character ENDF float, e.g. ' 1.234567+5'."""
+    if x == 0:
+        return " 0.000000+0"
+    mantissa, exponent = f"{x:.6e}".split("e")
+    exponent = int(exponent)
+    digits = 6 if abs(exponent) < 10 else 5
+    mantissa = f"{x / 10.0**exponent:.{digits}f}"
+    return f"{mantissa}{'+' if exponent >= 0 else '-'}{abs(exponent)}".rjust(11)
+
+
+def _field(value) -> str:
+    return _float(value) if isinstance(value, (float, np.floating)) else f"{int(value):11d}"
+
+
+class _Tape:
+    """Writer of ENDF-6 records with line sequence numbers."""
+
+    def __init__(self, mat: int):
+        self.mat = mat
+        self.lines = []
+        self.ns = 0
+
+    def line(self, fields: list, mf: int, mt: int, mat: int | None = None, ns: int | None = None) -> None:
+        text = "".join(_field(f) if f is not None else " " * 11 for f in fields).ljust(66)
+        if ns is None:
+            self.ns += 1
+            ns = self.ns
+        else:
+            self.ns = 0
+        mat = self.mat if mat is None else mat
+        self.lines.append(f"{text}{mat:4d}{mf:2d}{mt:3d}{ns:5d}")
+
+    def text(self, text: str, mf: int, mt: int) -> None:
+        self.ns += 1
+        self.lines.append(f"{text[:66]:<66}{self.mat:4d}{mf:2d}{mt:3d}{self.ns:5d}")
+
+    def cont(self, c1, c2, l1, l2, n1, n2, mf, mt) -> None:
+        self.line([float(c1), float(c2), l1, l2, n1, n2], mf, mt)
+
+    def list(self, c1, c2, l1, l2, n2, values, mf, mt) -> None:
+        self.cont(c1, c2, l1, l2, len(values), n2, mf, mt)
+        values = [float(v) for v in values]
+        for i in range(0, len(values), 6):
+            self.line(values[i:i + 6], mf, mt)
+
+    def tab1(self, c1, c2, l1, l2, x, y, mf, mt) -> None:
+        self.cont(c1, c2, l1, l2, 1, len(x), mf, mt)
+        self.line([len(x), 2], mf, mt)
+        pairs = [float(v) for xy in zip(x, y) for v in xy]
+        for i in range(0, len(pairs), 6):
+            self.line(pairs[i:i + 6], mf, mt)
+
+    def send(self, mf: int) -> None:
+        self.line([0.0, 0.0, 0, 0, 0, 0], mf, 0, ns=99999)
+
+    def fend(self) -> None:
+        self.line([0.0, 0.0, 0, 0, 0, 0], 0, 0, ns=0)
+
+    def write(self, path: Path) -> Path:
+        self.line([0.0, 0.0, 0, 0, 0, 0], 0, 0, mat=0, ns=0)
+        self.line([0.0, 0.0, 0, 0, 0, 0], 0, 0, mat=-1, ns=0)
+        Path(path).write_text("\n".join(self.lines) + "\n")
+        return Path(path)
+
+
+def _header(tape: _Tape, za: int, awr: float, sections: list[tuple[int, int]], liso: int = 0) -> None:
+    tape.lines.append(f"{'synthetic tape':<66}{1:4d}{0:2d}{0:3d}{0:5d}")
+    tape.cont(za, awr, 1, 0, 0, 0, 1, 451)
+    tape.cont(0.0, 0.0, 0, liso, 0, 6, 1, 451)
+    tape.cont(1.0, 2e7, 0, 0, 10, 8, 1, 451)
+    tape.cont(0.0, 0.0, 0, 0, 1, len(sections), 1, 451)
+    tape.text(" synthetic benchmark data", 1, 451)
+    for mf, mt in sections:
+        tape.line([None, None, mf, mt, 1, 0], 1, 451)
+    tape.send(1)
+    tape.fend()
+
+
+def write_endf(path: str | Path, z: int, a: int, mts: list[int], n_points: int = 200,
+               n_groups: int = 33, seed: int = 0) -> Path:
+    """
+    ENDF-6 tape of nuclide (Z, A) with MF3 cross sections and MF33
+    covariances (one symmetric LB=5 block per MT) for `mts`.
+    """
+    rng = np.random.default_rng(seed)
+    mat = 100 * z + 25
+    za, awr = 1000 * z + a, a * 0.9916
+    tape = _Tape(mat)
+    _header(tape, za, awr, [(3, mt) for mt in mts] + [(33, mt) for mt in mts])
+
+    energy, xs = synthetic_xs(mts, n_points, seed)
+    for j, mt in enumerate(mts):
+        tape.cont(za, awr, 0, 0, 0, 0, 3, mt)
+        tape.tab1(0.0, 0.0, 0, 0, energy, xs[:, j], 3, mt)
+        tape.send(3)
+    tape.fend()
+
+    grid = np.logspace(-5, np.log10(2e7), n_groups + 1)
+    upper = np.triu_indices(n_groups)
+    for mt in mts:
+        tape.cont(za, awr, 0, 0, 0, 1, 33, mt)
+        tape.cont(0.0, 0.0, 0, mt, 0, 1, 33, mt)
+        b = rng.standard_normal((n_groups, n_groups)) * 0.05 / np.sqrt(n_groups)
+        tape.list(0.0, 0.0, 1, 5, n_groups + 1, list(grid) + list((b @ b.T)[upper]), 33, mt)
+        tape.send(33)
+    tape.fend()
+    return tape.write(path)
+
+
+def write_errorr(path: str | Path, block_cov, z: int = 26, a: int = 56) -> Path:
+    """Errorr output tape of a block covariance: group bounds, group cross sections and MF33 rows."""
+    za, awr = 1000 * z + a, a * 0.9916
+    tape = _Tape(block_cov.mat)
+    ng = block_cov.ng
+    tape.lines.append(f"{'synthetic errorr tape':<66}{1:4d}{0:2d}{0:3d}{0:5d}")
+    tape.cont(za, awr, 6, 0, -11, 0, 1, 451)
+    tape.list(0.0, 0.0, ng, 0, 0, block_cov.energy_grid, 1, 451)
+    tape.send(1)
+    tape.fend()
+
+    for mt in block_cov.mts:
+        tape.cont(za, awr, 0, 0, ng, 0, 3, mt)
+        tape.list(0.0, 0.0, 0, 0, 0, np.ones(ng), 3, mt)
+        tape.send(3)
+    tape.fend()
+
+    for mt in block_cov.mts:
+        partners = [mt1 for mt1 in block_cov.mts if (mt, mt1) in block_cov.blocks]
+        tape.cont(za, awr, 0, 0, 0, len(partners), 33, mt)
+        for mt1 in partners:
+            tape.cont(0.0, 0.0, block_cov.mat, mt1, 0, ng, 33, mt)
+            cov = block_cov.blocks[(mt, mt1)]
+            for ig in range(ng):
+                tape.list(0.0, 0.0, ng, 1, ig + 1, cov[ig], 33, mt)
+        tape.send(33)
+    tape.fend()
+    return tape.write(path)
+
+
+def write_pendf(path: str | Path, mat: int, mts: list[int], n_points: int, z: int = 26, a: int = 56,
+                seed: int = 0) -> Path:
+    """Pointwise (pendf) tape with MF3 sections for `mts`."""
+    za, awr = 1000 * z + a, a * 0.9916
+    tape = _Tape(mat)
+    _header(tape, za, awr, [(3, mt) for mt in mts])
+    energy, xs = synthetic_xs(mts, n_points, seed)
+    for j, mt in enumerate(mts):
+        tape.cont(za, awr, 0, 0, 0, 0, 3, mt)
+        tape.tab1(0.0, 0.0, 0, 0, energy, xs[:, j], 3, mt)
+        tape.send(3)
+    tape.fend()
+    return tape.write(path)
+
+
+def write_endf_dir(directory: str | Path, n_nuclides: int, n_mt: int = 10, n_points: int = 200,
+                   n_groups: int = 33) -> list[str]:
+    """A directory of `n_nuclides` ENDF-6 files named like TENDL's, returning the nuclide names."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = []
+    for k, (name, z, a) in enumerate(synthetic_nuclides(n_nuclides)):
+        symbol = name.rstrip("0123456789")
+        write_endf(directory / f"n-{symbol}{a:03d}.tendl", z, a, synthetic_mts(n_mt), n_points, n_groups, seed=k)
+        names.append(name)
+    return names
+
+
+# --- OpenMC inputs and outputs ----------------------------------------------
+
+
+def write_library(directory: str | Path, nuclides: list[str], n_extra: int = 0) -> Path:
+    """A cross_sections.xml listing `nuclides` (and `n_extra` other neutron entries), plus an empty file per entry."""
+    directory = Path(directory)
+    (directory / "data").mkdir(parents=True, exist_ok=True)
+    root = ET.Element("cross_sections")
+    for name in list(nuclides) + [f"X{i}" for i in range(n_extra)]:
+        path = directory / "data" / f"{name}.h5"
+        path.touch()
+        ET.SubElement(root, "library", materials=name, path=str(path), type="neutron")
+    ET.indent(root)
+    out = directory / "cross_sections.xml"
+    ET.ElementTree(root).write(out, xml_declaration=True, encoding="utf-8")
+    return out
+
+
+def write_model(directory: str | Path, nuclides: list[str], n_materials: int = 4, mesh: int = 10,
+                particles: int = 1000, batches: int = 10) -> Path:
+    """
+    An OpenMC model directory: `n_materials` materials sharing `nuclides`,
+    a placeholder geometry, and a cell, a mesh (`mesh`^3 bins) and a
+    nuclide-resolved tally.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    materials = ET.Element("materials")
+    for m in range(n_materials):
+        material = ET.SubElement(materials, "material", id=str(m + 1), depletable="false")
+        ET.SubElement(material, "density", units="g/cm3", value="7.9")
+        for name in nuclides[m::n_materials] or nuclides[:1]:
+            ET.SubElement(material, "nuclide", name=name, ao=f"{1 / len(nuclides):.6f}")
+
+    geometry = ET.Element("geometry")
+    for m in range(n_materials):
+        ET.SubElement(geometry, "cell", id=str(m + 1), material=str(m + 1), region=f"-{m + 1}", universe="1")
+        ET.SubElement(geometry, "surface", id=str(m + 1), type="sphere", coeffs=f"0 0 0 {10.0 * (m + 1)}")
+
+    settings = ET.Element("settings")
+    for tag, value in (("run_mode", "fixed source"), ("particles", particles), ("batches", batches), ("inactive", 0)):
+        ET.SubElement(settings, tag).text = str(value)
+
+    tallies = ET.Element("tallies")
+    mesh_el = ET.SubElement(tallies, "mesh", id="1")
+    ET.SubElement(mesh_el, "dimension").text = f"{mesh} {mesh} {mesh}"
+    ET.SubElement(mesh_el, "lower_left").text = "-50 -50 -50"
+    ET.SubElement(mesh_el, "upper_right").text = "50 50 50"
+    for fid, ftype, bins in ((1, "cell", " ".join(str(m + 1) for m in range(n_materials))), (2, "mesh", "1")):
+        f = ET.SubElement(tallies, "filter", id=str(fid), type=ftype)
+        ET.SubElement(f, "bins").text = bins
+    for tid, name, filters, scores, tally_nuclides in (
+        (1, "TBR", "1", "(n,Xt)", None),
+        (2, "flux_mesh", "2", "flux", None),
+        (3, "reactions", "1", "(n,gamma) (n,2n)", " ".join(nuclides[:5])),
+    ):
+        tally = ET.SubElement(tallies, "tally", id=str(tid), name=name)
+        ET.SubElement(tally, "filters").text = filters
+        if tally_nuclides:
+            ET.SubElement(tally, "nuclides").text = tally_nuclides
+        ET.SubElement(tally, "scores").text = scores
+
+    for name, root in (("materials", materials), ("geometry", geometry), ("settings", settings), ("tallies", tallies)):
+        ET.indent(root)
+        ET.ElementTree(root).write(directory / f"{name}.xml", xml_declaration=True, encoding="utf-8")
+    return directory
+
+
+def _filter_bins(element: ET.Element, meshes: dict) -> tuple[int, list]:
+    ftype = element.get("type")
+    bins = (element.findtext("bins") or element.get("bins") or "").split()
+    if ftype == "mesh":
+        return int(np.prod(meshes[int(bins[0])])), [int(bins[0])]
+    if ftype in ("energy", "energyout"):
+        return len(bins) - 1, [float(b) for b in bins]
+    return len(bins), bins
+
+
+def write_statepoint(path: str | Path, tallies_xml: str | Path, n_realizations: int = 10, seed: int = 0) -> Path:
+    """
+    Statepoint file with random results for every tally of `tallies_xml`, in
+    the layout OpenMC writes (the `tallies` group, with `results` holding the
+    sum and sum of squares of each bin).
+    """
+    rng = np.random.default_rng(seed)
+    root = ET.parse(tallies_xml).getroot()
+    meshes = {
+        int(m.get("id")): [int(n) for n in m.findtext("dimension").split()]
+        for m in root.iter("mesh")
+    }
+    filters = {int(f.get("id")): f for f in root.iter("filter")}
+    tallies = list(root.iter("tally"))
+
+    with h5py.File(path, "w") as hf:
+        hf.attrs["filetype"] = np.bytes_("statepoint")
+        hf.create_dataset("n_realizations", data=n_realizations)
+        group = hf.create_group("tallies")
+        group.attrs["ids"] = np.array([int(t.get("id")) for t in tallies])
+
+        mesh_group = group.create_group("meshes")
+        for mesh_id, dims in meshes.items():
+            mesh_group.create_group(f"mesh {mesh_id}").create_dataset("dimension", data=np.array(dims))
+
+        filter_group = group.create_group("filters")
+        for filter_id, element in filters.items():
+            n_bins, bins = _filter_bins(element, meshes)
+            g = filter_group.create_group(f"filter {filter_id}")
+            g.create_dataset("type", data=np.bytes_(element.get("type")))
+            g.create_dataset("n_bins", data=n_bins)
+            g.create_dataset("bins", data=np.array(bins) if element.get("type") in ("mesh", "energy", "energyout")
+                             else np.array([str(b).encode() for b in bins]))
+
+        for tally in tallies:
+            filter_ids = [int(i) for i in (tally.findtext("filters") or "").split()]
+            nuclides = (tally.findtext("nuclides") or "total").split()
+            scores = tally.findtext("scores").split()
+            n_bins = int(np.prod([_filter_bins(filters[i], meshes)[0] for i in filter_ids]))
+
+            mean = rng.lognormal(0.0, 1.0, (n_bins, len(nuclides) * len(scores)))
+            std = 0.01 * mean * np.sqrt(n_realizations)
+            results = np.stack([mean * n_realizations, n_realizations * (mean**2 + std**2)], axis=-1)
+
+            g = group.create_group(f"tally {tally.get('id')}")
+            g.create_dataset("name", data=np.bytes_(tally.get("name", "")))
+            g.create_dataset("n_realizations", data=n_realizations)
+            g.create_dataset("n_filters", data=len(filter_ids))
+            if filter_ids:
+                g.create_dataset("filters", data=np.array(filter_ids))
+            g.create_dataset("nuclides", data=np.array([n.encode() for n in nuclides]))
+            g.create_dataset("score_bins", data=np.array([s.encode() for s in scores]))
+            g.create_dataset("results", data=results)
+    return Path(path)
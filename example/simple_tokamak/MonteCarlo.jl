@@ -65,13 +65,49 @@ function get_data(file,index)
     return data[index]
 end
 
+# Convenience function to retrieve data from the results store (see
+# openmc_uq.results): each sample is the row labelled with its working
+# directory, in one of the shard-*.h5 files. Data is indexed as in openmc.out
+# (mean and std of each score in turn). Shards are read once per change.
+shard_cache = Dict{String,Tuple{Float64,Dict{String,Vector{Float64}}}}()
+function get_stored_data(results_dir,base,index)
+    label = realpath(base)
+    for file in filter(f -> startswith(f, "shard-") && endswith(f, ".h5"), readdir(results_dir))
+        path = joinpath(results_dir, file)
+        modified = mtime(path)
+        if !haskey(shard_cache, path) || shard_cache[path][1] != modified
+            rows = Dict{String,Vector{Float64}}()
+            h5open(path, "r") do fid
+                if haskey(fid, "label")
+                    # Julia reads the arrays transposed: [score, row]
+                    means = read(fid["qoi/mean"])
+                    stds = read(fid["qoi/std"])
+                    for (row, row_label) in enumerate(read(fid["label"]))
+                        rows[row_label] = vec(permutedims(hcat(means[:, row], stds[:, row])))
+                    end
+                end
+            end
+            shard_cache[path] = (modified, rows)
+        end
+        rows = shard_cache[path][2]
+        if haskey(rows, label)
+            return rows[label][index]
+        end
+    end
+    error("No results for $label in $results_dir")
+end
+
 # Convenience function to return an extractor
 # First argument to Extractor struct is itself an anonymous function
 ## argument base is the working directory
 ## function will append base with output file and extract the data
 # Second argument to Extractor is the symbol name (immutable)
-function openmc_extractor(index,output_file,qoi_name)
+# With a results store (results_dir), the data is read from it instead
+function openmc_extractor(index,output_file,qoi_name,results_dir=nothing)
     extractor = Extractor(base -> begin
+        if results_dir !== nothing
+            return get_stored_data(results_dir,base,index)
+        end
         file = joinpath(base, output_file)
 	return get_data(file,index)
     end,Symbol(qoi_name))
@@ -80,6 +116,7 @@ end
 
 # Loop over scores
 solver_output = solver_inputs["output"]
+results_dir = get(solver_inputs, "results_dir", get(ENV, "OPENMC_UQ_RESULTS_DIR", nothing))
 scores = solver_inputs["scores"]
 num_scores = length(scores)
 extractor_list=Vector{Extractor}()
@@ -87,13 +124,13 @@ for i_score = 1:num_scores
     qoi = scores[i_score]
     # Remember, Julia doesn't use zero-indexing
     data_index = 2*i_score-1
-    qoi_extractor = openmc_extractor(data_index,solver_output,qoi)
+    qoi_extractor = openmc_extractor(data_index,solver_output,qoi,results_dir)
     push!(extractor_list, qoi_extractor)
 
     qoi_std = string(qoi,"_std")
     # Remember, Julia doesn't use zero-indexing
     std_index = 2*i_score
-    qoi_extractor = openmc_extractor(std_index,solver_output,qoi_std)
+    qoi_extractor = openmc_extractor(std_index,solver_output,qoi_std,results_dir)
     push!(extractor_list, qoi_extractor)
 end
 ############################################################################
@@ -1,16 +1,20 @@
 #!/usr/bin/env python
 import argparse
-from glob import glob
 import json
-from multiprocessing import Pool
 import os
 from pathlib import Path
 import sys
+import time
 import numpy as np
 
 import openmc
 import openmc_uq
-from openmc_uq.utils import resolve_nuclides
+from openmc_uq.profiling import set_context
+from openmc_uq.resources import ResourceBudget
+from openmc_uq.utils import read_settings, resolve_nuclides
+from openmc_uq.results import open_shard
+from openmc_uq.tallies import latest_statepoint, read_tallies
+from openmc_uq.tmc import fast_tmc_settings
 
 parser = argparse.ArgumentParser()
 parser.add_argument("input_file")
@@ -40,7 +44,7 @@ XS_LIB = inputs_dict["cross_section_path"]
 # Scores to extract
 scores = inputs_dict["scores"]
 
-# File to save to
+# File to save to, without a results store
 output = inputs_dict["output"]
 sample_file = inputs_dict["sample_file"]
 
@@ -62,21 +66,50 @@ if len(dims) != len(nuclides):
 dim_cum = np.cumsum(dims)
 dim_cum = np.insert(dim_cum, 0, 0)
 
-# Number threads / workers / cores
-n_cores = int(inputs_dict["n_cores"])
-n_mpi = int(inputs_dict["n_mpi"])
+# "njoy" (default) or "direct", which perturbs the HDF5 data of XS_LIB without NJOY
+sampling_mode = inputs_dict.get("sampling_mode", "njoy")
+
+# "subprocess" (default, mpirun) or "lib" (in-process through openmc.lib)
+openmc_backend = inputs_dict.get("openmc_backend", "subprocess")
+
+# List only the model's nuclides in each sample's cross section library
+prune_library = bool(inputs_dict.get("prune_library", False))
+
+# Number threads / workers / cores, shared by sampling and then OpenMC
+budget = ResourceBudget.from_inputs(inputs_dict, max_sampling_workers=len(nuclides))
+budget.log()
+
+# Optional results store, shared by all samples (or $OPENMC_UQ_RESULTS_DIR),
+# replacing the per-sample openmc.out
+results_dir = inputs_dict.get("results_dir")
+sample_id = int(inputs_dict.get("sample_id", -1))
+# Worker slot whose shard the results go to (default: see results.default_writer_name)
+worker = inputs_dict.get("worker")
+
+# Stages traced with $OPENMC_UQ_TRACE_DIR are attributed to this sample
+set_context(sample=sample_id)
+
+# Optional fast-TMC runs: a seed per sample, with reduced particles/batches,
+# e.g. "fast_tmc": {"particles": 10000, "batches": 5}
+fast_tmc = inputs_dict.get("fast_tmc")
+settings = None
+if fast_tmc is not None:
+    settings = fast_tmc_settings(np.array(samples, dtype=np.float64), fast_tmc.get("particles"), fast_tmc.get("batches"))
 
 # Generate random HDF5 file of "nuclides".
 # Parallel using simple multiprocessing
-print(f"Sampling sandy with n_cores={n_cores}")
+print(f"Sampling sandy with {budget.sampling_workers} workers")
 
 print("Beginning NJOY processing")
-with Pool(n_cores) as pool:
+timing = {}
+start = time.perf_counter()
+with budget.sampling_pool() as pool:
     random_nuc = []
     for (i, nuc) in enumerate(nuclides):
 
         func_args = (nuc, endf_path, pre_processed_dir, dims[i], samples[dim_cum[i]:dim_cum[i+1]])
-        RN = pool.apply_async(openmc_uq.sample_nuclide_KL, func_args)
+        func_kwargs = {"mode": sampling_mode, "cross_sections_xml": XS_LIB}
+        RN = pool.apply_async(openmc_uq.sample_nuclide_KL, func_args, func_kwargs)
         random_nuc.append(RN)
 
     for r in random_nuc:
@@ -85,34 +118,37 @@ with Pool(n_cores) as pool:
     for (i, r) in enumerate(random_nuc):
         random_nuc[i] = r.get()
 
+timing["sampling"] = time.perf_counter() - start
+
 #  Run openmc with random files
-openmc_uq.run_openmc(openmc_xml_dir, random_nuc, cross_sections_xml=XS_LIB, threads=n_cores, n_mpi = n_mpi,run_dir=run_dir)
+start = time.perf_counter()
+openmc_uq.run_openmc(openmc_xml_dir, random_nuc, cross_sections_xml=XS_LIB, threads=budget.openmc_threads, n_mpi=budget.n_mpi, run_dir=run_dir,
+                    backend=openmc_backend, settings=settings, prune_library=prune_library, cpus=budget.openmc_cpus)
 
-# Lift tallies from statepoint file
-n_max_batches=0
-stem=run_dir+'/statepoint.'
-template=stem+'*.h5'
-files=glob(template)
-file_to_open=""
-for filename in files:
-    root=filename.replace('.h5','')
-    n_batches=int(root.replace(stem,''))
-    if n_batches > n_max_batches:
-        n_max_batches=n_batches
-        file_to_open=filename
+timing["openmc"] = time.perf_counter() - start
 
+# Lift tallies from statepoint file
+start = time.perf_counter()
+file_to_open = latest_statepoint(run_dir)
 print("Opening statepoint file: ",file_to_open)
-sp = openmc.StatePoint(file_to_open)
-
-result_str=""
-for score in scores:
-    tally = sp.get_tally(name=score)
-    df = tally.get_pandas_dataframe()
-    mean = df['mean'].sum()
-    std = df['std. dev.'].sum()
-    tally_str = "{} {} ".format(mean,std)
-    result_str=result_str+tally_str
-
-#   Store results of interest to openmc.out
-with open(output, 'w') as f:
-    f.write(result_str)
+tallies = read_tallies(file_to_open, scores)
+means, stds = np.array([tallies[score].total() for score in scores]).T
+timing["tallies"] = time.perf_counter() - start
+
+# Results go to the shared results store if configured, else to openmc.out
+shard = open_shard(results_dir, writer=worker, attrs={"scores": scores, "nuclides": nuclides})
+if shard is None:
+    result_str=""
+    for mean, std in zip(means, stds):
+        tally_str = "{} {} ".format(mean,std)
+        result_str=result_str+tally_str
+
+    with open(output, 'w') as f:
+        f.write(result_str)
+else:
+    run_settings = read_settings(Path(run_dir) / "settings.xml")
+    histories = run_settings["particles"] * (run_settings["batches"] - run_settings["inactive"])
+    with shard:
+        shard.append(sample_id=sample_id, label=os.getcwd(), inputs=samples,
+                     qoi_mean=means, qoi_std=stds, tallies=tallies, timing=timing,
+                     histories=histories)
@@ -5,8 +5,8 @@ import os
 import tempfile
 import numpy as np
 
-from multiprocessing import Pool
-
+from openmc_uq.resources import ResourceBudget
+from openmc_uq.scheduler import Task, estimate_dimension, run_scheduled
 from openmc_uq.utils import (
     get_nuclide_paths,
     check_covariance,
@@ -58,22 +58,43 @@ if len(nuclides) < n_requested:
     )
 
 N_workers = int(os.getenv("SLURM_NTASKS", "1"))
-print(f"Performing svd with N_workers={N_workers}")
-
-print("Beginning NJOY processing")
-
-with Pool(N_workers) as pool:
-    async_results = []
-    for (i, nuc) in enumerate(nuclides):
+budget = ResourceBudget(N_workers)
+budget.log()
+print(f"Performing svd with N_workers={budget.n_cores}")
 
-        func_args = (nuc, endf_folder, save_folder, False)
-        RN = pool.apply_async(svd_and_save_error, func_args)
-        async_results.append(RN)
+# Truncated backends ("lanczos", "randomized") only keep the leading components,
+# so the full spectrum is needed when dimension reduction is switched off
+if inputs_dict["dimension_reduction"]:
+    method = inputs_dict.get("decomposition", "eigh")
+else:
+    method = "eigh"
+print(f"Decomposition method: {method}")
+
+# Optional storage settings for the *_SVD.h5 files, e.g. {"float32": true, "compression": "gzip"}
+svd_storage = inputs_dict.get("svd_storage", {})
+svd_kwargs = {
+    "method": method,
+    "block_diagonal": inputs_dict.get("block_diagonal", True),
+    "truncate_storage": inputs_dict["dimension_reduction"],
+    "dtype": np.float32 if svd_storage.get("float32", False) else np.float64,
+    "compression": svd_storage.get("compression"),
+}
+
+# Optional memory budget of the decompositions in GB (default: $OPENMC_UQ_MEMORY_GB,
+# the Slurm allocation or 90% of the node's memory)
+memory_budget = inputs_dict.get("memory_budget_gb")
+if memory_budget is not None:
+    memory_budget = int(float(memory_budget) * 1024**3)
 
-    for r in async_results:
-        r.wait()
+print("Beginning NJOY processing")
 
-    results = [r.get() for r in async_results]  # list of tuples
+# Largest covariances first, admitted against the memory budget
+tasks = [
+    Task(nuc, (nuc, endf_folder, save_folder, False), svd_kwargs, estimate_dimension(nuc, endf_folder, save_folder))
+    for nuc in nuclides
+]
+outputs = run_scheduled(svd_and_save_error, tasks, budget.n_cores, memory_budget, cpus=budget.cpus)
+results = [outputs[nuc] for nuc in nuclides]  # list of tuples
 
 reduced_dims, full_dims = map(list, zip(*results))
 reduced_dims = [int(x) for x in reduced_dims]
@@ -1,2 +1,2 @@
-from .sample_nuclide import sample_nuclide_sandy, sample_nuclide_KL
-from .run_openmc import run_openmc
+from .sample_nuclide import sample_nuclide_sandy, sample_nuclide_KL, sample_nuclide_KL_batch
+from .run_openmc import run_openmc, LibRunner
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Run many UQ samples in one job.
+
+Each line of the sample file holds one sample: the concatenated KL
+coefficients of every nuclide (`--mode kl`, as written by the Julia driver
+for `run_model.py`) or one SANDY seed per nuclide (`--mode sandy`). Nuclear
+data of sample k+1 is generated by a pool of workers while OpenMC runs
+sample k, and all results are written to a single HDF5 results shard (see
+`openmc_uq.results`):
+
+    python3 -m openmc_uq.batch solver_inputs.json samples.dat --output results.h5
+
+The solver inputs are those of `run_model.py` (the `solver_inputs` section of
+`uq_inputs.json`).
+"""
+import argparse
+import json
+from pathlib import Path
+import shutil
+import time
+import numpy as np
+
+from .profiling import call_with_context, set_context
+from .resources import ResourceBudget
+from .run_openmc import run_openmc
+from .sample_nuclide import RandomData, sample_nuclide_KL, sample_nuclide_sandy
+from .results import DONE, FAILED, ResultsShard, load_results
+from .statistics import ConvergenceMonitor
+from .tallies import latest_statepoint, read_tallies
+from .tmc import fast_tmc_settings
+from .utils import read_settings, resolve_nuclides
+
+BATCH_MODES = ("kl", "sandy")
+
+def read_samples(sample_file: str | Path) -> np.ndarray:
+    """Read a whitespace-delimited file with one sample per line into an (N, d) array."""
+    return np.loadtxt(sample_file, dtype=np.float64, ndmin=2)
+
+
+def _open_results(output: Path, samples: np.ndarray, attrs: dict, resume: bool, mode: str = "kl") -> tuple[ResultsShard, set]:
+    """Open the results shard, and find the samples already done when resuming."""
+    if not resume or not output.is_file():
+        output.unlink(missing_ok=True)
+        return ResultsShard(output, attrs=attrs), set()
+
+    previous = load_results(output)
+    if previous["sample_id"].size == 0:
+        # Created, but stopped before the first sample was stored
+        return ResultsShard(output, attrs=attrs), set()
+
+    ok = previous["status"] == DONE
+    done = previous["sample_id"][ok]
+    # KL batches store the sample vectors, SANDY batches the seeds
+    if mode == "sandy":
+        inputs, expected = previous["seeds"][ok], samples[done[done < samples.shape[0]]].astype(np.int64)
+    else:
+        inputs, expected = previous["inputs"][ok], samples[done[done < samples.shape[0]]]
+    if np.any(done >= samples.shape[0]) or not np.array_equal(inputs, expected):
+        raise ValueError(f"{output} holds results of different samples, cannot resume.")
+    return ResultsShard(output, attrs=attrs), set(done.tolist())
+
+
+def _sample_name(nuclide: str, k: int) -> str:
+    # Unique names let a lib backend session hold several samples
+    return f"{nuclide}-rand{k}"
+
+
+def _upcoming(nuclides: list[str], todo: list[int], sample_root: Path) -> list[RandomData]:
+    """The perturbed files that `_submit` will write for the samples `todo` in KL mode."""
+    return [
+        RandomData(nuc, _sample_name(nuc, k), sample_root / str(k) / nuc / f"{_sample_name(nuc, k)}.h5")
+        for k in todo for nuc in nuclides
+    ]
+
+
+def _submit(pool, inputs_dict: dict, nuclides: list[str], dims, mode: str, sample: np.ndarray, k: int, sample_dir: Path) -> list:
+    """Start generating the nuclear data of sample `k` in the pool."""
+    results = []
+    if mode == "kl":
+        dim_cum = np.insert(np.cumsum(dims), 0, 0)
+        kwargs = {
+            "mode": inputs_dict.get("sampling_mode", "njoy"),
+            "cross_sections_xml": inputs_dict["cross_section_path"],
+        }
+        if inputs_dict.get("prune_library"):
+            # Direct sampling then only perturbs the temperatures the model uses
+            kwargs["openmc_xml_dir"] = inputs_dict["openmc_xml_dir"]
+        for i, nuc in enumerate(nuclides):
+            args = (nuc, inputs_dict["endf_dir"], inputs_dict["pre_processed_dir"], dims[i],
+                    sample[dim_cum[i]:dim_cum[i + 1]])
+            kw = dict(kwargs, out_dir=sample_dir / nuc, name=_sample_name(nuc, k))
+            results.append(pool.apply_async(call_with_context, ({"sample": k}, sample_nuclide_KL) + args, kw))
+    else:
+        for i, nuc in enumerate(nuclides):
+            args = (nuc, inputs_dict["endf_dir"], int(sample[i]), sample_dir)
+            results.append(pool.apply_async(call_with_context, ({"sample": k}, sample_nuclide_sandy) + args))
+    return results
+
+
+def run_batch(
+    inputs_dict: dict,
+    samples: np.ndarray,
+    output: str | Path = "results.h5",
+    mode: str = "kl",
+    text_output: str | Path | None = None,
+    resume: bool = False,
+    keep_samples: bool = False,
+    monitor: ConvergenceMonitor | None = None,
+    stop_file: str | Path | None = None,
+) -> Path:
+    """
+    Evaluate every sample in `samples` (shape (N, d)) and store the results
+    in the results shard `output` (see `results.ResultsShard`).
+
+    Each evaluated sample appends its row index as `sample_id`, the sample
+    vector (`inputs`) or `seeds`, the total of each score (`qoi/mean`,
+    `qoi/std`, see `tallies.TallyResult.total`), the full tally arrays and
+    the time spent generating data, running OpenMC and reading tallies.
+    The file is updated after each sample, so a batch stopped early can be
+    continued with `resume=True`. `text_output` optionally receives one
+    `mean std mean std ...` line per sample, in the format of `run_model.py`.
+
+    The batch stops early once `monitor` reports convergence of the score
+    totals, or when `stop_file` appears (e.g. created by the convergence
+    monitor of `openmc_uq.statistics` watching several batches).
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode '{mode}'. Expected one of {BATCH_MODES}.")
+
+    samples = np.atleast_2d(samples)
+    nuclides = resolve_nuclides(inputs_dict.get("nuclides"), inputs_dict["openmc_xml_dir"])
+    scores = inputs_dict["scores"]
+    run_dir = Path(inputs_dict["run_dir"]).resolve()
+    sample_root = run_dir.parent / f"{run_dir.name}_data"
+
+    if mode == "kl":
+        dims = np.array(inputs_dict["dimensions"]["dims"])
+        if len(dims) != len(nuclides) or samples.shape[1] != dims.sum():
+            raise ValueError(
+                f"Samples have {samples.shape[1]} columns, expected sum(dims) = {dims.sum()} "
+                f"over {len(nuclides)} nuclides."
+            )
+    else:
+        dims = None
+        if samples.shape[1] != len(nuclides):
+            raise ValueError(f"Samples have {samples.shape[1]} seeds for {len(nuclides)} nuclides.")
+
+    # Sampling of the next sample runs alongside OpenMC, so they split the cores
+    budget = ResourceBudget.from_inputs(inputs_dict, overlap=True, max_sampling_workers=len(nuclides))
+    budget.log()
+    backend = inputs_dict.get("openmc_backend", "subprocess")
+    prune_library = bool(inputs_dict.get("prune_library", False))
+    fast_tmc = inputs_dict.get("fast_tmc")
+
+    output = Path(output).resolve()
+    shard, done = _open_results(output, samples, {"scores": scores, "nuclides": nuclides}, resume, mode)
+    todo = [k for k in range(samples.shape[0]) if k not in done]
+    if monitor is not None and done:
+        previous = load_results(output)
+        monitor.update(previous["qoi/mean"][previous["status"] == DONE])
+    print(f"Evaluating {len(todo)} of {samples.shape[0]} samples into {output}")
+
+    # A lib backend session lists the files of every sample from the start, so it is
+    # initialised once (per `LibRunner.max_samples`) rather than for each new perturbed name
+    upcoming = _upcoming(nuclides, todo, sample_root) if mode == "kl" and backend == "lib" else None
+
+    try:
+        with budget.sampling_pool() as pool:
+            pending = None
+            for j, k in enumerate(todo):
+                if stop_file is not None and Path(stop_file).exists():
+                    print(f"Found stop file {stop_file}, stopping after {j} samples")
+                    break
+
+                set_context(sample=k)
+                start = time.perf_counter()
+                if pending is None:
+                    pending = _submit(pool, inputs_dict, nuclides, dims, mode, samples[k], k, sample_root / str(k))
+
+                try:
+                    random_nuc = [r.get() for r in pending]
+                except Exception as exc:
+                    random_nuc = None
+                    print(f"Sample {k}: nuclear data generation failed: {exc}")
+                timing = {"sampling": time.perf_counter() - start}
+
+                # Generate the next sample while OpenMC runs this one
+                pending = None
+                if j + 1 < len(todo):
+                    nxt = todo[j + 1]
+                    pending = _submit(pool, inputs_dict, nuclides, dims, mode, samples[nxt], nxt, sample_root / str(nxt))
+
+                status, tallies, mean, std, histories = FAILED, None, None, None, None
+                if random_nuc is not None:
+                    try:
+                        start = time.perf_counter()
+                        settings = None
+                        if fast_tmc is not None:
+                            settings = fast_tmc_settings(samples[k], fast_tmc.get("particles"), fast_tmc.get("batches"))
+                        run_openmc(inputs_dict["openmc_xml_dir"], random_nuc, inputs_dict["cross_section_path"],
+                                   threads=budget.openmc_threads, n_mpi=budget.n_mpi, run_dir=run_dir,
+                                   backend=backend, settings=settings, prune_library=prune_library,
+                                   cpus=budget.openmc_cpus, upcoming=upcoming)
+                        upcoming = None
+                        timing["openmc"] = time.perf_counter() - start
+
+                        start = time.perf_counter()
+                        tallies = read_tallies(latest_statepoint(run_dir), scores)
+                        mean, std = np.array([tallies[score].total() for score in scores]).T
+                        timing["tallies"] = time.perf_counter() - start
+                        settings = read_settings(run_dir / "settings.xml")
+                        histories = settings["particles"] * (settings["batches"] - settings["inactive"])
+                        status = DONE
+                    except Exception as exc:
+                        print(f"Sample {k}: OpenMC failed: {exc}")
+
+                shard.append(
+                    sample_id=k,
+                    status=status,
+                    inputs=samples[k] if mode == "kl" else None,
+                    seeds=samples[k].astype(np.int64) if mode == "sandy" else None,
+                    qoi_mean=mean,
+                    qoi_std=std,
+                    tallies=tallies,
+                    timing=timing,
+                    histories=histories,
+                )
+                print(f"Sample {k} {'done' if status == DONE else 'failed'} ({j + 1}/{len(todo)})")
+
+                if not keep_samples:
+                    shutil.rmtree(sample_root / str(k), ignore_errors=True)
+
+                if monitor is not None and status == DONE:
+                    monitor.update(mean)
+                    if monitor.converged():
+                        print(monitor.report())
+                        print(f"Converged after {j + 1} samples, stopping")
+                        break
+    finally:
+        shard.close()
+
+    if text_output is not None:
+        write_text_results(output, text_output, samples.shape[0])
+
+    return output
+
+
+def write_text_results(results_file: str | Path, text_output: str | Path, n_samples: int | None = None) -> None:
+    """Write the results as one `mean std mean std ...` line per sample (NaN where not evaluated)."""
+    results = load_results(results_file)
+    ok = results["status"] == DONE
+    ids = results["sample_id"][ok]
+
+    n_samples = results["sample_id"].max() + 1 if n_samples is None else n_samples
+    rows = np.full((n_samples, 2 * len(results["attrs"]["scores"])), np.nan)
+    if np.any(ok):
+        rows[ids, 0::2] = results["qoi/mean"][ok]
+        rows[ids, 1::2] = results["qoi/std"][ok]
+    np.savetxt(text_output, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_file", help="Solver inputs, as read by run_model.py")
+    parser.add_argument("sample_file", help="One sample (KL coefficients or seeds) per line")
+    parser.add_argument("--output", default="results.h5")
+    parser.add_argument("--mode", choices=BATCH_MODES, default="kl")
+    parser.add_argument("--text-output", default=None, help="Also write one line of results per sample")
+    parser.add_argument("--resume", action="store_true", help="Skip samples already evaluated in --output")
+    parser.add_argument("--keep-samples", action="store_true", help="Keep the generated nuclear data")
+    parser.add_argument("--target-se", type=float, default=None, help="Stop once every score's standard error is below this")
+    parser.add_argument("--target-rel-se", type=float, default=None, help="As --target-se, relative to each score's mean")
+    parser.add_argument("--stop-file", default=None, help="Stop once this file exists")
+    args = parser.parse_args()
+
+    with open(args.input_file) as handle:
+        inputs_dict = json.load(handle)
+    if "solver_inputs" in inputs_dict:
+        inputs_dict = inputs_dict["solver_inputs"]
+
+    monitor = None
+    if args.target_se is not None or args.target_rel_se is not None:
+        monitor = ConvergenceMonitor(inputs_dict["scores"], args.target_se, args.target_rel_se)
+
+    run_batch(
+        inputs_dict,
+        read_samples(args.sample_file),
+        output=args.output,
+        mode=args.mode,
+        text_output=args.text_output,
+        resume=args.resume,
+        keep_samples=args.keep_samples,
+        monitor=monitor,
+        stop_file=args.stop_file,
+    )
+
+
+if __name__ == "__main__":
+    main()
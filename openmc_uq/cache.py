@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+
+
+CACHE_DIR_ENV = "OPENMC_UQ_CACHE_DIR"
+CACHE_SIZE_ENV = "OPENMC_UQ_CACHE_MAX_GB"
+
+# In-process memo of file hashes, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+def file_hash(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's content, memoized per process while the file is unchanged."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        _file_hashes[memo_key] = h.hexdigest()
+    return _file_hashes[memo_key]
+
+
+class CacheEntry:
+    """
+    A single cache entry. Arrays are memory-mapped lazily on first access
+    and stored files (e.g. NJOY tapes) are exposed as paths.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._arrays = {}
+        with open(path / "meta.json") as f:
+            self.meta = json.load(f)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return (self.path / f"{name}.npy").is_file()
+
+    def file(self, name: str) -> Path:
+        """Path of a file stored with the entry."""
+        return self.path / "files" / name
+
+
+class ParsedCache:
+    """
+    Content-addressed on-disk cache of parsed nuclear data.
+
+    Entries are keyed by the hash of a source file plus the processing
+    parameters, hold NumPy arrays that can be memory-mapped and optionally
+    raw files. Access times are tracked through the entry directory mtime,
+    and the least recently used entries are evicted once the cache exceeds
+    `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int | None = None):
+        self.cache_dir = Path(cache_dir).resolve()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(source_file: str | Path, **params) -> str:
+        """Key of the data derived from `source_file` with the given parameters."""
+        h = hashlib.sha256(file_hash(source_file).encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> CacheEntry | None:
+        """Return the entry for `key`, or None on a miss."""
+        path = self.cache_dir / key
+        if not (path / "meta.json").is_file():
+            return None
+        os.utime(path)
+        return CacheEntry(path)
+
+    def put(
+        self,
+        key: str,
+        arrays: dict[str, np.ndarray],
+        meta: dict | None = None,
+        files: dict[str, str | Path] | None = None,
+    ) -> CacheEntry:
+        """
+        Store an entry. It is written to a temporary directory and renamed into
+        place, so concurrent writers of the same key are safe (the first wins).
+        """
+        path = self.cache_dir / key
+        tmp = self.cache_dir / f"{key}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", np.asarray(array))
+
+        if files:
+            (tmp / "files").mkdir()
+            for name, source in files.items():
+                shutil.copyfile(source, tmp / "files" / name)
+
+        with open(tmp / "meta.json", "w") as f:
+            json.dump(meta or {}, f)
+
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        # Read before evicting, and never evict the entry just stored
+        entry = CacheEntry(path)
+        self.evict(keep=(key,))
+        return entry
+
+    def evict(self, keep=()) -> None:
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`,
+        other than those of the keys in `keep`.
+        """
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.is_dir() and ".tmp-" not in path.name and path.name not in keep:
+                size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+                entries.append((path.stat().st_mtime, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"Evicted {path.name} from the parsed-data cache")
+
+
+def default_cache() -> ParsedCache | None:
+    """
+    Cache configured through the environment, or None if caching is disabled.
+
+    Set `OPENMC_UQ_CACHE_DIR` to enable it and optionally
+    `OPENMC_UQ_CACHE_MAX_GB` to cap its size.
+    """
+    cache_dir = os.getenv(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+
+    max_gb = os.getenv(CACHE_SIZE_ENV)
+    max_bytes = int(float(max_gb) * 1024**3) if max_gb else None
+    return ParsedCache(cache_dir, max_bytes)
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+
+class BlockCov:
+    """
+    Block-sparse MF31/33 covariance.
+
+    Stores one `(ng, ng)` block per `(MT, MT1)` pair present in the errorr
+    file. Pairs without cross-covariance are not stored. The dense matrix
+    (if needed) is laid out MT by MT in the order of `mts`, matching
+    `sandy.Errorr.get_cov`.
+    """
+
+    def __init__(self, mat: int, mts: list[int], energy_grid: np.ndarray, blocks: dict):
+        self.mat = mat
+        self.mts = list(mts)
+        self.energy_grid = np.asarray(energy_grid)
+        self.blocks = blocks
+
+        # MT -> row offset, computed once instead of querying per block
+        self.offsets = {mt: i * self.ng for i, mt in enumerate(self.mts)}
+
+    @property
+    def ng(self) -> int:
+        return self.energy_grid.size - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.mts) * self.ng
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.size, self.size)
+
+    def rows(self, mts: list[int]) -> np.ndarray:
+        """Row indices of the dense matrix covered by `mts`, in the order given."""
+        ng = self.ng
+        return np.concatenate([np.arange(self.offsets[mt], self.offsets[mt] + ng) for mt in mts])
+
+    def connected_components(self) -> list[list[int]]:
+        """
+        Split the MTs into groups with no cross-covariance between groups.
+
+        MTs whose variances are all zero carry no uncertainty and are dropped.
+        """
+        parent = {mt: mt for mt in self.mts}
+        active = set()
+
+        def find(mt):
+            while parent[mt] != mt:
+                parent[mt] = parent[parent[mt]]
+                mt = parent[mt]
+            return mt
+
+        for (mt, mt1), cov in self.blocks.items():
+            if not np.any(cov):
+                continue
+            active.update((mt, mt1))
+            if mt != mt1:
+                parent[find(mt)] = find(mt1)
+
+        groups = {}
+        for mt in self.mts:
+            if mt in active:
+                groups.setdefault(find(mt), []).append(mt)
+
+        return list(groups.values())
+
+    def submatrix(self, mts: list[int], dtype=np.float64) -> np.ndarray:
+        """Assemble the dense covariance restricted to `mts`."""
+        ng = self.ng
+        local = {mt: i * ng for i, mt in enumerate(mts)}
+        c = np.zeros((len(mts) * ng,) * 2, dtype=dtype)
+        for (mt, mt1), cov in self.blocks.items():
+            if mt in local and mt1 in local:
+                i, j = local[mt], local[mt1]
+                c[i:i + ng, j:j + ng] = cov
+                if mt != mt1:
+                    c[j:j + ng, i:i + ng] = cov.T
+        return c
+
+    def _placed_blocks(self):
+        """Yield (row offset, column offset, block), including mirrored off-diagonal blocks."""
+        for (mt, mt1), cov in self.blocks.items():
+            i, j = self.offsets[mt], self.offsets[mt1]
+            yield i, j, cov
+            if mt != mt1:
+                yield j, i, cov.T
+
+    def to_dense(self, dtype=np.float64) -> np.ndarray:
+        """Assemble the dense covariance matrix with plain slicing."""
+        return self.submatrix(self.mts, dtype)
+
+    def diagonal(self) -> np.ndarray:
+        """Return the variances without assembling the dense matrix."""
+        d = np.zeros(self.size)
+        for mt in self.mts:
+            cov = self.blocks.get((mt, mt))
+            if cov is not None:
+                i = self.offsets[mt]
+                d[i:i + self.ng] = np.diag(cov)
+        return d
+
+    def __matmul__(self, x: np.ndarray) -> np.ndarray:
+        """Multiply by a vector or matrix block by block."""
+        ng = self.ng
+        y = np.zeros((self.size,) + x.shape[1:], dtype=np.result_type(x, np.float64))
+        for i, j, cov in self._placed_blocks():
+            y[i:i + ng] += cov @ x[j:j + ng]
+        return y
+
+    def layout(self, valid_mts=None) -> "PerturbationLayout":
+        """Layout of the rows of the dense matrix, see `PerturbationLayout`."""
+        return PerturbationLayout(self.mat, self.mts, self.energy_grid, valid_mts)
+
+    def index(self) -> pd.MultiIndex:
+        """Build the (MAT, MT, E) index of the dense matrix without row iteration."""
+        eg = pd.IntervalIndex.from_breaks(self.energy_grid)
+        n_mt = len(self.mts)
+        return pd.MultiIndex.from_arrays(
+            [
+                np.full(self.size, self.mat),
+                np.repeat(self.mts, self.ng),
+                eg[np.tile(np.arange(self.ng), n_mt)],
+            ],
+            names=["MAT", "MT", "E"],
+        )
+
+
+class PerturbationLayout:
+    """
+    (MAT, MT, group) layout of the rows of a nuclide's covariance, i.e. of a
+    KL sample, stored alongside the SVD so that samples can be turned into
+    perturbations without reading the errorr file.
+
+    MT `mts[i]` covers rows `offsets[i]:offsets[i] + ng`. `valid_mts` are the
+    MTs also present in the pendf, which are perturbed in the NJOY mode.
+    """
+
+    def __init__(self, mat: int, mts: list[int], energy_grid: np.ndarray, valid_mts=None):
+        self.mat = int(mat)
+        self.mts = [int(mt) for mt in mts]
+        self.energy_grid = np.asarray(energy_grid, dtype=np.float64)
+        self.valid_mts = None if valid_mts is None else np.asarray(valid_mts, dtype=int)
+        self._rows = {mt: i for i, mt in enumerate(self.mts)}
+
+    @property
+    def ng(self) -> int:
+        return self.energy_grid.size - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.mts) * self.ng
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return np.arange(len(self.mts)) * self.ng
+
+    def row(self, mt: int) -> int:
+        """Row of `mt` in the (n_mt, ng) factors."""
+        return self._rows[mt]
+
+    def factors(self, sample: np.ndarray) -> np.ndarray:
+        """Group-wise multiplicative factors (n_mt, ng) of a KL sample, clamped to [0, 2]."""
+        if sample.size != self.size:
+            raise ValueError(f"Sample has {sample.size} rows, the layout {self.size}.")
+        return np.clip(sample.reshape(len(self.mts), self.ng) + 1.0, 0.0, 2.0)
+
+    def factor_dict(self, factors: np.ndarray) -> dict[int, np.ndarray]:
+        """`factors` as MT -> group factors (views, not copies)."""
+        return {mt: factors[i] for i, mt in enumerate(self.mts)}
@@ -0,0 +1,142 @@
+import copy
+from functools import lru_cache
+import numpy as np
+
+import openmc.data
+
+from .library import ModelClosure, load_library, select_temperatures
+
+
+@lru_cache(maxsize=None)
+def load_reference(nuclide: str, cross_sections_xml: str) -> openmc.data.IncidentNeutron:
+    """
+    Load the unperturbed `IncidentNeutron` data of a nuclide from an OpenMC library.
+    Cached, so each process reads a reference file only once.
+    """
+    path = load_library(cross_sections_xml).get(nuclide)
+    if path is None:
+        raise ValueError(f"{nuclide} is not in the OpenMC library '{cross_sections_xml}'.")
+    return openmc.data.IncidentNeutron.from_hdf5(path)
+
+
+def prune_temperatures(data: openmc.data.IncidentNeutron, closure: ModelClosure) -> openmc.data.IncidentNeutron:
+    """
+    Reduce `data` to the temperatures OpenMC uses for the model of `closure`
+    (see `library.select_temperatures`). Returns a copy, or `data` itself if
+    every temperature is needed.
+    """
+    available = {float(T.rstrip("K")): T for T in data.temperatures}
+    keep = {available[T] for T in select_temperatures(available, closure)}
+    if len(keep) == len(available):
+        return data
+
+    data = copy.deepcopy(data)
+    temperatures = data.temperatures
+    data.kTs = [kT for kT, T in zip(data.kTs, temperatures) if T in keep]
+    for T in temperatures:
+        if T in keep:
+            continue
+        data.energy.pop(T, None)
+        data.urr.pop(T, None)
+        for rx in data.reactions.values():
+            rx.xs.pop(T, None)
+
+    print(f"Kept temperatures {sorted(keep)} of {data.name} out of {temperatures}")
+    return data
+
+
+def group_factor(energy_grid: np.ndarray, factors: np.ndarray, energy: np.ndarray) -> np.ndarray:
+    """
+    Evaluate piecewise-constant group factors at `energy`.
+
+    Group `g` covers (energy_grid[g], energy_grid[g + 1]], the first group
+    extends down to zero and energies above the grid are left unperturbed,
+    as for a `sandy.Pert` indexed by the upper group boundaries.
+    """
+    g = np.searchsorted(energy_grid[1:], energy, side="left")
+    return np.append(factors, 1.0)[g]
+
+
+def _scale_reaction(data: openmc.data.IncidentNeutron, mt: int, energy_grid, factors) -> None:
+    """Multiply every temperature of reaction `mt` by the group factors."""
+    for xs in data.reactions[mt].xs.values():
+        xs.y = xs.y * group_factor(energy_grid, factors, xs.x)
+
+
+def _scale_urr(data: openmc.data.IncidentNeutron, energy_grid, factors: dict) -> None:
+    """
+    Scale absolute URR probability tables. Tables stored as factors of the
+    smooth cross section (`multiply_smooth`) already follow the perturbation.
+    """
+    # Table columns: 1 total, 2 elastic, 3 fission, 4 (n,gamma)
+    columns = {2: 2, 18: 3, 102: 4}
+    for ptable in data.urr.values():
+        if ptable.multiply_smooth:
+            continue
+        table = ptable.table
+        for mt, col in columns.items():
+            if mt in factors:
+                f = group_factor(energy_grid, factors[mt], ptable.energy)[:, None]
+                delta = table[:, col, :] * (f - 1.0)
+                table[:, col, :] += delta
+                table[:, 1, :] += delta
+
+
+def reconstruct_sums(data: openmc.data.IncidentNeutron) -> None:
+    """
+    Rebuild every redundant reaction from its non-redundant components, the
+    HDF5 equivalent of `sandy.Xs.reconstruct_sums`.
+    """
+    for mt, rx in data.reactions.items():
+        if not rx.redundant:
+            continue
+        components = [c for c in data.get_reaction_components(mt) if c != mt]
+        if len(components) == 0:
+            continue
+
+        for T in rx.xs:
+            energy = data.energy[T]
+            total = np.zeros_like(energy)
+            threshold = energy.size
+            for c in components:
+                xs = data.reactions[c].xs[T]
+                idx = getattr(xs, "_threshold_idx", 0)
+                total[idx:idx + xs.y.size] += xs.y
+                threshold = min(threshold, idx)
+
+            xs = openmc.data.Tabulated1D(energy[threshold:], total[threshold:])
+            xs._threshold_idx = threshold
+            rx.xs[T] = xs
+
+
+def perturb_incident_neutron(
+    reference: openmc.data.IncidentNeutron,
+    energy_grid: np.ndarray,
+    factors: dict[int, np.ndarray],
+) -> openmc.data.IncidentNeutron:
+    """
+    Return a copy of `reference` with group-wise multiplicative `factors`
+    applied to each MT on its own energy grid.
+
+    Factors for redundant MTs with components in the data are dropped, as
+    their sums are rebuilt from the components afterwards, the same as
+    `sandy.Xs.reconstruct_sums` does in the NJOY path. Redundant reactions
+    stored without any of their components are scaled directly.
+    """
+    data = copy.deepcopy(reference)
+
+    scaled = {}
+    for mt, f in factors.items():
+        if mt not in data.reactions:
+            continue
+        components = [c for c in data.get_reaction_components(mt) if c != mt]
+        if not data.reactions[mt].redundant or len(components) == 0:
+            scaled[mt] = f
+
+    for mt, f in scaled.items():
+        _scale_reaction(data, mt, energy_grid, f)
+
+    _scale_urr(data, energy_grid, scaled)
+    reconstruct_sums(data)
+
+    return data
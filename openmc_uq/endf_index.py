@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import openmc.data
+
+from .cache import CACHE_DIR_ENV
+
+
+INDEX_VERSION = 1
+
+# In-process copy of each directory's index, keyed by resolved directory
+_indices = {}
+
+
+def _endf_float(field: str) -> float:
+    """Parse an ENDF-6 float such as ' 7.418400+4' (exponent without 'E')."""
+    field = field.strip()
+    return float(re.sub(r"(?<=[0-9.])([+-])(?=\d)", r"e\1", field))
+
+
+def parse_endf_header(path: str | Path) -> tuple[int, int, int] | None:
+    """
+    Read (Z, A, metastable state) from the MF1/MT451 header of an ENDF-6 file,
+    or return None if the file does not start like an ENDF-6 tape.
+    """
+    try:
+        with open(path, "r", errors="replace") as f:
+            lines = [f.readline() for _ in range(6)]
+    except OSError:
+        return None
+
+    for i, line in enumerate(lines[:-1]):
+        if len(line) < 75 or line[70:72].strip() != "1" or line[72:75].strip() != "451":
+            continue
+        try:
+            za = int(_endf_float(line[0:11]))
+            liso = int(lines[i + 1][33:44])
+        except ValueError:
+            return None
+        return za // 1000, za % 1000, liso
+
+    return None
+
+
+def parse_endf_name(name: str) -> tuple[int, int, int] | None:
+    """
+    Guess (Z, A, metastable state) from an ENDF file name such as
+    'n-074_W_184.endf', 'n-W184.tendl' or 'n-095_Am_242m1.endf'.
+    """
+    stem = name.split(".")[0]
+    match = re.search(r"(?<![A-Za-z])([A-Z][a-z]?)[-_]?0*(\d{1,3})(?:m(\d?))?(?![0-9])", stem)
+    if match is None or match.group(1) not in openmc.data.ATOMIC_NUMBER:
+        return None
+
+    symbol, mass, meta = match.groups()
+    m = 0 if meta is None else int(meta or 1)
+    return openmc.data.ATOMIC_NUMBER[symbol], int(mass), m
+
+
+def _index_file(endf_dir: Path) -> Path:
+    """
+    Index location, in the parsed-data cache directory if configured or the
+    user cache otherwise. It is kept out of the ENDF directory so that
+    writing it does not change the directory mtime it is validated against.
+    """
+    cache_dir = os.getenv(CACHE_DIR_ENV) or Path.home() / ".cache" / "openmc_uq"
+    digest = hashlib.sha256(str(endf_dir).encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"endf_index_{digest}.json"
+
+
+def build_endf_index(endf_dir: str | Path) -> dict[tuple[int, int, int], list[str]]:
+    """Scan an ENDF directory once and map (Z, A, m) to the file names found."""
+    endf_dir = Path(endf_dir).resolve()
+    index = {}
+    for entry in os.scandir(endf_dir):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        zam = parse_endf_header(entry.path) or parse_endf_name(entry.name)
+        if zam is not None:
+            index.setdefault(zam, []).append(entry.name)
+    return index
+
+
+def get_endf_index(endf_dir: str | Path) -> dict[tuple[int, int, int], list[str]]:
+    """
+    Return the (Z, A, m) index of an ENDF directory.
+
+    The index is kept in memory and cached on disk, and rebuilt whenever the
+    directory's mtime changes (i.e. files were added, removed or renamed).
+    """
+    endf_dir = Path(endf_dir).resolve()
+    mtime = endf_dir.stat().st_mtime_ns
+
+    cached = _indices.get(endf_dir)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    index_file = _index_file(endf_dir)
+    index = None
+    if index_file.is_file():
+        try:
+            with open(index_file) as f:
+                stored = json.load(f)
+            if stored["version"] == INDEX_VERSION and stored["mtime_ns"] == mtime:
+                index = {tuple(json.loads(k)): v for k, v in stored["entries"].items()}
+        except (ValueError, KeyError):
+            index = None
+
+    if index is None:
+        print(f"Indexing ENDF directory {endf_dir}...")
+        index = build_endf_index(endf_dir)
+        stored = {
+            "version": INDEX_VERSION,
+            "endf_dir": str(endf_dir),
+            "mtime_ns": mtime,
+            "entries": {json.dumps(list(k)): v for k, v in index.items()},
+        }
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, "w") as f:
+                json.dump(stored, f)
+            os.replace(tmp_file, index_file)
+        except OSError as exc:
+            print(f"Could not save ENDF index to {index_file}: {exc}")
+
+    _indices[endf_dir] = (mtime, index)
+    return index
+
+
+def find_endf_file(endf_dir: str | Path, nuclide: str) -> str:
+    """
+    Return the path of a nuclide's ENDF file, or an empty string if there is none.
+    If several files match, the shortest name is used.
+    """
+    try:
+        zam = openmc.data.zam(nuclide)
+    except ValueError:
+        print(f"  Cannot interpret nuclide name {nuclide}")
+        return ""
+
+    matches = get_endf_index(endf_dir).get(zam, [])
+
+    if len(matches) == 0:
+        print(f"  No files matched for {nuclide}")
+        return ""
+
+    if len(matches) == 1:
+        print(f"  Using {matches[0]} for {nuclide}")
+        return str(Path(endf_dir) / matches[0])
+
+    shortest = min(matches, key=len)
+    print(f"  Multiple files matched for {nuclide}: {matches}. Using shortest: {shortest}")
+    return str(Path(endf_dir) / shortest)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+Write the minimal cross section library of an OpenMC model.
+
+The library only lists the data the model can load: the neutron and
+multipole data of its nuclides, the thermal scattering tables of its
+materials and, with photon transport, the photon data of their elements.
+OpenMC parses the whole library at start-up, so pointing `cross_section_path`
+at this manifest shortens the initialisation of every sample:
+
+    python3 -m openmc_uq.library /data/tendl/cross_sections.xml model_dir -o model_dir/cross_sections_model.xml
+"""
+import argparse
+import os
+import re
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+import xml.etree.ElementTree as ET
+
+from .utils import get_nuclides_from_materials_xml
+
+# Parsed base libraries, keyed by resolved path, with the mtime they were parsed at
+_libraries = {}
+
+# Model closures, keyed by model directory, with the mtimes of its inputs
+_closures = {}
+
+# OpenMC's default temperature when neither cells nor materials set one [K]
+DEFAULT_TEMPERATURE = 293.6
+
+TEMPERATURE_METHODS = ("nearest", "interpolation")
+
+
+class ModelClosure:
+    """
+    Everything an OpenMC model can load from its cross section library: the
+    nuclides and thermal scattering tables of its materials, the elements
+    whose photon data are needed (only with photon transport) and the
+    temperatures it is evaluated at.
+    """
+
+    def __init__(
+        self,
+        nuclides,
+        thermal=(),
+        elements=(),
+        temperatures=(DEFAULT_TEMPERATURE,),
+        temperature_method: str = "nearest",
+        temperature_tolerance: float = 10.0,
+        temperature_range: tuple[float, float] | None = None,
+    ):
+        self.nuclides = set(nuclides)
+        self.thermal = set(thermal)
+        self.elements = set(elements)
+        self.temperatures = sorted(set(temperatures))
+        self.temperature_method = temperature_method
+        self.temperature_tolerance = temperature_tolerance
+        self.temperature_range = temperature_range
+
+    def names(self, data_type: str) -> set[str] | None:
+        """Materials of the library entries of `data_type` to keep, or None to keep all of them."""
+        if data_type in ("neutron", "wmp"):
+            return self.nuclides
+        if data_type == "thermal":
+            return self.thermal
+        if data_type == "photon":
+            return self.elements
+        return None
+
+
+def _element(nuclide: str) -> str:
+    return re.match(r"[A-Z][a-z]?", nuclide).group(0)
+
+
+def _temperatures(element: ET.Element | None) -> list[float]:
+    if element is None or not element.get("temperature"):
+        return []
+    return [float(T) for T in element.get("temperature").split()]
+
+
+def _setting(root: ET.Element, name: str) -> str | None:
+    element = root.find(name)
+    return None if element is None or element.text is None else element.text.strip()
+
+
+def model_closure(openmc_xml_dir: str | Path) -> ModelClosure:
+    """
+    Closure of the model in `openmc_xml_dir`, from its materials.xml,
+    settings.xml and (for cell temperatures) geometry.xml. Cached per process
+    until one of them changes.
+    """
+    openmc_xml_dir = Path(openmc_xml_dir).resolve()
+    files = [openmc_xml_dir / name for name in ("materials.xml", "settings.xml", "geometry.xml")]
+    key = tuple(file.stat().st_mtime_ns if file.is_file() else None for file in files)
+    cached = _closures.get(openmc_xml_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    materials_xml, settings_xml, geometry_xml = files
+    nuclides = get_nuclides_from_materials_xml(materials_xml)
+    materials = ET.parse(materials_xml).getroot()
+    thermal = [sab.get("name") for sab in materials.iter("sab") if sab.get("name")]
+
+    temperatures = []
+    for material in materials.iter("material"):
+        temperatures.extend(_temperatures(material))
+    if geometry_xml.is_file():
+        for cell in ET.parse(geometry_xml).getroot().iter("cell"):
+            temperatures.extend(_temperatures(cell))
+
+    kwargs = {}
+    elements = []
+    default = DEFAULT_TEMPERATURE
+    if settings_xml.is_file():
+        settings = ET.parse(settings_xml).getroot()
+        if (_setting(settings, "photon_transport") or "false").lower() == "true":
+            elements = sorted({_element(nuc) for nuc in nuclides})
+        default = float(_setting(settings, "temperature_default") or default)
+        if _setting(settings, "temperature_method"):
+            kwargs["temperature_method"] = _setting(settings, "temperature_method")
+        if _setting(settings, "temperature_tolerance"):
+            kwargs["temperature_tolerance"] = float(_setting(settings, "temperature_tolerance"))
+        if _setting(settings, "temperature_range"):
+            kwargs["temperature_range"] = tuple(float(T) for T in _setting(settings, "temperature_range").split())
+    # Cells and materials without a temperature of their own use the default
+    temperatures.append(default)
+
+    closure = ModelClosure(nuclides, thermal, elements, temperatures, **kwargs)
+    _closures[openmc_xml_dir] = (key, closure)
+    return closure
+
+
+def select_temperatures(available, closure: ModelClosure) -> list[float]:
+    """
+    Temperatures of `available` [K] that OpenMC can use for the model of
+    `closure`: the nearest to each model temperature, or the two bracketing
+    it with `temperature_method="interpolation"`, plus any inside the
+    `temperature_range` setting.
+    """
+    if closure.temperature_method not in TEMPERATURE_METHODS:
+        raise ValueError(f"Unknown temperature method '{closure.temperature_method}'. Expected one of {TEMPERATURE_METHODS}.")
+    available = sorted(available)
+    if len(available) == 0:
+        return []
+
+    selected = set()
+    for T in closure.temperatures:
+        if closure.temperature_method == "nearest" or T <= available[0] or T >= available[-1]:
+            selected.add(min(available, key=lambda a: abs(a - T)))
+        else:
+            upper = next(i for i, a in enumerate(available) if a >= T)
+            selected.update(available[max(upper - 1, 0):upper + 1])
+
+    if closure.temperature_range is not None:
+        low, high = closure.temperature_range
+        selected.update(a for a in available if low <= a <= high)
+    return sorted(selected)
+
+
+def _library_line(materials: str, path: str, data_type: str) -> str:
+    return f"  <library materials={quoteattr(materials)} path={quoteattr(path)} type={quoteattr(data_type)} />\n"
+
+
+class BaseLibrary:
+    """
+    Compact form of an OpenMC cross_sections.xml: the materials, absolute
+    path and type of every entry, plus its pre-formatted XML line.
+
+    Parsing a full library (thousands of entries for TENDL) and exporting it
+    again is done once per process, after which `write` emits a sample's
+    library by concatenating the kept lines with the perturbed entries.
+    """
+
+    def __init__(self, cross_sections_xml: str | Path):
+        self.path = Path(cross_sections_xml).resolve()
+        root = ET.parse(self.path).getroot()
+
+        directory = root.find("directory")
+        base = self.path.parent
+        if directory is not None and directory.text:
+            base = base / directory.text.strip()
+
+        # (materials, path, type)
+        self.entries = []
+        for element in root.iter("library"):
+            path = Path(element.get("path"))
+            if not path.is_absolute():
+                path = base / path
+            self.entries.append((element.get("materials", ""), str(path), element.get("type", "neutron")))
+        self._lines = [_library_line(*entry) for entry in self.entries]
+
+        self._by_material = {}
+        for i, (materials, _, data_type) in enumerate(self.entries):
+            for material in materials.split():
+                self._by_material.setdefault((material, data_type), i)
+
+        # id(closure) -> (closure, kept entry indices)
+        self._kept = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, material: str, data_type: str = "neutron") -> str | None:
+        """Path of the `data_type` entry of `material`, or None if not in the library."""
+        i = self._by_material.get((material, data_type))
+        return None if i is None else self.entries[i][1]
+
+    def _pruned(self, closure: ModelClosure) -> list[int]:
+        """Indices of the entries the model of `closure` can load, computed once per closure."""
+        cached = self._kept.get(id(closure))
+        if cached is not None and cached[0] is closure:
+            return cached[1]
+
+        thermal = {m for (m, data_type) in self._by_material if data_type == "thermal"}
+        missing = closure.thermal - thermal
+        if missing:
+            # e.g. legacy names such as HH2O, which OpenMC maps itself
+            print(f"Thermal scattering data {sorted(missing)} not found by name, keeping every thermal entry")
+
+        kept = []
+        for i, (materials, _, data_type) in enumerate(self.entries):
+            wanted = None if data_type == "thermal" and missing else closure.names(data_type)
+            if wanted is None or any(name in wanted for name in materials.split()):
+                kept.append(i)
+        self._kept[id(closure)] = (closure, kept)
+        return kept
+
+    def write(
+        self,
+        out_file: str | Path,
+        perturbed: dict[str, str | Path] | None = None,
+        closure: ModelClosure | None = None,
+    ) -> Path:
+        """
+        Write a cross_sections.xml with the `perturbed` files (perturbed name
+        -> HDF5 path) added as neutron entries, without opening them.
+
+        With a `closure` (see `model_closure`) only the entries the model can
+        load are kept, which also shortens OpenMC's own parse of the library.
+        """
+        out_file = Path(out_file)
+        extra = [(name, str(Path(path).resolve())) for name, path in (perturbed or {}).items()]
+        # A perturbed name shadowing a base entry replaces it
+        replaced = {name for name, _ in extra}
+
+        parts = ["<?xml version='1.0' encoding='utf-8'?>\n", "<cross_sections>\n"]
+        kept = range(len(self.entries)) if closure is None else self._pruned(closure)
+        if replaced:
+            kept = [i for i in kept if not any(name in replaced for name in self.entries[i][0].split())]
+        parts.extend(self._lines[i] for i in kept)
+        parts.extend(_library_line(name, path, "neutron") for name, path in extra)
+        parts.append("</cross_sections>\n")
+
+        tmp = out_file.with_name(f"{out_file.name}.{os.getpid()}.tmp")
+        tmp.write_text("".join(parts))
+        os.replace(tmp, out_file)
+        return out_file
+
+
+def load_library(cross_sections_xml: str | Path) -> BaseLibrary:
+    """Parsed base library `cross_sections_xml`, cached per process until the file changes."""
+    path = Path(cross_sections_xml).resolve()
+    mtime = path.stat().st_mtime_ns
+    cached = _libraries.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, BaseLibrary(path))
+        _libraries[path] = cached
+    return cached[1]
+
+
+def write_sample_library(
+    cross_sections_xml: str | Path,
+    random_nuclides,
+    out_file: str | Path,
+    closure: ModelClosure | None = None,
+) -> Path:
+    """
+    Write the cross section library of one sample: the cached base library
+    `cross_sections_xml` (optionally pruned to a model `closure`) with the
+    perturbed `random_nuclides` (`RandomData`) merged in.
+    """
+    perturbed = {nuc.perturbed_name: nuc.path for nuc in random_nuclides}
+    return load_library(cross_sections_xml).write(out_file, perturbed, closure)
+
+
+def write_model_library(cross_sections_xml: str | Path, openmc_xml_dir: str | Path, out_file: str | Path) -> Path:
+    """
+    Write the library manifest of a campaign: `cross_sections_xml` pruned to
+    the closure of the model in `openmc_xml_dir`.
+    """
+    library = load_library(cross_sections_xml)
+    out_file = library.write(out_file, closure=model_closure(openmc_xml_dir))
+    n = len(load_library(out_file))
+    print(f"Wrote {out_file} with {n} of the {len(library)} entries of {library.path}")
+    return out_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cross_sections_xml", help="Full OpenMC library")
+    parser.add_argument("openmc_xml_dir", help="Directory of the model's XML inputs")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Output manifest (default: <openmc_xml_dir>/cross_sections_model.xml)")
+    args = parser.parse_args()
+
+    output = args.output or Path(args.openmc_xml_dir) / "cross_sections_model.xml"
+    write_model_library(args.cross_sections_xml, args.openmc_xml_dir, output)
+
+
+if __name__ == "__main__":
+    main()
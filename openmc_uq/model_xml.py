@@ -0,0 +1,131 @@
+from pathlib import Path
+import xml.etree.ElementTree as ET
+
+# Parsed templates, keyed by resolved path, with the mtime they were parsed at
+_templates = {}
+
+
+class XMLTemplate:
+    """
+    A parsed OpenMC input (materials.xml or tallies.xml) in which nuclides
+    can be substituted by exact name.
+
+    The places a nuclide name can appear are indexed once: `name` attributes
+    of `<nuclide>` elements, `nuclide` attributes (e.g. tally derivatives)
+    and the space-separated tokens of `<nuclides>` elements. `render` then
+    only sets those values and serializes.
+    """
+
+    def __init__(self, xml_file: str | Path):
+        self.path = Path(xml_file).resolve()
+        self.tree = ET.parse(self.path)
+        root = self.tree.getroot()
+
+        # nuclide -> [(element, attribute)]
+        self._attributes = {}
+        for element in root.iter("nuclide"):
+            name = element.get("name")
+            if name:
+                self._attributes.setdefault(name, []).append((element, "name"))
+        for element in root.iter():
+            name = element.get("nuclide")
+            if name:
+                self._attributes.setdefault(name, []).append((element, "nuclide"))
+
+        # (element, tokens) of every <nuclides> list
+        self._token_lists = [
+            (element, (element.text or "").split()) for element in root.iter("nuclides")
+        ]
+
+    @property
+    def nuclides(self) -> list[str]:
+        """Every nuclide name the template refers to."""
+        names = list(self._attributes)
+        for _, tokens in self._token_lists:
+            for token in tokens:
+                if token not in names:
+                    names.append(token)
+        return names
+
+    def render(self, nuclide_map: dict[str, str], cross_sections: str | Path | None = None) -> bytes:
+        """Serialize the template with nuclides renamed by `nuclide_map` (and `cross_sections` set)."""
+        root = self.tree.getroot()
+        changed = []
+
+        for old, new in nuclide_map.items():
+            for element, attribute in self._attributes.get(old, []):
+                changed.append((element, attribute, element.get(attribute)))
+                element.set(attribute, new)
+
+        for element, tokens in self._token_lists:
+            if any(t in nuclide_map for t in tokens):
+                changed.append((element, None, element.text))
+                element.text = " ".join(nuclide_map.get(t, t) for t in tokens)
+
+        added = None
+        if cross_sections is not None:
+            element = root.find("cross_sections")
+            if element is None:
+                added = element = ET.Element("cross_sections")
+                element.tail = root.text
+                root.insert(0, element)
+            else:
+                changed.append((element, None, element.text))
+            element.text = str(cross_sections)
+
+        try:
+            return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+        finally:
+            # Restore the template for the next sample
+            for element, attribute, value in reversed(changed):
+                if attribute is None:
+                    element.text = value
+                else:
+                    element.set(attribute, value)
+            if added is not None:
+                root.remove(added)
+
+
+def load_template(xml_file: str | Path) -> XMLTemplate:
+    """Parsed template of `xml_file`, cached per process until the file changes."""
+    path = Path(xml_file).resolve()
+    mtime = path.stat().st_mtime_ns
+    cached = _templates.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, XMLTemplate(path))
+        _templates[path] = cached
+    return cached[1]
+
+
+def substitute_nuclides(
+    xml_file: str | Path,
+    nuclide_map: dict[str, str],
+    out_file: str | Path | None = None,
+    cross_sections: str | Path | None = None,
+) -> None:
+    """
+    Rename nuclides of an OpenMC XML input in a single pass and write it to
+    `out_file` (default: in place). Only exact names are replaced, so `W18`
+    never matches inside `W180` nor `Li6` inside `Li6-rand`.
+    """
+    out_file = Path(xml_file if out_file is None else out_file)
+    content = load_template(xml_file).render(nuclide_map, cross_sections)
+    if out_file.is_symlink():
+        out_file.unlink()
+    out_file.write_bytes(content)
+
+
+def write_model_inputs(
+    openmc_xml_dir: str | Path,
+    run_dir: str | Path,
+    nuclide_map: dict[str, str],
+    cross_sections: str | Path | None = None,
+) -> None:
+    """
+    Write the materials.xml and tallies.xml of one sample into `run_dir`,
+    rendered from the cached templates in `openmc_xml_dir`.
+    """
+    openmc_xml_dir = Path(openmc_xml_dir).resolve()
+    run_dir = Path(run_dir).resolve()
+    substitute_nuclides(openmc_xml_dir / "materials.xml", nuclide_map, run_dir / "materials.xml", cross_sections)
+    substitute_nuclides(openmc_xml_dir / "tallies.xml", nuclide_map, run_dir / "tallies.xml")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+"""
+Per-stage timing and resource traces of the sampling and run pipeline.
+
+With `OPENMC_UQ_TRACE_DIR` set, every process appends one JSON line per
+completed stage to `<trace_dir>/trace-<writer>-<pid>.jsonl` (see
+`results.default_writer_name`):
+
+    name           stage, e.g. "njoy" or "openmc"
+    ts, wall       start (Unix time) and wall time in seconds
+    cpu            CPU seconds of the process and the children it waited for
+    peak_rss_mb    peak resident memory during the stage (the process
+                   high-water mark where it cannot be reset)
+    written_mb     bytes passed to write calls, children included
+    depth          nesting level, stages inside stages have depth > 0
+    pid            process id
+    nuclide, sample, ...   context of the stage, inherited by nested stages
+
+Traces are aggregated across a campaign, or converted to the Chrome trace
+format (chrome://tracing, Perfetto) with
+
+    python -m openmc_uq.profiling summary trace_dir [--by nuclide] [--sample 3]
+    python -m openmc_uq.profiling chrome trace_dir trace.json [--sample 3]
+"""
+import argparse
+import functools
+import inspect
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+TRACE_DIR_ENV = "OPENMC_UQ_TRACE_DIR"
+
+
+def _read_status(field: str) -> int | None:
+    """A memory field of /proc/self/status in kB, or None where unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_kb() -> int:
+    peak = _read_status("VmHWM")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if peak is None else peak
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS of this process to its current RSS (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _bytes_written() -> int | None:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _cpu_time() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Tracer:
+    """Writes the stages of this process to a JSON lines trace file."""
+
+    def __init__(self, trace_dir: str | Path):
+        from .results import default_writer_name
+
+        self.trace_dir = Path(trace_dir)
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self.path = self.trace_dir / f"trace-{default_writer_name()}-{self.pid}.jsonl"
+        self._file = None
+        self._stack = []
+        self.context = {}
+
+    def _write(self, event: dict) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(event, default=str) + "\n")
+        self._file.flush()
+
+    @contextmanager
+    def stage(self, name: str, **args):
+        # The enclosing stages keep their peak so far, the high-water mark is reset for this one
+        peak = _peak_rss_kb()
+        for frame in self._stack:
+            frame["peak"] = max(frame["peak"], peak)
+        resettable = _reset_peak_rss()
+
+        context = dict(self._stack[-1]["args"] if self._stack else self.context, **args)
+        frame = {"args": context, "peak": 0}
+        self._stack.append(frame)
+        written = _bytes_written()
+        ts, start, cpu = time.time(), time.perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start, _cpu_time() - cpu
+            end_written = _bytes_written()
+            self._stack.pop()
+            frame["peak"] = max(frame["peak"], _peak_rss_kb()) if resettable else _peak_rss_kb()
+            self._write({
+                "name": name,
+                "ts": ts,
+                "wall": wall,
+                "cpu": cpu,
+                "peak_rss_mb": frame["peak"] / 1024,
+                "written_mb": None if written is None else (end_written - written) / 1024**2,
+                "depth": len(self._stack),
+                "pid": self.pid,
+                **context,
+            })
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_tracer = None
+_context = {}
+
+
+def get_tracer() -> Tracer | None:
+    """The tracer of this process, enabled by `$OPENMC_UQ_TRACE_DIR`, or None."""
+    global _tracer
+    trace_dir = os.getenv(TRACE_DIR_ENV)
+    if not trace_dir:
+        return None
+    # Forked workers start their own trace file
+    if _tracer is None or _tracer.pid != os.getpid() or _tracer.trace_dir != Path(trace_dir):
+        _tracer = Tracer(trace_dir)
+    _tracer.context = _context
+    return _tracer
+
+
+def set_context(**context) -> None:
+    """Attach `context` (e.g. `sample=k`) to the stages traced from now on in this process."""
+    _context.clear()
+    _context.update(context)
+
+
+def stage(name: str, **args):
+    """Context manager tracing a stage of the pipeline, a no-op unless tracing is enabled."""
+    tracer = get_tracer()
+    return nullcontext() if tracer is None else tracer.stage(name, **args)
+
+
+def traced(name: str):
+    """
+    Decorator tracing every call of a function as the stage `name`, with its
+    `nuclide` argument as context if it has one.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        has_nuclide = "nuclide" in signature.parameters
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if tracer is None:
+                return func(*args, **kwargs)
+            context = {}
+            if has_nuclide:
+                context["nuclide"] = signature.bind_partial(*args, **kwargs).arguments.get("nuclide")
+            with tracer.stage(name, **context):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def call_with_context(context: dict, func, *args, **kwargs):
+    """Call `func` with `context` attached to its stages, e.g. as a pool task of sample k."""
+    set_context(**context)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        set_context()
+
+
+def load_trace(path: str | Path, sample: int | None = None) -> list[dict]:
+    """The events of a trace file, or of every trace file in a directory, optionally of one sample."""
+    path = Path(path)
+    files = sorted(path.glob("*.jsonl")) if path.is_dir() else [path]
+    events = []
+    for file in files:
+        with open(file) as f:
+            for line in f:
+                if line.strip():
+                    events.append(json.loads(line))
+    if sample is not None:
+        events = [e for e in events if e.get("sample") == sample]
+    return events
+
+
+def summarise(events: list[dict], by: tuple[str, ...] = ()) -> list[dict]:
+    """
+    Aggregate events per stage (and per `by` fields, e.g. `("nuclide",)`),
+    sorted by total wall time.
+    """
+    groups = {}
+    for event in events:
+        key = (event["name"], *(event.get(field) for field in by))
+        groups.setdefault(key, []).append(event)
+
+    rows = []
+    for key, group in groups.items():
+        walls = sorted(e["wall"] for e in group)
+        written = [e["written_mb"] for e in group if e.get("written_mb") is not None]
+        rows.append({
+            "stage": key[0],
+            **dict(zip(by, key[1:])),
+            "n": len(group),
+            "wall": sum(walls),
+            "wall_mean": sum(walls) / len(walls),
+            "wall_median": walls[len(walls) // 2],
+            "wall_max": walls[-1],
+            "cpu": sum(e["cpu"] for e in group),
+            "peak_rss_mb": max(e["peak_rss_mb"] for e in group),
+            "written_mb": sum(written) if written else None,
+        })
+    return sorted(rows, key=lambda row: row["wall"], reverse=True)
+
+
+def print_summary(rows: list[dict], by: tuple[str, ...] = ()) -> None:
+    header = f"{'stage':<24}" + "".join(f"{field:<12}" for field in by)
+    print(header + f"{'n':>6}{'wall [s]':>11}{'mean':>9}{'median':>9}{'max':>9}"
+                   f"{'cpu [s]':>10}{'peak [MB]':>11}{'written [MB]':>14}")
+    for row in rows:
+        written = "" if row["written_mb"] is None else f"{row['written_mb']:.1f}"
+        print(f"{row['stage']:<24}" + "".join(f"{str(row[field]):<12}" for field in by)
+              + f"{row['n']:>6}{row['wall']:>11.2f}{row['wall_mean']:>9.3f}{row['wall_median']:>9.3f}"
+              f"{row['wall_max']:>9.3f}{row['cpu']:>10.2f}{row['peak_rss_mb']:>11.1f}{written:>14}")
+
+
+def to_chrome_trace(events: list[dict], output: str | Path) -> Path:
+    """Write events in the Chrome trace event format."""
+    fields = ("name", "ts", "wall", "pid", "depth")
+    trace = [
+        {
+            "name": e["name"] if e.get("nuclide") is None else f"{e['name']} {e['nuclide']}",
+            "ph": "X",
+            "ts": e["ts"] * 1e6,
+            "dur": e["wall"] * 1e6,
+            "pid": e["pid"],
+            "tid": e["pid"],
+            "args": {k: v for k, v in e.items() if k not in fields},
+        }
+        for e in events
+    ]
+    with open(output, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+    return Path(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="Aggregate the stages of trace files")
+    summary.add_argument("path", help="Trace file or directory")
+    summary.add_argument("--by", nargs="*", default=[], help="Also group by these fields, e.g. nuclide")
+    summary.add_argument("--sample", type=int, default=None, help="Only this sample")
+    chrome = subparsers.add_parser("chrome", help="Convert trace files to the Chrome trace format")
+    chrome.add_argument("path", help="Trace file or directory")
+    chrome.add_argument("output")
+    chrome.add_argument("--sample", type=int, default=None, help="Only this sample")
+    args = parser.parse_args()
+
+    events = load_trace(args.path, args.sample)
+    if args.command == "summary":
+        print(f"{len(events)} stages")
+        print_summary(summarise(events, tuple(args.by)), tuple(args.by))
+    else:
+        to_chrome_trace(events, args.output)
+        print(f"Wrote {len(events)} stages to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
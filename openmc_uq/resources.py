@@ -0,0 +1,144 @@
+import os
+from multiprocessing import Pool
+
+from threadpoolctl import threadpool_limits
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# Share of the cores given to the sampling workers when they run alongside OpenMC
+SAMPLING_SHARE = 8
+
+
+def available_cpus() -> list[int]:
+    """CPUs this process may run on, i.e. its affinity mask (the allocation under Slurm)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def thread_env(threads: int) -> dict[str, str]:
+    """Environment limiting OpenMP and BLAS libraries to `threads` threads."""
+    return {var: str(threads) for var in THREAD_ENV_VARS}
+
+
+def openmc_env(threads: int) -> dict[str, str]:
+    """Environment of an OpenMC process with `threads` threads, each bound to a core of its CPU set."""
+    return {**thread_env(threads), "OMP_PLACES": "cores", "OMP_PROC_BIND": "close"}
+
+
+def limit_threads(threads: int) -> threadpool_limits:
+    """
+    Limit BLAS/OpenMP threads of this process. The environment only reaches
+    libraries loaded later (e.g. in OpenMC subprocesses), so the ones already
+    loaded, as in forked workers, are limited through threadpoolctl.
+    """
+    os.environ.update(thread_env(threads))
+    return threadpool_limits(limits=threads)
+
+
+def pin(cpus) -> None:
+    """Restrict this process, and the processes it starts, to `cpus` where the platform allows it."""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def _init_worker(cpus, threads):
+    pin(cpus)
+    limit_threads(threads)
+
+
+def format_cpus(cpus) -> str:
+    """Compact CPU list, e.g. `0-47,96-111`."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+class ResourceBudget:
+    """
+    Split of the cores of an allocation between the stages of a run, so that
+    worker pools, BLAS threads and OpenMC threads never add up to more cores
+    than there are.
+
+    The sampling workers (NJOY, SANDY, KL expansion) are single-threaded and
+    pinned to the sampling CPUs, OpenMC gets `openmc_threads` threads per MPI
+    rank bound to the OpenMC CPUs. When the stages run one after the other
+    both get all `cpus`. With `overlap=True`, for the pipelined batch runner
+    where sample k+1 is generated while OpenMC runs sample k, the cores are
+    split: `sampling_workers` (default 1/8 of them) go to sampling and the
+    rest to OpenMC.
+
+    MPI ranks are launched one per node (`mpirun -ppn 1`), so each rank gets
+    the same number of threads on its own node.
+    """
+
+    def __init__(
+        self,
+        n_cores: int | None = None,
+        n_mpi: int = 1,
+        sampling_workers: int | None = None,
+        overlap: bool = False,
+        cpus: list[int] | None = None,
+    ):
+        available = available_cpus() if cpus is None else list(cpus)
+        n_cores = len(available) if n_cores is None else int(n_cores)
+        if n_cores < 1:
+            raise ValueError(f"Need at least one core, got {n_cores}")
+        if n_cores > len(available):
+            print(f"Asked for {n_cores} cores but only {len(available)} are available, using {len(available)}")
+            n_cores = len(available)
+
+        self.cpus = available[:n_cores]
+        self.n_mpi = int(n_mpi)
+        self.overlap = overlap and n_cores > 1
+
+        if self.overlap:
+            n_sampling = max(1, n_cores // SAMPLING_SHARE) if sampling_workers is None else int(sampling_workers)
+            n_sampling = min(max(n_sampling, 1), n_cores - 1)
+            self.openmc_cpus = self.cpus[:-n_sampling]
+            self.sampling_cpus = self.cpus[-n_sampling:]
+        else:
+            n_sampling = n_cores if sampling_workers is None else min(max(int(sampling_workers), 1), n_cores)
+            self.openmc_cpus = self.cpus
+            self.sampling_cpus = self.cpus
+
+        self.sampling_workers = n_sampling
+        self.sampling_threads = max(1, len(self.sampling_cpus) // n_sampling)
+        self.openmc_threads = len(self.openmc_cpus)
+
+    @classmethod
+    def from_inputs(cls, inputs_dict: dict, overlap: bool = False, max_sampling_workers: int | None = None) -> "ResourceBudget":
+        """
+        Budget from the `n_cores`, `n_mpi` and optional `n_sampling_cores` keys
+        of the solver inputs. `max_sampling_workers` caps the default number
+        of sampling workers, e.g. at the number of nuclides.
+        """
+        sampling_workers = inputs_dict.get("n_sampling_cores")
+        if sampling_workers is None and max_sampling_workers is not None:
+            n_cores = int(inputs_dict["n_cores"])
+            default = max(1, n_cores // SAMPLING_SHARE) if overlap else n_cores
+            sampling_workers = min(default, max_sampling_workers)
+        return cls(int(inputs_dict["n_cores"]), int(inputs_dict.get("n_mpi", 1)), sampling_workers, overlap)
+
+    @property
+    def n_cores(self) -> int:
+        return len(self.cpus)
+
+    def sampling_pool(self, **kwargs) -> Pool:
+        """Worker pool of the sampling stage, pinned to its CPUs with its thread limit."""
+        return Pool(self.sampling_workers, initializer=_init_worker,
+                    initargs=(self.sampling_cpus, self.sampling_threads), **kwargs)
+
+    def log(self) -> None:
+        """Print the layout."""
+        print(f"Resource budget: {self.n_cores} cores (CPUs {format_cpus(self.cpus)})")
+        print(f"  sampling: {self.sampling_workers} workers x {self.sampling_threads} threads "
+              f"on CPUs {format_cpus(self.sampling_cpus)}")
+        print(f"  OpenMC:   {self.n_mpi} MPI ranks x {self.openmc_threads} threads "
+              f"on CPUs {format_cpus(self.openmc_cpus)}"
+              + (", alongside sampling" if self.overlap else ", after sampling"))
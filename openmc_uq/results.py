@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+Columnar HDF5 store of UQ sample results.
+
+Writers append to a shard per worker slot, `<results_dir>/shard-<writer>.h5`
+(see `default_writer_name`), e.g. one per Slurm array job, and take turns
+through a lock on the shard, so the thousands of one-sample `run_model.py`
+processes of a campaign end up in a handful of files. A batch runner owns
+its output shard. Each field is a chunked, compressed dataset with one row per
+sample:
+
+    sample_id            (N,)             index of the sample, -1 if unknown
+    label                (N,)             free text, e.g. the job directory
+    status               (N,)             1 evaluated, -1 failed
+    inputs               (N, d)           sample vector (KL coefficients)
+    seeds                (N, n_nuclides)  SANDY seeds
+    histories            (N,)             active histories of the OpenMC run
+    qoi/mean, qoi/std    (N, n_scores)    total of each score
+    tallies/<name>/mean  (N, *shape)      full tally arrays (and std)
+    timing/<stage>       (N,)             seconds spent in each stage
+
+Shards are combined with `merge_shards` (or `python -m openmc_uq.results
+merge results_dir merged.h5`), and `load_results` reads a shard, a merged
+file or a whole directory of shards into NumPy arrays in one go.
+"""
+import argparse
+import fcntl
+import os
+import socket
+from pathlib import Path
+import h5py
+import numpy as np
+
+from .tallies import TallyResult
+
+RESULTS_DIR_ENV = "OPENMC_UQ_RESULTS_DIR"
+WORKER_ENV = "OPENMC_UQ_WORKER"
+SHARDS_ENV = "OPENMC_UQ_RESULTS_SHARDS"
+
+# Shards of a Slurm array job, which its tasks are spread over
+DEFAULT_SHARDS = 8
+
+DONE, FAILED = 1, -1
+
+# Samples per chunk along the first axis, reduced for large tally arrays
+CHUNK_ROWS = 64
+CHUNK_BYTES = 1 << 20
+
+
+def _chunks(row: np.ndarray) -> tuple:
+    rows = max(1, min(CHUNK_ROWS, CHUNK_BYTES // max(row.nbytes, 1)))
+    return (rows, *row.shape)
+
+
+def default_writer_name() -> str:
+    """
+    Name of this writer's shard, a worker slot shared by many processes:
+    `$OPENMC_UQ_WORKER` if set (e.g. a worker index passed by the driver),
+    else for a Slurm array job (one sample per task, as submitted by
+    UncertaintyQuantification.jl) the array task modulo
+    `$OPENMC_UQ_RESULTS_SHARDS` (default 8), else the Slurm job and task
+    (`SLURM_PROCID`), else the host.
+    """
+    worker = os.getenv(WORKER_ENV)
+    if worker:
+        return worker
+    array_job = os.getenv("SLURM_ARRAY_JOB_ID")
+    if array_job:
+        n_shards = int(os.getenv(SHARDS_ENV, DEFAULT_SHARDS))
+        return f"{array_job}.{int(os.getenv('SLURM_ARRAY_TASK_ID', '0')) % n_shards}"
+    job = os.getenv("SLURM_JOB_ID")
+    if job:
+        return f"{job}.{os.getenv('SLURM_PROCID', '0')}"
+    return socket.gethostname()
+
+
+def _fill(shape: tuple, dtype: np.dtype) -> np.ndarray:
+    """Rows of a field not written: NaN for floats, -1 for signed integers, empty strings."""
+    if dtype.kind == "f":
+        value = np.nan
+    elif dtype.kind == "i":
+        value = -1
+    elif dtype.kind in "OU":
+        value = ""
+    elif dtype.kind == "S":
+        value = b""
+    else:
+        value = 0
+    return np.full(shape, value, dtype=dtype)
+
+
+class ResultsShard:
+    """
+    Append-only results file. With `lock`, the shard is held under an
+    exclusive lock (`<shard>.lock`) from opening to `close`, so processes
+    sharing it append in turn.
+    """
+
+    def __init__(self, path: str | Path, compression: str | None = "gzip", attrs: dict | None = None,
+                 lock: bool = False):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self._lock = None
+        if lock:
+            self._lock = open(self.path.with_name(self.path.name + ".lock"), "a")
+            fcntl.flock(self._lock, fcntl.LOCK_EX)
+        self._hf = h5py.File(self.path, "a")
+        for key, value in (attrs or {}).items():
+            self._hf.attrs[key] = value
+
+    def __len__(self) -> int:
+        return self._hf["sample_id"].shape[0] if "sample_id" in self._hf else 0
+
+    def _append(self, name: str, value, n: int) -> None:
+        """Write row `n` of dataset `name`, creating it (NaN-filled for earlier rows) on first use."""
+        if isinstance(value, str):
+            value = np.array(value, dtype=h5py.string_dtype())
+        value = np.asarray(value)
+
+        if name not in self._hf:
+            fill = {"f": np.nan, "i": -1}.get(value.dtype.kind)
+            kwargs = {}
+            if value.dtype.kind != "O":
+                kwargs = {"compression": self.compression, "fillvalue": fill}
+            self._hf.create_dataset(
+                name,
+                shape=(n + 1, *value.shape),
+                maxshape=(None, *value.shape),
+                chunks=_chunks(value),
+                dtype=value.dtype,
+                **kwargs,
+            )
+
+        dset = self._hf[name]
+        if dset.shape[1:] != value.shape:
+            raise ValueError(f"{name} has shape {value.shape}, expected {dset.shape[1:]} as in earlier samples.")
+        if dset.shape[0] <= n:
+            dset.resize(n + 1, axis=0)
+        dset[n] = value
+
+    def append(
+        self,
+        sample_id: int = -1,
+        status: int = DONE,
+        label: str = "",
+        inputs: np.ndarray | None = None,
+        seeds: np.ndarray | None = None,
+        qoi_mean: np.ndarray | None = None,
+        qoi_std: np.ndarray | None = None,
+        tallies: dict[str, TallyResult] | None = None,
+        timing: dict[str, float] | None = None,
+        histories: int | None = None,
+    ) -> None:
+        """Append one sample. Fields left as None are NaN (or empty) for this row."""
+        n = len(self)
+        fields = {"inputs": inputs, "seeds": seeds, "histories": histories, "qoi/mean": qoi_mean, "qoi/std": qoi_std}
+        for name, tally in (tallies or {}).items():
+            fields[f"tallies/{name}/mean"] = tally.mean
+            fields[f"tallies/{name}/std"] = tally.std
+        for stage, seconds in (timing or {}).items():
+            fields[f"timing/{stage}"] = float(seconds)
+
+        for name, value in fields.items():
+            if value is not None:
+                self._append(name, np.int64(value) if name == "histories" else value, n)
+
+        # Written last, so the row only counts once all its fields are there
+        self._append("label", label, n)
+        self._append("status", np.int8(status), n)
+        self._append("sample_id", np.int64(sample_id), n)
+        self._hf.flush()
+
+    def sample_ids(self, status: int | None = DONE) -> np.ndarray:
+        """Ids of the samples stored so far (with the given status, or all if None)."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        ids = self._hf["sample_id"][()]
+        if status is None:
+            return ids
+        return ids[self._hf["status"][: ids.size] == status]
+
+    def close(self) -> None:
+        self._hf.close()
+        if self._lock is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+            self._lock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_shard(results_dir: str | Path | None = None, writer: str | None = None, **kwargs) -> ResultsShard | None:
+    """
+    Open this writer's shard in `results_dir` (default `$OPENMC_UQ_RESULTS_DIR`),
+    or return None if no results directory is configured. The shard is
+    locked until closed, as other processes of the same slot append to it.
+    """
+    results_dir = results_dir or os.getenv(RESULTS_DIR_ENV)
+    if not results_dir:
+        return None
+    writer = writer or default_writer_name()
+    kwargs.setdefault("lock", True)
+    return ResultsShard(Path(results_dir) / f"shard-{writer}.h5", **kwargs)
+
+
+def shard_files(path: str | Path) -> list[Path]:
+    path = Path(path)
+    if path.is_dir():
+        return sorted(path.glob("shard-*.h5"))
+    return [path]
+
+
+def _collect(hf: h5py.File) -> dict[str, np.ndarray]:
+    """Every dataset of a results file, keyed by its path."""
+    arrays = {}
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            arrays[name] = obj[()]
+
+    hf.visititems(visit)
+    n = arrays["sample_id"].size if "sample_id" in arrays else 0
+    for name, a in arrays.items():
+        if a.shape[0] < n:
+            # Field not written for the last samples
+            arrays[name] = np.concatenate([a, _fill((n - a.shape[0], *a.shape[1:]), a.dtype)])
+    # Rows of a shard still being written may be ahead of its sample_id
+    return {name: a[:n] for name, a in arrays.items()}
+
+
+def load_results(path: str | Path, latest: bool = True) -> dict:
+    """
+    Load a results file or a directory of shards as a dict of arrays with one
+    row per sample, sorted by sample id. Fields missing from some shards are
+    filled with NaN (floats), -1 (integers) or empty strings. With `latest`, only the last stored row of each sample id
+    (e.g. after a failed sample was rerun) is kept. `attrs` holds the file
+    attributes of the first shard.
+    """
+    files = shard_files(path)
+    if len(files) == 0:
+        raise FileNotFoundError(f"No results found in {path}")
+
+    parts = []
+    attrs = {}
+    for file in files:
+        with h5py.File(file, "r") as hf:
+            if not attrs:
+                attrs = dict(hf.attrs)
+            parts.append(_collect(hf))
+
+    names = []
+    for part in parts:
+        names.extend(name for name in part if name not in names)
+
+    results = {}
+    for name in names:
+        columns = []
+        template = next(part[name] for part in parts if name in part)
+        for part in parts:
+            n = part["sample_id"].size if "sample_id" in part else 0
+            if name in part:
+                columns.append(part[name])
+            else:
+                columns.append(_fill((n, *template.shape[1:]), template.dtype))
+        results[name] = np.concatenate(columns)
+    if "sample_id" not in results:
+        # Shards created but closed before their first sample
+        results["sample_id"] = np.empty(0, dtype=np.int64)
+
+    order = np.argsort(results["sample_id"], kind="stable")
+    if latest:
+        ids = results["sample_id"][order]
+        last = np.append(ids[1:] != ids[:-1], True) | (ids < 0)
+        order = order[last]
+
+    results = {name: a[order] for name, a in results.items()}
+    if "label" in results:
+        results["label"] = np.array([s.decode() if isinstance(s, bytes) else s for s in results["label"]])
+    results["attrs"] = attrs
+    return results
+
+
+def merge_shards(path: str | Path, output: str | Path, compression: str | None = "gzip") -> Path:
+    """Merge the shards in `path` into a single results file."""
+    results = load_results(path)
+    attrs = results.pop("attrs")
+    output = Path(output).resolve()
+    tmp = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+
+    with h5py.File(tmp, "w") as hf:
+        hf.attrs.update(attrs)
+        for name, array in results.items():
+            if name == "label":
+                hf.create_dataset(name, data=array.astype(object), dtype=h5py.string_dtype())
+                continue
+            if array.size == 0:
+                hf.create_dataset(name, data=array)
+                continue
+            chunks = _chunks(array[0])
+            chunks = (min(chunks[0], array.shape[0]), *chunks[1:])
+            hf.create_dataset(name, data=array, chunks=chunks, compression=compression)
+
+    os.replace(tmp, output)
+    print(f"Merged {len(results['sample_id'])} samples from {path} into {output}")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="Merge shards into one file")
+    merge.add_argument("results_dir")
+    merge.add_argument("output")
+    summary = subparsers.add_parser("summary", help="Print the number of samples and fields stored")
+    summary.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        merge_shards(args.results_dir, args.output)
+    else:
+        results = load_results(args.path)
+        results.pop("attrs")
+        print(f"{len(results['sample_id'])} samples")
+        for name, array in sorted(results.items()):
+            print(f"  {name:<30} {array.dtype} {array.shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,60 @@
 import os
+import subprocess
+from functools import partial
 from pathlib import Path
-from shutil import copyfile
-import openmc.data
-from .utils import replace_nuclide_tally, replace_nuclide_material
+from .library import load_library, model_closure
+from .profiling import stage, traced
+from .resources import openmc_env, pin
+from .staging import stage_model
+from .model_xml import write_model_inputs
+from .utils import update_settings
 
+BACKENDS = ("subprocess", "lib")
+
+
+def _write_library(cross_sections_xml, perturbed: dict, post: Path, openmc_xml_dir=None) -> Path:
+    """
+    Write `cross_sections_xml` with the `perturbed` files (name -> path) added,
+    pruned to the closure of the model in `openmc_xml_dir` if given.
+    """
+    closure = None if openmc_xml_dir is None else model_closure(openmc_xml_dir)
+    return load_library(cross_sections_xml).write(post, perturbed, closure)
+
+
+@traced("run_openmc")
 def run_openmc(openmc_xml_dir, random_nuclides, cross_sections_xml,
                threads = 1, n_mpi = 1,
-               run_dir="openmc_sim"):
+               run_dir="openmc_sim", backend="subprocess", settings=None,
+               prune_library=False, cpus=None, upcoming=None):
+    """
+    Run OpenMC on a model with the perturbed `random_nuclides` substituted in.
+
+    With `backend="subprocess"` OpenMC is launched through `mpirun`. With
+    `backend="lib"` it runs in this process through `openmc.lib`, keeping the
+    session (geometry, cross sections) alive between calls, see `LibRunner`.
+    The lib backend falls back to the subprocess when `n_mpi > 1` or the
+    OpenMC shared library cannot be loaded.
+
+    `settings` overrides values of settings.xml for this run only, e.g. the
+    seed and reduced particles of a fast-TMC sample (see
+    `tmc.fast_tmc_settings`).
+
+    `cpus` (e.g. `ResourceBudget.openmc_cpus`) pins OpenMC to those CPUs of
+    this node, with one thread bound to each core.
+
+    `upcoming` lists the perturbed files (name and future path) of later
+    samples. The lib backend adds them to its session library now, so that
+    the session is not re-initialised when they are run.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OpenMC backend '{backend}'. Expected one of {BACKENDS}.")
+
+    if backend == "lib":
+        runner = _get_lib_runner(openmc_xml_dir, cross_sections_xml, threads, n_mpi, run_dir, prune_library, cpus)
+        if runner is not None:
+            if upcoming:
+                runner.register(upcoming)
+            return runner.run(random_nuclides, settings)
 
     # ==============================================================================
     # Make openmc sim directory
@@ -17,55 +65,264 @@ def run_openmc(openmc_xml_dir, random_nuclides, cross_sections_xml,
     print(" *************** Making sim folder ***************")
     print()
 
-    out_dir = Path(run_dir).resolve()
-    out_dir.mkdir(exist_ok=True)
+    # materials.xml and tallies.xml are rendered from the templates below
+    with stage("stage_model"):
+        out_dir = stage_model(openmc_xml_dir, run_dir, mutable_files=("settings.xml",))
+    if settings:
+        update_settings(out_dir / "settings.xml", **settings)
 
-    openmc_xml_dir = Path(openmc_xml_dir).resolve()
-    input_files  = ["materials.xml", "settings.xml", "tallies.xml", "geometry.xml"]
+    os.chdir(out_dir)
 
-    for file in input_files:
-        copyfile(openmc_xml_dir/file, out_dir/file)    
+    try:
+        # ==============================================================================
+        # Create xml library
 
-    for file in os.listdir(openmc_xml_dir):
-        if file.endswith(".h5m"):
-            copyfile(openmc_xml_dir/file, out_dir/file)
-        if file.endswith(".e"):
-            copyfile(openmc_xml_dir/file, out_dir/file)    
+        print()
+        print(" *************** Creating random library ***************")
+        print()
 
-    os.chdir(out_dir)
+        with stage("write_library"):
+            post = _write_library(cross_sections_xml, {nuc.perturbed_name: nuc.path for nuc in random_nuclides},
+                                  out_dir / "cross_sections_rand.xml", openmc_xml_dir if prune_library else None)
 
-    # ==============================================================================
-    # Create xml library
+        # ==============================================================================
+        # Change openmc inputs
 
-    print()
-    print(" *************** Creating random library ***************")
-    print()
+        nuclide_map = {nuc.nuclide: nuc.perturbed_name for nuc in random_nuclides}
+        with stage("write_inputs"):
+            write_model_inputs(openmc_xml_dir, out_dir, nuclide_map, cross_sections=post)
+
+        #output = openmc.run(threads = threads)
+        openmc_command = ["mpirun", "-np", str(n_mpi), "-ppn", "1", "--bind-to", "none",
+                          "openmc", "-s", str(threads)]
+        with stage("openmc"):
+            if cpus is None:
+                subprocess.run(openmc_command, check=True)
+            else:
+                subprocess.run(openmc_command, check=True, env={**os.environ, **openmc_env(threads)},
+                               preexec_fn=partial(pin, list(cpus)))
+    finally:
+        os.chdir(working_dir)
 
-    lib = openmc.data.DataLibrary()
-    lib = lib.from_xml(cross_sections_xml)  # Gets current
+    #return output
 
-    for nuc in random_nuclides:
-        lib.register_file(nuc.path)
 
-    post = out_dir / "cross_sections_rand.xml"
-    lib.export_to_xml(post)
+def _file_key(path: str) -> tuple[str, int]:
+    return path, Path(path).stat().st_mtime_ns
 
-    # ==============================================================================
-    # Change openmc inputs
 
-    [replace_nuclide_material(nuc.nuclide, nuc.perturbed_name) for nuc in random_nuclides]
-    [replace_nuclide_tally(nuc.nuclide, nuc.perturbed_name) for nuc in random_nuclides]
+class LibRunner:
+    """
+    Long-lived in-process OpenMC session driven through `openmc.lib`.
 
-    materials   = openmc.Materials.from_xml("materials.xml")
-    materials.cross_sections = str(post)
-    materials.export_to_xml()
+    The model is loaded once from `openmc_xml_dir` with its nominal nuclides.
+    For each sample the perturbed nuclides are loaded with
+    `openmc.lib.load_nuclide` and swapped into the materials and tallies in
+    place of their nominal counterparts, so geometry and unperturbed cross
+    sections are not read again.
 
-    #output = openmc.run(threads = threads)
-    openmc_command = f"mpirun -np {n_mpi} -ppn 1 --bind-to none openmc -s {threads}"
-    os.system(openmc_command)
+    OpenMC can only load nuclides listed in the cross section library it was
+    initialised with, and never unloads them. The session is therefore
+    re-initialised when a sample contains a file that was not registered
+    beforehand, a perturbed name already loaded from a different (or
+    rewritten) file, or after `max_samples` samples to bound memory use.
+    Registering the files of all samples up front (see `register`, they need
+    not exist yet) with unique perturbed names, as written by
+    `sample_nuclide_KL_batch` and the batch runner, avoids re-initialisation
+    within those `max_samples` samples.
+    """
 
-    os.chdir(working_dir)
+    def __init__(self, openmc_xml_dir, cross_sections_xml, threads=1,
+                 run_dir="openmc_sim", max_samples=50, prune_library=False, cpus=None):
+        import openmc.lib
 
-    #return output
+        self.lib = openmc.lib
+        self.openmc_xml_dir = Path(openmc_xml_dir).resolve()
+        self.cross_sections_xml = str(Path(cross_sections_xml).resolve())
+        self.threads = threads
+        self.run_dir = Path(run_dir).resolve()
+        self.max_samples = max_samples
+        self.prune_library = prune_library
+        self.cpus = None if cpus is None else tuple(cpus)
+
+        # Perturbed name -> path, for every file in the session library
+        self._library = {}
+        # Perturbed name -> (path, mtime) of the files loaded in this session
+        self._loaded = {}
+        self._initialised = False
+        self._stale = True
+        self._n_samples = 0
+
+    def register(self, random_nuclides) -> None:
+        """
+        Add perturbed files to the library used at the next initialisation.
+        The files need not exist yet, e.g. those of later samples of a batch.
+        """
+        for nuc in random_nuclides:
+            path = str(Path(nuc.path).resolve())
+            if self._library.get(nuc.perturbed_name) != path:
+                self._library[nuc.perturbed_name] = path
+                self._stale = True
+
+    def _init(self, keep=()) -> None:
+        self.close()
+        stage_model(self.openmc_xml_dir, self.run_dir, mutable_files=("settings.xml",))
+
+        # Files already run in the previous session are not needed again
+        consumed = set(self._loaded) - set(keep)
+        self._library = {name: path for name, path in self._library.items() if name not in consumed}
+
+        post = _write_library(self.cross_sections_xml, self._library,
+                              self.run_dir / "cross_sections_rand.xml",
+                              self.openmc_xml_dir if self.prune_library else None)
+        # Nominal nuclides, the perturbed ones are swapped in by `run`
+        write_model_inputs(self.openmc_xml_dir, self.run_dir, {}, cross_sections=post)
+
+        print()
+        print(" *************** Initialising OpenMC session ***************")
+        print()
+
+        if self.cpus is not None:
+            # OpenMP reads these once, when the first session starts its threads
+            pin(self.cpus)
+            os.environ.update(openmc_env(self.threads))
+
+        working_dir = os.getcwd()
+        os.chdir(self.run_dir)
+        try:
+            with stage("openmc_init"):
+                self.lib.init(["-s", str(self.threads)])
+        finally:
+            os.chdir(working_dir)
+
+        # Nominal composition, which every sample is swapped into
+        self._materials = {
+            mat_id: (list(mat.nuclides), mat.densities.copy())
+            for mat_id, mat in self.lib.materials.items()
+        }
+        self._tallies = {
+            tally_id: list(tally.nuclides) for tally_id, tally in self.lib.tallies.items()
+        }
+        self._settings = {
+            "seed": self.lib.settings.seed,
+            "particles": self.lib.settings.particles,
+            "batches": self.lib.settings.batches,
+        }
+        self._loaded = {}
+        self._initialised = True
+        self._stale = False
+        self._n_samples = 0
+
+    def _needs_init(self, random_nuclides) -> bool:
+        if not self._initialised or self._stale:
+            return True
+        if self.max_samples is not None and self._n_samples >= self.max_samples:
+            return True
+        for nuc in random_nuclides:
+            loaded = self._loaded.get(nuc.perturbed_name)
+            # The mtime catches samples rewritten in place under the same path
+            if loaded is not None and loaded != _file_key(self._library[nuc.perturbed_name]):
+                return True
+        return False
+
+    def run(self, random_nuclides, settings=None) -> None:
+        """
+        Swap the perturbed nuclides into the model and run one simulation,
+        with `settings` (seed, particles, batches) overriding settings.xml.
+        """
+        self.register(random_nuclides)
+        if self._needs_init(random_nuclides):
+            self._init(keep=[nuc.perturbed_name for nuc in random_nuclides])
+
+        swap = {nuc.nuclide: nuc.perturbed_name for nuc in random_nuclides}
+        for name in swap.values():
+            if name not in self._loaded:
+                self.lib.load_nuclide(name)
+                self._loaded[name] = _file_key(self._library[name])
+
+        for mat_id, (nuclides, densities) in self._materials.items():
+            if any(nuc in swap for nuc in nuclides):
+                self.lib.materials[mat_id].set_densities(
+                    [swap.get(nuc, nuc) for nuc in nuclides], densities
+                )
+
+        for tally_id, nuclides in self._tallies.items():
+            if any(nuc in swap for nuc in nuclides):
+                self.lib.tallies[tally_id].nuclides = [swap.get(nuc, nuc) for nuc in nuclides]
+
+        self._apply_settings(settings or {})
+
+        working_dir = os.getcwd()
+        os.chdir(self.run_dir)
+        try:
+            with stage("openmc"):
+                self.lib.reset()
+                self.lib.run()
+        finally:
+            os.chdir(working_dir)
+
+        self._n_samples += 1
+
+    def _apply_settings(self, settings: dict) -> None:
+        unsupported = set(settings) - {"seed", "particles", "batches"}
+        if unsupported:
+            raise ValueError(f"The lib backend cannot change {sorted(unsupported)} between runs.")
+
+        # Settings persist in the session, so restore the nominal values of any not overridden
+        settings = {**self._settings, **settings}
+        self.lib.settings.seed = int(settings["seed"])
+        self.lib.settings.particles = int(settings["particles"])
+        self.lib.settings.set_batches(int(settings["batches"]))
+
+        # Keep settings.xml in line with what is run, for the record and re-initialisation
+        update_settings(self.run_dir / "settings.xml", **settings)
+
+    def close(self) -> None:
+        """Finalise the OpenMC session, if any."""
+        if self._initialised:
+            self.lib.finalize()
+            self._initialised = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# One session per process, reused by successive `run_openmc(backend="lib")` calls
+_lib_runner = None
+
+
+def _get_lib_runner(openmc_xml_dir, cross_sections_xml, threads, n_mpi, run_dir, prune_library=False,
+                    cpus=None) -> LibRunner | None:
+    global _lib_runner
+
+    if n_mpi > 1:
+        print("The lib backend runs in a single process, falling back to mpirun for n_mpi > 1")
+        return None
+
+    config = (
+        Path(openmc_xml_dir).resolve(),
+        str(Path(cross_sections_xml).resolve()),
+        threads,
+        Path(run_dir).resolve(),
+        prune_library,
+        None if cpus is None else tuple(cpus),
+    )
+    if _lib_runner is not None:
+        current = (_lib_runner.openmc_xml_dir, _lib_runner.cross_sections_xml,
+                   _lib_runner.threads, _lib_runner.run_dir, _lib_runner.prune_library, _lib_runner.cpus)
+        if current == config:
+            return _lib_runner
+        _lib_runner.close()
+        _lib_runner = None
 
+    try:
+        _lib_runner = LibRunner(openmc_xml_dir, cross_sections_xml, threads, run_dir, prune_library=prune_library,
+                                cpus=cpus)
+    except (ImportError, OSError) as exc:
+        print(f"Could not load openmc.lib ({exc}), falling back to mpirun")
+        return None
 
+    return _lib_runner
@@ -1,14 +1,30 @@
+import hashlib
 import os
 import numpy as np
 import pandas as pd
-import h5py
 import sandy
-from sandy import Endf6
 from pathlib import Path
 
 import openmc.data
 
-from .utils import get_nuclide_paths, get_cov
+from .cache import ParsedCache, default_cache, file_hash
+from .utils import (
+    get_nuclide_paths,
+    get_perturbation_layout,
+    get_valid_mts,
+    load_processed_data,
+    block_cov_from_entry,
+    xs_from_entry,
+)
+from .covariance import PerturbationLayout
+from .svd_file import read_kl_basis, read_layout
+from .direct import load_reference, perturb_incident_neutron, prune_temperatures
+from .library import load_library, model_closure
+from .profiling import stage, traced
+from .sample_store import SampleStore, default_sample_store
+
+
+SAMPLING_MODES = ("njoy", "direct")
 
 
 class RandomData:
@@ -20,15 +36,34 @@ class RandomData:
         self.path = path
 
 
-def sample_nuclide_sandy(nuclide: str, endf_path: str, seed33: int) -> RandomData:
+@traced("sample_nuclide_sandy")
+def sample_nuclide_sandy(
+    nuclide: str,
+    endf_path: str,
+    seed33: int,
+    out_dir: str | Path = "ND_sample",
+    store: SampleStore | None = None,
+) -> RandomData:
     """
     Generate a single random nuclear data sample using SANDY's built-in sampler.
     Outputs an ACE file and converts it to HDF5 for use with OpenMC.
+
+    With a sample `store` (default `$OPENMC_UQ_SAMPLE_STORE`), a sample of the
+    same ENDF file and seed is fetched from it instead of regenerated.
     """
     file = get_nuclide_paths(endf_path, [nuclide])[0]
 
-    out_dir = Path("ND_sample").resolve()
-    out_dir.mkdir(exist_ok=True)
+    out_dir = Path(out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    name = f"{nuclide}_rand"
+    store = default_sample_store() if store is None else store
+    if store is not None:
+        key = store.key(nuclide, file_hash(file), seed=seed33, mode="sandy", temperature=293.6)
+        with stage("store_fetch"):
+            file_out = store.fetch(key, name, out_dir)
+        if file_out is not None:
+            return RandomData(nuclide, name, file_out)
 
     acetape = out_dir / f"ace_{nuclide}_rand"
     sandy_command = (
@@ -36,114 +71,288 @@ def sample_nuclide_sandy(nuclide: str, endf_path: str, seed33: int) -> RandomDat
         f"--samples 1 --outname {acetape} --seed33 {seed33} "
         f"--mf 33 --acer --temperature 293.6"
     )
-    os.system(sandy_command)
+    with stage("sandy_sampling"):
+        os.system(sandy_command)
 
-    data = openmc.data.IncidentNeutron.from_ace(str(acetape) + ".02c")
-    data.name = f"{nuclide}_rand"
+    with stage("from_ace"):
+        data = openmc.data.IncidentNeutron.from_ace(str(acetape) + ".02c")
+    data.name = name
 
-    file_out = out_dir / f"{nuclide}_rand.h5"
-    data.export_to_hdf5(file_out, "w")
+    file_out = out_dir / f"{name}.h5"
+    _export(data, file_out)
+    if store is not None:
+        with stage("store_put"):
+            store.put(key, file_out, nuclide, name, {"seed33": int(seed33)})
 
     return RandomData(nuclide, data.name, file_out)
 
 
-def _load_svd(svd_file: Path, n_trunc: int) -> tuple[np.ndarray, np.ndarray]:
-    """Load and truncate U and s from a saved SVD HDF5 file."""
-    with h5py.File(svd_file, "r") as hf:
-        u = np.array(hf["u"])[:, :n_trunc]
-        s = np.array(hf["s"])[:n_trunc]
-    return u, s
-
-
-def _get_valid_mts(errorr, pendf) -> np.ndarray:
-    """Return MT numbers present in both errorr and pendf, excluding MT 451."""
-    mts = np.array([mt for mt in errorr.mt if mt in pendf.mt])
-    return np.setdiff1d(mts, 451)  # MT 451 contains general info, not a reaction
+@traced("export_hdf5")
+def _export(data: openmc.data.IncidentNeutron, file_out: Path) -> None:
+    # Never write through a file still linked from the sample store
+    if file_out.is_symlink() or file_out.exists():
+        file_out.unlink()
+    data.export_to_hdf5(file_out, "w")
 
 
-def _apply_perturbation(xs, errorr, pendf, mat: int, mts: np.ndarray, sample: np.ndarray) -> sandy.Xs:
+@traced("perturb")
+def _apply_perturbation(xs, layout: PerturbationLayout, factors: np.ndarray, mts) -> sandy.Xs:
     """
-    Build a perturbation vector from the KL sample and apply it to each MT cross section.
-    Clamps resulting perturbation factors to [0, 2].
+    Multiply the cross sections of each MT in `mts` by its group-wise
+    `factors` (one row per MT of `layout`) in a single pass, then rebuild the
+    sums. As in `sandy.Pert`/`Xs.custom_perturbation`, the group boundaries
+    are first added to the energy grid (interpolated lin-lin) and group g
+    covers (energy_grid[g], energy_grid[g + 1]], with energies above the grid
+    left unperturbed.
     """
-    energy_grid = errorr.get_energy_grid()
+    data = xs.data
+    energies = data.index.values
+    boundaries = layout.energy_grid[1:]
+    boundaries = boundaries[(boundaries > energies[0]) & (boundaries < energies[-1])]
+    grid = np.union1d(energies, boundaries)
+    values = np.column_stack([np.interp(grid, energies, data[column].values) for column in data.columns])
+    data = pd.DataFrame(values, index=pd.Index(grid, name=data.index.name), columns=data.columns)
+
+    columns = [(layout.mat, mt) for mt in mts if (layout.mat, mt) in data.columns]
+    rows = [layout.row(mt) for _, mt in columns]
 
-    cov = get_cov(errorr)
-    perturbation_factors = sample + 1.0
-    perturbation_factors = np.clip(perturbation_factors, 0.0, 2.0)
+    groups = np.searchsorted(layout.energy_grid[1:], grid, side="left")
+    padded = np.hstack([factors, np.ones((factors.shape[0], 1))])
+    data.loc[:, columns] = data.loc[:, columns].values * padded[rows][:, groups].T
 
-    samples_df = pd.DataFrame(perturbation_factors, index=cov.data.index)
-    perts = sandy.Samples(samples_df).data.T
+    return sandy.Xs(data).reconstruct_sums()
 
-    for mt in mts:
-        p = sandy.Pert(perts[(mat, mt)].values.flatten(), index=energy_grid[1:])
-        xs = xs.custom_perturbation(mat, mt, p)
 
-    return xs.reconstruct_sums()
+class _KLInputs:
+    """
+    Parsed inputs of a nuclide's KL sampling, loaded once and shared by
+    every sample generated from them.
+    """
 
+    def __init__(
+        self,
+        nuclide: str,
+        endf_path: str,
+        pre_processed_path: str,
+        n_trunc: int,
+        mode: str,
+        cross_sections_xml: str | None,
+        cache: ParsedCache | None = None,
+        openmc_xml_dir: str | Path | None = None,
+        store: SampleStore | None = None,
+    ):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode '{mode}'. Expected one of {SAMPLING_MODES}.")
+        if mode == "direct" and cross_sections_xml is None:
+            raise ValueError("Direct sampling needs the `cross_sections_xml` of the reference library.")
 
+        self.nuclide = nuclide
+        self.mode = mode
+        self.store = default_sample_store() if store is None else store
+
+        pre_processed_path = Path(pre_processed_path).resolve()
+        svd_file = pre_processed_path / f"{nuclide}_SVD.h5"
+        cache = default_cache() if cache is None else cache
+        entry = load_processed_data(nuclide, endf_path, cache, pre_processed_path) if cache is not None else None
+        errorr = None
+
+        # (MAT, MT, group) layout of the basis rows, stored with the SVD by setup.py
+        with stage("read_svd"):
+            self.basis = read_kl_basis(svd_file, n_trunc)
+            self.layout = read_layout(svd_file)
+        if self.layout is None:
+            if entry is not None:
+                self.layout = block_cov_from_entry(entry).layout(entry["valid_mts"])
+            else:
+                with stage("parse_errorr"):
+                    errorr = sandy.errorr.Errorr.from_file(pre_processed_path / f"{nuclide}.error")
+                self.layout = get_perturbation_layout(errorr)
+        self.energy_grid = self.layout.energy_grid
+
+        if mode == "direct":
+            with stage("load_reference"):
+                self.reference = load_reference(nuclide, cross_sections_xml)
+            if openmc_xml_dir is not None:
+                self.reference = prune_temperatures(self.reference, model_closure(openmc_xml_dir))
+            if self.store is not None:
+                self.source_hash = self._source_hash(
+                    svd_file,
+                    load_library(cross_sections_xml).get(nuclide),
+                    self.reference.temperatures,
+                )
+            print(f"Sampling MTs: {self.layout.mts}")
+            return
+
+        self.file = get_nuclide_paths(endf_path, [nuclide])[0]
+        with stage("parse_pendf"):
+            self.pendf = sandy.endf6.Endf6.from_file(pre_processed_path / f"{nuclide}.pendf")
+            self.mat = self.layout.mat
+            self.xs = xs_from_entry(entry) if entry is not None else sandy.Xs.from_endf6(self.pendf)
+
+        self.mts = self.layout.valid_mts
+        if self.mts is None:
+            if errorr is None:
+                with stage("parse_errorr"):
+                    errorr = sandy.errorr.Errorr.from_file(pre_processed_path / f"{nuclide}.error")
+            self.mts = get_valid_mts(errorr, self.pendf)
+
+        if self.store is not None:
+            self.source_hash = self._source_hash(
+                svd_file,
+                self.file,
+                pre_processed_path / f"{nuclide}.pendf",
+                np.asarray(self.mts).tolist(),
+            )
+
+        reactions = [openmc.data.reaction.REACTION_NAME[mt] for mt in self.mts]
+        print(f"Sampling MTs: {self.mts}")
+        print(f"Reactions:    {reactions}")
+
+    def _source_hash(self, *sources) -> str:
+        """Hash of everything a sample is generated from besides its KL coefficients."""
+        h = hashlib.sha256(self.mode.encode())
+        h.update(np.ascontiguousarray(self.energy_grid, dtype=np.float64).tobytes())
+        h.update(np.array(self.layout.mts, dtype=np.int64).tobytes())
+        for source in sources:
+            if isinstance(source, (str, Path)) and Path(source).is_file():
+                source = file_hash(source)
+            h.update(str(source).encode())
+        return h.hexdigest()
+
+    def write_sample(
+        self,
+        kl_sample: np.ndarray,
+        out_dir: Path,
+        name: str | None = None,
+        sample: np.ndarray | None = None,
+    ) -> RandomData:
+        """
+        Apply one KL perturbation and export it as HDF5 into `out_dir`, under
+        the nuclide name `name` (default `<nuclide>-rand`), or fetch it from
+        the sample store if the KL coefficients `sample` it was expanded from
+        were seen before.
+        """
+        out_dir.mkdir(parents=True, exist_ok=True)
+        nuclide = self.nuclide
+        name = f"{nuclide}-rand" if name is None else name
+
+        if self.store is not None:
+            # Keyed by the coefficients, which are reproduced exactly unlike their expansion
+            key = self.store.key(nuclide, self.source_hash, sample=kl_sample if sample is None else sample)
+            with stage("store_fetch"):
+                file_out = self.store.fetch(key, name, out_dir)
+            if file_out is not None:
+                return RandomData(nuclide, name, file_out)
+
+        factors = self.layout.factors(kl_sample)
+
+        if self.mode == "direct":
+            with stage("perturb"):
+                data = perturb_incident_neutron(self.reference, self.energy_grid, self.layout.factor_dict(factors))
+        else:
+            xs_perturbed = _apply_perturbation(self.xs, self.layout, factors, self.mts)
+
+            # Export perturbed cross sections to ACE and HDF5
+            pendf_tape = out_dir / f"pendf_{nuclide}_rand"
+            with stage("write_pendf"):
+                xs_perturbed.to_endf6(self.pendf).to_file(pendf_tape)
+
+            with stage("njoy"):
+                outputs = sandy.njoy.process_neutron(
+                    self.file,
+                    pendftape=str(pendf_tape),
+                    wdir=out_dir,
+                    keep_pendf=False,
+                    temperatures=[293.6],
+                    verbose=True,
+                )
+
+            ace_tape = out_dir / f"ace_{nuclide}_rand"
+            ace_tape.write_text(outputs["ace"])
+            print(f"ACE file written to '{ace_tape}'")
+
+            with stage("from_ace"):
+                data = openmc.data.IncidentNeutron.from_ace(str(ace_tape))
+
+        data.name = name
+
+        file_out = out_dir / f"{data.name}.h5"
+        _export(data, file_out)
+        if self.store is not None:
+            with stage("store_put"):
+                self.store.put(key, file_out, nuclide, name, {"mode": self.mode})
+
+        return RandomData(nuclide, data.name, file_out)
+
+
+@traced("sample_nuclide_KL")
 def sample_nuclide_KL(
     nuclide: str,
     endf_path: str,
     pre_processed_path: str,
     n_trunc: int,
     sample: np.ndarray,
+    mode: str = "njoy",
+    cross_sections_xml: str | None = None,
+    out_dir: str | Path = "sample_rand",
+    name: str | None = None,
+    openmc_xml_dir: str | Path | None = None,
 ) -> RandomData:
     """
     Generate a perturbed nuclear data sample using a KL (SVD-based) expansion.
     Loads pre-computed errorr/pendf/SVD files, applies the perturbation, and
-    exports the result as an ACE + HDF5 file for use with OpenMC.
+    exports the result as an ACE + HDF5 file for use with OpenMC, under the
+    nuclide name `name` (default `<nuclide>-rand`).
+
+    With `mode="direct"` the group-wise factors are instead applied to the
+    nuclide's reference HDF5 data from `cross_sections_xml`, skipping the
+    PENDF, NJOY and ACE steps (see `direct.perturb_incident_neutron`). Given
+    the `openmc_xml_dir` of the model, only the reference temperatures the
+    model uses are perturbed and written.
     """
-    file = get_nuclide_paths(endf_path, [nuclide])[0]
-    endf6 = Endf6.from_file(file)
-
-    if len(endf6.mat) != 1:
-        raise ValueError(
-            "ENDF file contains multiple nuclides (MAT numbers). "
-            "This function only supports files with a single nuclide."
-        )
-    mat = endf6.mat[0]
-
-    pre_processed_path = Path(pre_processed_path).resolve()
-    errorr = sandy.errorr.Errorr.from_file(pre_processed_path / f"{nuclide}.error")
-    pendf  = sandy.endf6.Endf6.from_file(pre_processed_path  / f"{nuclide}.pendf")
+    with stage("load_inputs"):
+        inputs = _KLInputs(nuclide, endf_path, pre_processed_path, n_trunc, mode, cross_sections_xml,
+                           openmc_xml_dir=openmc_xml_dir)
+    with stage("kl_expand"):
+        kl_sample = inputs.basis.expand(sample)
+    return inputs.write_sample(kl_sample, Path(out_dir).resolve(), name, sample)
 
-    mts = _get_valid_mts(errorr, pendf)
-    reactions = [openmc.data.reaction.REACTION_NAME[mt] for mt in mts]
-    print(f"Sampling MTs: {mts}")
-    print(f"Reactions:    {reactions}")
 
-    u, s = _load_svd(pre_processed_path / f"{nuclide}_SVD.h5", n_trunc)
-    kl_sample = (u @ np.sqrt(np.diag(s)) @ sample).T
-
-    xs_perturbed = _apply_perturbation(
-        sandy.Xs.from_endf6(pendf), errorr, pendf, mat, mts, kl_sample
-    )
-
-    # Export perturbed cross sections to ACE and HDF5
-    out_dir = Path("sample_rand").resolve()
-    out_dir.mkdir(exist_ok=True)
-
-    pendf_tape = out_dir / f"pendf_{nuclide}_rand"
-    xs_perturbed.to_endf6(pendf).to_file(pendf_tape)
-
-    outputs = sandy.njoy.process_neutron(
-        file,
-        pendftape=str(pendf_tape),
-        wdir=out_dir,
-        keep_pendf=False,
-        temperatures=[293.6],
-        verbose=True,
-    )
-
-    ace_tape = out_dir / f"ace_{nuclide}_rand"
-    ace_tape.write_text(outputs["ace"])
-    print(f"ACE file written to '{ace_tape}'")
-
-    data = openmc.data.IncidentNeutron.from_ace(str(ace_tape))
-    data.name = f"{nuclide}-rand"
-
-    file_out = out_dir / f"{nuclide}-rand.h5"
-    data.export_to_hdf5(file_out, "w")
-
-    return RandomData(nuclide, data.name, file_out)
+@traced("sample_nuclide_KL_batch")
+def sample_nuclide_KL_batch(
+    nuclide: str,
+    endf_path: str,
+    pre_processed_path: str,
+    n_trunc: int,
+    samples: np.ndarray,
+    mode: str = "njoy",
+    cross_sections_xml: str | None = None,
+    out_dir: str | Path = "sample_rand",
+    openmc_xml_dir: str | Path | None = None,
+) -> list[RandomData]:
+    """
+    Generate several perturbed samples of a nuclide at once.
+
+    `samples` has shape (N, n_trunc). The ENDF, errorr, pendf and SVD files
+    are parsed once and all KL perturbations are computed with a single
+    matrix product. Sample `i` is written to `out_dir/<i>/` under the name
+    `<nuclide>-rand<i>`, so that the samples can be loaded side by side in one
+    OpenMC session (see `run_openmc.LibRunner`). See `sample_nuclide_KL` for
+    the other arguments.
+    """
+    samples = np.atleast_2d(samples)
+    with stage("load_inputs"):
+        inputs = _KLInputs(nuclide, endf_path, pre_processed_path, n_trunc, mode, cross_sections_xml,
+                           openmc_xml_dir=openmc_xml_dir)
+
+    with stage("kl_expand"):
+        kl_samples = inputs.basis.expand(samples.T)
+    out_dir = Path(out_dir).resolve()
+
+    random_data = []
+    for i in range(samples.shape[0]):
+        print(f"Writing sample {i + 1}/{samples.shape[0]} of {nuclide}")
+        with stage("write_sample", sample=i):
+            random_data.append(inputs.write_sample(kl_samples[:, i], out_dir / str(i), f"{nuclide}-rand{i}", samples[i]))
+
+    return random_data
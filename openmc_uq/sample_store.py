@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+import h5py
+import numpy as np
+
+
+SAMPLE_STORE_ENV = "OPENMC_UQ_SAMPLE_STORE"
+SAMPLE_STORE_SIZE_ENV = "OPENMC_UQ_SAMPLE_STORE_MAX_GB"
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    """Hardlink `source` to `dest`, copying across filesystems."""
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class SampleStore:
+    """
+    Content-addressed on-disk store of perturbed HDF5 files.
+
+    Entries are keyed by the nuclide, the hash of the data it was perturbed
+    from and the hash of the perturbation (KL sample vector or SANDY seed),
+    so an identical sample, e.g. a nuclide held at nominal in one-at-a-time
+    runs or a rerun after a failure, is fetched instead of regenerated.
+
+    Files are handed out as hardlinks where possible, so the link count of
+    an entry's file is its reference count: entries still linked from a run
+    directory are never evicted (removing them would free no space anyway),
+    and the least recently used of the others are evicted once the store
+    exceeds `max_bytes`.
+    """
+
+    def __init__(self, store_dir: str | Path, max_bytes: int | None = None):
+        self.store_dir = Path(store_dir).resolve()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(nuclide: str, source_hash: str, sample: np.ndarray | None = None, seed: int | None = None, **params) -> str:
+        """Key of the perturbed `nuclide` generated from `source_hash` with a sample vector or seed."""
+        h = hashlib.sha256(f"{nuclide}:{source_hash}".encode())
+        if sample is not None:
+            h.update(np.ascontiguousarray(sample, dtype=np.float64).tobytes())
+        if seed is not None:
+            h.update(f"seed:{int(seed)}".encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.store_dir / key
+
+    def refcount(self, key: str) -> int:
+        """Number of run directories the entry is currently linked from."""
+        data = self._entry(key) / "data.h5"
+        return data.stat().st_nlink - 1 if data.is_file() else 0
+
+    def fetch(self, key: str, name: str, out_dir: str | Path) -> Path | None:
+        """
+        Place the stored file of `key` in `out_dir` as `<name>.h5`, or return
+        None on a miss. A file stored under another nuclide name is copied and
+        its HDF5 group renamed, since OpenMC looks data up by that name.
+        """
+        entry = self._entry(key)
+        if not (entry / "meta.json").is_file():
+            return None
+        with open(entry / "meta.json") as f:
+            meta = json.load(f)
+
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        file_out = out_dir / f"{name}.h5"
+        if file_out.is_symlink() or file_out.exists():
+            file_out.unlink()
+
+        if meta["name"] == name:
+            _link_or_copy(entry / "data.h5", file_out)
+        else:
+            shutil.copyfile(entry / "data.h5", file_out)
+            with h5py.File(file_out, "a") as hf:
+                hf.move(meta["name"], name)
+
+        os.utime(entry)
+        print(f"Reusing stored sample {key[:12]} of {meta['nuclide']} as {name}")
+        return file_out
+
+    def put(self, key: str, file: str | Path, nuclide: str, name: str, meta: dict | None = None) -> Path:
+        """
+        Store the perturbed HDF5 `file` of `nuclide`, holding data under the
+        name `name`. It is linked into a temporary directory and renamed into
+        place, so concurrent writers of the same key are safe (the first wins).
+        """
+        entry = self._entry(key)
+        tmp = self.store_dir / f"{key}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        _link_or_copy(Path(file), tmp / "data.h5")
+        with open(tmp / "meta.json", "w") as f:
+            json.dump({"nuclide": nuclide, "name": name, "created": time.time(), **(meta or {})}, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process stored the same sample first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict()
+        return entry / "data.h5"
+
+    def evict(self) -> None:
+        """Remove unreferenced entries, least recently used first, until the store fits in `max_bytes`."""
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for path in self.store_dir.iterdir():
+            data = path / "data.h5"
+            if path.is_dir() and ".tmp-" not in path.name and data.is_file():
+                stat = data.stat()
+                entries.append((path.stat().st_mtime, stat.st_size, stat.st_nlink > 1, path))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, referenced, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if referenced:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"Evicted {path.name} from the sample store")
+
+
+def default_sample_store() -> SampleStore | None:
+    """
+    Sample store configured through the environment, or None if disabled.
+
+    Set `OPENMC_UQ_SAMPLE_STORE` to enable it and optionally
+    `OPENMC_UQ_SAMPLE_STORE_MAX_GB` to cap its size.
+    """
+    store_dir = os.getenv(SAMPLE_STORE_ENV)
+    if not store_dir:
+        return None
+
+    max_gb = os.getenv(SAMPLE_STORE_SIZE_ENV)
+    max_bytes = int(float(max_gb) * 1024**3) if max_gb else None
+    return SampleStore(store_dir, max_bytes)
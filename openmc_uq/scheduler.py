@@ -0,0 +1,232 @@
+import os
+import queue
+from multiprocessing import Pool
+from pathlib import Path
+
+from .cache import ParsedCache, default_cache
+from .endf_index import _endf_float
+from .resources import limit_threads, pin
+from .utils import NJOY_PARAMS, get_nuclide_paths
+
+MEMORY_BUDGET_ENV = "OPENMC_UQ_MEMORY_GB"
+
+# Completed tasks the largest waiting task lets smaller ones overtake it for
+MAX_BACKFILL_WAITS = 2
+
+# Group count assumed for nuclides without an errorr tape yet, when no other
+# tape in the pre-processed directory gives it
+DEFAULT_GROUPS = 33
+
+# Dense covariance copies alive at once during a decomposition (matrix,
+# eigenvectors, LAPACK workspace), and the fixed cost of parsing the tapes
+MEMORY_FACTOR = 4
+BASE_MEMORY = 1 << 30
+
+# Covariance rows per BLAS thread, below which extra threads do not pay off
+ROWS_PER_THREAD = 1500
+
+
+def _sections(tape: Path, mfs: tuple[int, ...]) -> dict[int, set[int]]:
+    """MTs of every section of `tape` in the files `mfs`, from columns 71-75 of each line."""
+    sections = {}
+    with open(tape, errors="replace") as f:
+        for line in f:
+            try:
+                mf, mt = int(line[70:72]), int(line[72:75])
+            except ValueError:
+                continue
+            if mf in mfs and mt > 0:
+                sections.setdefault(mf, set()).add(mt)
+    return sections
+
+
+def errorr_groups(errorr_file: str | Path) -> int:
+    """
+    Group count of an errorr tape, from the LIST record of the NGN + 1 group
+    boundaries in MF1/MT451. Raises ValueError if the record is not a list
+    of increasing energies.
+    """
+    with open(errorr_file, errors="replace") as f:
+        records = [line for line in f if line[70:75] == " 1451"]
+    try:
+        # HEAD record, then the LIST record (NPL in columns 45-55) and its values
+        npl = int(records[1][44:55])
+        fields = [line[i:i + 11] for line in records[2:2 + -(-npl // 6)] for i in range(0, 66, 11)][:npl]
+        boundaries = [_endf_float(field) for field in fields]
+    except (IndexError, ValueError):
+        boundaries = []
+    if len(boundaries) < 2 or any(b <= a for a, b in zip(boundaries, boundaries[1:])):
+        raise ValueError(f"No group boundaries found in MF1/MT451 of {errorr_file}")
+    return len(boundaries) - 1
+
+
+def estimate_dimension(
+    nuclide: str,
+    endf_path: str,
+    save_path: str | Path,
+    cache: ParsedCache | None = None,
+    n_groups: int | None = None,
+) -> int:
+    """
+    Covariance dimension (MTs times groups) of a nuclide, without parsing
+    any tape: exact from the parsed-data cache or an existing errorr tape in
+    `save_path` with a readable group list, otherwise the MF31/33 MT count of the ENDF file times
+    `n_groups` (default: that of another errorr tape in `save_path`, else
+    `DEFAULT_GROUPS`).
+    """
+    cache = default_cache() if cache is None else cache
+    file = get_nuclide_paths(endf_path, [nuclide])[0]
+
+    if cache is not None:
+        entry = cache.get(cache.key(file, **NJOY_PARAMS))
+        if entry is not None:
+            return entry["mts"].size * (entry["energy_grid"].size - 1)
+
+    errorr = Path(save_path) / f"{nuclide}.error"
+    if errorr.is_file():
+        try:
+            n_groups = errorr_groups(errorr)
+        except ValueError as exc:
+            # Falls back to the ENDF estimate below
+            print(f"{exc}, estimating the dimension of {nuclide} from its ENDF file")
+        else:
+            mts = set().union(*_sections(errorr, (31, 33)).values())
+            return len(mts) * n_groups
+
+    if n_groups is None:
+        n_groups = DEFAULT_GROUPS
+        for other in sorted(Path(save_path).glob("*.error")):
+            try:
+                n_groups = errorr_groups(other)
+            except ValueError:
+                continue
+            break
+
+    mts = set().union(*_sections(Path(file), (31, 33)).values())
+    return len(mts) * n_groups
+
+
+def memory_estimate(dim: int, itemsize: int = 8) -> int:
+    """Peak memory in bytes of decomposing a dense covariance of dimension `dim`."""
+    return MEMORY_FACTOR * dim**2 * itemsize + BASE_MEMORY
+
+
+def blas_threads(dim: int, max_threads: int) -> int:
+    """BLAS threads matched to the size of a decomposition."""
+    return max(1, min(max_threads, dim // ROWS_PER_THREAD))
+
+
+def default_memory_budget() -> int:
+    """
+    Memory available to the tasks in bytes: `$OPENMC_UQ_MEMORY_GB`, else the
+    Slurm allocation (`SLURM_MEM_PER_NODE`, in MB), else 90% of the node's memory.
+    """
+    budget = os.getenv(MEMORY_BUDGET_ENV)
+    if budget:
+        return int(float(budget) * 1024**3)
+    slurm = os.getenv("SLURM_MEM_PER_NODE")
+    if slurm:
+        return int(slurm) * 1024**2
+    return int(0.9 * os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+
+
+def _run_task(func, args, kwargs, threads, cpus=None):
+    pin(cpus)
+    limits = limit_threads(threads)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        limits.unregister()
+
+
+class Task:
+    """One call of the scheduled function, with its estimated size."""
+
+    def __init__(self, name: str, args: tuple, kwargs: dict, dim: int, memory: int | None = None):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.dim = dim
+        self.memory = memory_estimate(dim) if memory is None else memory
+
+
+def run_scheduled(
+    func, tasks: list[Task], n_cores: int, memory_budget: int | None = None, cpus: list[int] | None = None
+) -> dict:
+    """
+    Run `func(*task.args, **task.kwargs)` for every task on `n_cores`,
+    largest first, and return the results keyed by task name.
+
+    A task is started once its estimated memory fits in what is left of
+    `memory_budget` (default `default_memory_budget`) and a core is free,
+    with smaller tasks filling in while a large one waits. Once the largest
+    waiting task has been passed over for `MAX_BACKFILL_WAITS` completed
+    tasks, backfilling stops and the memory being freed is held for it, so
+    the largest nuclides do not end up running last. Each task gets
+    BLAS threads matched to its size, out of the free cores. A task larger
+    than the whole budget runs alone. Every task runs in a fresh worker
+    process, so memory is returned to the system between tasks. If `cpus`
+    is given (e.g. `ResourceBudget.cpus`), each task is pinned to as many
+    of them as it has threads.
+    """
+    memory_budget = default_memory_budget() if memory_budget is None else memory_budget
+    free_cpus = None if cpus is None else list(cpus)
+    n_cores = n_cores if cpus is None else len(cpus)
+    waiting = sorted(tasks, key=lambda t: t.dim, reverse=True)
+    running = {}
+    results = {}
+    done = queue.Queue()
+    # Largest task passed over for lack of memory, and the completions it has waited for
+    blocked, waits = None, 0
+
+    print(f"Scheduling {len(tasks)} tasks on {n_cores} cores within {memory_budget / 1024**3:.1f} GB")
+    with Pool(n_cores, maxtasksperchild=1) as pool:
+        while waiting or running:
+            free_cores = n_cores - sum(threads for threads, _, _ in running.values())
+            free_memory = memory_budget - sum(memory for _, memory, _ in running.values())
+
+            first_skip = True
+            for task in list(waiting):
+                if free_cores < 1:
+                    break
+                if task.memory > free_memory and (running or task.memory <= memory_budget):
+                    if first_skip:
+                        first_skip = False
+                        if task is not blocked:
+                            blocked, waits = task, 0
+                        if waits >= MAX_BACKFILL_WAITS:
+                            if waits == MAX_BACKFILL_WAITS:
+                                print(f"Holding memory for {task.name}, no more smaller tasks until it starts")
+                            break
+                    continue
+                if task.memory > memory_budget:
+                    print(f"{task.name} needs an estimated {task.memory / 1024**3:.1f} GB, "
+                          "more than the budget, running it alone")
+
+                threads = min(blas_threads(task.dim, n_cores), free_cores)
+                task_cpus = None
+                if free_cpus is not None:
+                    task_cpus, free_cpus = free_cpus[:threads], free_cpus[threads:]
+                waiting.remove(task)
+                running[task.name] = (threads, task.memory, task_cpus)
+                free_cores -= threads
+                free_memory -= task.memory
+                print(f"Starting {task.name} (dimension {task.dim}, ~{task.memory / 1024**3:.1f} GB, {threads} threads)")
+                pool.apply_async(
+                    _run_task, (func, task.args, task.kwargs, threads, task_cpus),
+                    callback=lambda result, name=task.name: done.put((name, result, None)),
+                    error_callback=lambda exc, name=task.name: done.put((name, None, exc)),
+                )
+
+            name, result, exc = done.get()
+            if blocked is not None and blocked in waiting:
+                waits += 1
+            if exc is not None:
+                pool.terminate()
+                raise RuntimeError(f"Task {name} failed") from exc
+            _, _, task_cpus = running.pop(name)
+            if task_cpus is not None:
+                free_cpus = sorted(free_cpus + task_cpus)
+            results[name] = result
+
+    return results
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+LINK_MODE_ENV = "OPENMC_UQ_LINK_MODE"
+SCRATCH_DIR_ENV = "OPENMC_UQ_SCRATCH_DIR"
+
+LINK_MODES = ("symlink", "hardlink", "copy")
+
+# Inputs rewritten for every sample, which each run directory needs its own copy of
+MUTABLE_FILES = ("materials.xml", "settings.xml", "tallies.xml")
+
+# Inputs only read by OpenMC, which can be shared between run directories
+IMMUTABLE_FILES = ("geometry.xml",)
+IMMUTABLE_SUFFIXES = (".h5m", ".e")
+
+
+def _copy_atomic(source: Path, dest: Path) -> None:
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, dest)
+
+
+def _remove(path: Path) -> None:
+    # Never write through an existing link into the shared source
+    if path.is_symlink() or path.exists():
+        path.unlink()
+
+
+def scratch_copy(source: Path, scratch_dir: str | Path) -> Path:
+    """
+    Copy of `source` on node-local scratch, made once per node and shared by
+    every run on it. The copy is keyed by the source path, size and mtime,
+    so a modified source is copied again.
+    """
+    stat = source.stat()
+    key = hashlib.sha256(f"{source}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    dest = Path(scratch_dir) / "openmc_uq_stage" / key / source.name
+    if not dest.is_file():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Copying {source.name} to node-local scratch {dest.parent}")
+        _copy_atomic(source, dest)
+    return dest
+
+
+def link_file(source: Path, dest: Path, mode: str) -> None:
+    """Place `source` at `dest` as a symlink, hardlink or copy. Hardlinks fall back to symlinks across filesystems."""
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode '{mode}'. Expected one of {LINK_MODES}.")
+
+    if mode == "symlink" and dest.is_symlink() and Path(os.readlink(dest)) == source:
+        return
+    if mode == "hardlink" and dest.exists() and os.path.samefile(source, dest):
+        return
+
+    _remove(dest)
+    if mode == "copy":
+        shutil.copyfile(source, dest)
+    elif mode == "hardlink":
+        try:
+            os.link(source, dest)
+        except OSError:
+            os.symlink(source, dest)
+    else:
+        os.symlink(source, dest)
+
+
+def stage_model(
+    openmc_xml_dir: str | Path,
+    run_dir: str | Path,
+    link_mode: str | None = None,
+    scratch_dir: str | Path | None = None,
+    mutable_files: tuple[str, ...] = MUTABLE_FILES,
+) -> Path:
+    """
+    Prepare a run directory for the OpenMC model in `openmc_xml_dir`.
+
+    The inputs rewritten for each sample (`mutable_files`, by default the
+    materials, settings and tallies) are copied, while the geometry and any
+    DAGMC (.h5m) or libMesh (.e) meshes are linked according to `link_mode`
+    (default `$OPENMC_UQ_LINK_MODE`, else "symlink"). With `scratch_dir` (default
+    `$OPENMC_UQ_SCRATCH_DIR`) the linked files are first copied once to
+    node-local scratch and linked from there, keeping OpenMC's reads off the
+    shared filesystem.
+    """
+    link_mode = link_mode or os.getenv(LINK_MODE_ENV) or "symlink"
+    scratch_dir = scratch_dir or os.getenv(SCRATCH_DIR_ENV)
+
+    out_dir = Path(run_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    openmc_xml_dir = Path(openmc_xml_dir).resolve()
+
+    for file in mutable_files:
+        dest = out_dir / file
+        _remove(dest)
+        shutil.copyfile(openmc_xml_dir / file, dest)
+
+    for file in sorted(os.listdir(openmc_xml_dir)):
+        if file not in IMMUTABLE_FILES and not file.endswith(IMMUTABLE_SUFFIXES):
+            continue
+        source = openmc_xml_dir / file
+        if scratch_dir:
+            source = scratch_copy(source, scratch_dir)
+        link_file(source, out_dir / file, link_mode)
+
+    return out_dir
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+"""
+Streaming statistics of UQ results and a convergence monitor.
+
+Per-sample QoIs are consumed one at a time (or in blocks) as they are
+produced, keeping running moments and quantile estimates without storing
+the samples. The monitor watches a results directory (see
+`openmc_uq.results`), reports the standard error of each QoI and the number
+of further samples needed to reach a target, and can signal an early stop
+by creating a stop file once every target is met:
+
+    python3 -m openmc_uq.statistics results_dir --target-rel-se 1e-3 --watch 60 --stop-file STOP
+"""
+import argparse
+import time
+from pathlib import Path
+import h5py
+import numpy as np
+
+from .results import DONE, shard_files
+
+
+class RunningMoments:
+    """
+    Running mean, variance, skewness, kurtosis and covariance of a vector
+    of `n_vars` variables, updated with Welford's algorithm (and Pébay's
+    pairwise formulas to merge blocks of samples or other accumulators).
+    """
+
+    def __init__(self, n_vars: int):
+        self.n = 0
+        self.mean = np.zeros(n_vars)
+        self.m2 = np.zeros(n_vars)
+        self.m3 = np.zeros(n_vars)
+        self.m4 = np.zeros(n_vars)
+        # Co-moment matrix, sum of (x - mean)(x - mean)^T
+        self.c2 = np.zeros((n_vars, n_vars))
+
+    @classmethod
+    def from_samples(cls, x: np.ndarray) -> "RunningMoments":
+        """Accumulator holding the samples `x` of shape (n, n_vars)."""
+        x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        moments = cls(x.shape[1])
+        moments.n = x.shape[0]
+        if moments.n == 0:
+            return moments
+        moments.mean = x.mean(axis=0)
+        d = x - moments.mean
+        moments.m2 = np.sum(d**2, axis=0)
+        moments.m3 = np.sum(d**3, axis=0)
+        moments.m4 = np.sum(d**4, axis=0)
+        moments.c2 = d.T @ d
+        return moments
+
+    def update(self, x: np.ndarray) -> None:
+        """Add one sample of shape (n_vars,) or a block of shape (n, n_vars)."""
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 2:
+            self.merge(RunningMoments.from_samples(x))
+            return
+
+        n1 = self.n
+        self.n += 1
+        n = self.n
+        delta = x - self.mean
+        delta_n = delta / n
+        term = delta * delta_n * n1
+
+        self.mean = self.mean + delta_n
+        self.m4 = self.m4 + term * delta_n**2 * (n * n - 3 * n + 3) + 6 * delta_n**2 * self.m2 - 4 * delta_n * self.m3
+        self.m3 = self.m3 + term * delta_n * (n - 2) - 3 * delta_n * self.m2
+        self.m2 = self.m2 + term
+        self.c2 = self.c2 + np.outer(delta, x - self.mean)
+
+    def merge(self, other: "RunningMoments") -> None:
+        """Combine with the moments of another, disjoint, set of samples."""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.c2 = other.n, other.mean.copy(), other.c2.copy()
+            self.m2, self.m3, self.m4 = other.m2.copy(), other.m3.copy(), other.m4.copy()
+            return
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+
+        m2 = self.m2 + other.m2 + delta**2 * na * nb / n
+        m3 = (
+            self.m3 + other.m3
+            + delta**3 * na * nb * (na - nb) / n**2
+            + 3 * delta * (na * other.m2 - nb * self.m2) / n
+        )
+        m4 = (
+            self.m4 + other.m4
+            + delta**4 * na * nb * (na * na - na * nb + nb * nb) / n**3
+            + 6 * delta**2 * (na * na * other.m2 + nb * nb * self.m2) / n**2
+            + 4 * delta * (na * other.m3 - nb * self.m3) / n
+        )
+        self.c2 = self.c2 + other.c2 + np.outer(delta, delta) * na * nb / n
+        self.mean = self.mean + delta * nb / n
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.n = n
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Unbiased sample variance."""
+        if self.n < 2:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.n - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    @property
+    def standard_error(self) -> np.ndarray:
+        """Standard error of the mean."""
+        return self.std / np.sqrt(max(self.n, 1))
+
+    @property
+    def covariance(self) -> np.ndarray:
+        if self.n < 2:
+            return np.full_like(self.c2, np.nan)
+        return self.c2 / (self.n - 1)
+
+    @property
+    def skewness(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self.n) * self.m3 / self.m2**1.5
+
+    @property
+    def kurtosis(self) -> np.ndarray:
+        """Excess kurtosis."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.n * self.m4 / self.m2**2 - 3.0
+
+
+class P2Quantile:
+    """
+    Streaming estimate of the `p` quantile of a scalar with the P² algorithm
+    (Jain & Chlamtac, 1985), using five markers and constant memory.
+    """
+
+    def __init__(self, p: float):
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"Quantile probability must be in (0, 1), got {p}.")
+        self.p = p
+        self.heights = []
+        self.positions = np.arange(1.0, 6.0)
+        self.desired = np.array([1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0])
+        self.increments = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+    def update(self, x: float) -> None:
+        if len(self.heights) < 5:
+            self.heights.append(float(x))
+            self.heights.sort()
+            if len(self.heights) == 5:
+                self.heights = np.array(self.heights)
+            return
+
+        q, pos = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = int(np.searchsorted(q, x, side="right")) - 1
+
+        pos[k + 1:] += 1
+        self.desired += self.increments
+
+        for i in range(1, 4):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = np.sign(d)
+                # Piecewise-parabolic prediction, or linear if it breaks monotonicity
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    j = i + int(d)
+                    qp = q[i] + d * (q[j] - q[i]) / (pos[j] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    @property
+    def value(self) -> float:
+        if len(self.heights) == 0:
+            return np.nan
+        if len(self.heights) < 5:
+            return float(np.quantile(self.heights, self.p))
+        return float(self.heights[2])
+
+
+def samples_needed(std: np.ndarray, target_se: np.ndarray) -> np.ndarray:
+    """Total number of samples for the standard error of the mean to reach `target_se`."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.ceil((np.asarray(std) / np.asarray(target_se)) ** 2)
+    return np.where(np.isfinite(n), n, np.inf)
+
+
+class ConvergenceMonitor:
+    """
+    Running statistics of named QoIs with an early-stop criterion.
+
+    A QoI has converged when its standard error of the mean is below
+    `target_se` (absolute) and/or `target_rel_se` times its mean. Both may be
+    scalars or one value per QoI; the monitor has converged when every QoI
+    with a target has, after at least `min_samples` samples.
+    """
+
+    def __init__(self, names: list[str], target_se=None, target_rel_se=None,
+                 quantiles=(0.05, 0.5, 0.95), min_samples: int = 10):
+        self.names = list(names)
+        self.moments = RunningMoments(len(self.names))
+        self.quantiles = {p: [P2Quantile(p) for _ in self.names] for p in quantiles}
+        n = len(self.names)
+        self.target_se = None if target_se is None else np.broadcast_to(np.asarray(target_se, float), (n,))
+        self.target_rel_se = None if target_rel_se is None else np.broadcast_to(np.asarray(target_rel_se, float), (n,))
+        self.min_samples = min_samples
+
+    @property
+    def n(self) -> int:
+        return self.moments.n
+
+    def update(self, x: np.ndarray) -> None:
+        """Add one sample (n_qoi,) or a block (n, n_qoi). Samples with NaNs are skipped."""
+        x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        x = x[np.all(np.isfinite(x), axis=1)]
+        if x.shape[0] == 0:
+            return
+        self.moments.update(x)
+        for estimators in self.quantiles.values():
+            for row in x:
+                for estimator, value in zip(estimators, row):
+                    estimator.update(value)
+
+    def target(self) -> np.ndarray:
+        """Standard error to reach for each QoI (inf where there is no target)."""
+        target = np.full(len(self.names), np.inf)
+        if self.target_se is not None:
+            target = np.minimum(target, self.target_se)
+        if self.target_rel_se is not None:
+            target = np.minimum(target, self.target_rel_se * np.abs(self.moments.mean))
+        return target
+
+    def samples_needed(self) -> np.ndarray:
+        """Further samples needed for each QoI to reach its target."""
+        needed = samples_needed(self.moments.std, self.target()) - self.n
+        return np.maximum(needed, 0)
+
+    def converged(self) -> bool:
+        if self.target_se is None and self.target_rel_se is None:
+            return False
+        if self.n < max(self.min_samples, 2):
+            return False
+        return bool(np.all(self.moments.standard_error <= self.target()))
+
+    def report(self) -> str:
+        m = self.moments
+        lines = [f"{self.n} samples"]
+        header = f"  {'QoI':<16}{'mean':>13}{'std':>13}{'std. err.':>13}{'skew':>9}{'kurt':>9}"
+        for p in self.quantiles:
+            header += f"{f'q{p:g}':>13}"
+        header += f"{'more needed':>13}"
+        lines.append(header)
+
+        needed = self.samples_needed()
+        for i, name in enumerate(self.names):
+            line = (
+                f"  {name:<16}{m.mean[i]:>13.5e}{m.std[i]:>13.5e}{m.standard_error[i]:>13.5e}"
+                f"{m.skewness[i]:>9.3f}{m.kurtosis[i]:>9.3f}"
+            )
+            for estimators in self.quantiles.values():
+                line += f"{estimators[i].value:>13.5e}"
+            line += f"{needed[i]:>13.0f}" if np.isfinite(self.target()[i]) else f"{'-':>13}"
+            lines.append(line)
+
+        if self.converged():
+            lines.append("All targets reached.")
+        return "\n".join(lines)
+
+
+class ResultsFollower:
+    """Reads the rows appended to the shards of a results directory since the last call."""
+
+    def __init__(self, path: str | Path, field: str = "qoi/mean"):
+        self.path = Path(path)
+        self.field = field
+        self._seen = {}
+
+    def new_rows(self) -> np.ndarray | None:
+        rows = []
+        for file in shard_files(self.path):
+            start = self._seen.get(file, 0)
+            try:
+                with h5py.File(file, "r") as hf:
+                    if "sample_id" not in hf or self.field not in hf:
+                        continue
+                    n = min(hf["sample_id"].shape[0], hf[self.field].shape[0])
+                    if n <= start:
+                        continue
+                    status = hf["status"][start:n]
+                    rows.append(hf[self.field][start:n][status == DONE])
+            except OSError:
+                # Shard being created or written, read it next time
+                continue
+            self._seen[file] = n
+
+        if len(rows) == 0:
+            return None
+        return np.concatenate(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", help="Results directory (or file) written by openmc_uq.results")
+    parser.add_argument("--target-se", type=float, default=None, help="Absolute standard error target")
+    parser.add_argument("--target-rel-se", type=float, default=None, help="Standard error target relative to the mean")
+    parser.add_argument("--min-samples", type=int, default=10)
+    parser.add_argument("--watch", type=float, default=None, help="Poll every WATCH seconds until converged")
+    parser.add_argument("--stop-file", default=None, help="File to create once every target is reached")
+    args = parser.parse_args()
+
+    follower = ResultsFollower(args.results)
+    first = follower.new_rows()
+    while first is None:
+        if args.watch is None:
+            raise SystemExit(f"No results found in {args.results}")
+        time.sleep(args.watch)
+        first = follower.new_rows()
+
+    with h5py.File(shard_files(args.results)[0], "r") as hf:
+        scores = [str(s) for s in hf.attrs.get("scores", [])]
+    names = scores if len(scores) == first.shape[1] else [f"qoi{i}" for i in range(first.shape[1])]
+
+    monitor = ConvergenceMonitor(names, args.target_se, args.target_rel_se, min_samples=args.min_samples)
+    monitor.update(first)
+    print(monitor.report())
+
+    while args.watch is not None and not monitor.converged():
+        time.sleep(args.watch)
+        rows = follower.new_rows()
+        if rows is not None:
+            monitor.update(rows)
+            print(monitor.report())
+
+    if monitor.converged() and args.stop_file is not None:
+        Path(args.stop_file).touch()
+        print(f"Created stop file {args.stop_file}")
+
+
+if __name__ == "__main__":
+    main()
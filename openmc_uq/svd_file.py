@@ -0,0 +1,221 @@
+import argparse
+import os
+import h5py
+import numpy as np
+from pathlib import Path
+
+from .covariance import PerturbationLayout
+from .decomposition import KLBasis, truncation_order
+
+# Version history:
+#   1: u, s and vh written as contiguous float64 datasets, no metadata
+#   2: u stored column-chunked (optionally float32/compressed) and possibly
+#      truncated, vh dropped, metadata stored as attributes
+#   3: basis stored per independent covariance block under `blocks/<b>/{rows,u}`,
+#      with `component_block` mapping the globally ranked `s` to blocks
+#   4: optional `layout` group with the perturbation layout (MAT, MTs, energy
+#      grid, row offsets and the MTs perturbed in the pendf)
+FORMAT_VERSION = 4
+
+
+def _column_chunks(shape: tuple[int, int]) -> tuple[int, int]:
+    """Chunk `u` by single columns so a truncated read only touches the columns it needs."""
+    return (max(shape[0], 1), 1)
+
+
+def write_svd(
+    svd_file: str | Path,
+    basis: KLBasis,
+    n_keep: int | None = None,
+    dtype=np.float64,
+    compression: str | None = None,
+    layout: PerturbationLayout | None = None,
+) -> None:
+    """
+    Write a KL basis to `svd_file` in the current format.
+
+    Only the columns of the first `n_keep` components are stored (all of them
+    if None), while the whole of `s` is kept so truncation orders can be
+    recomputed. The `layout` of the covariance rows is stored with it if
+    given. The file is written to a temporary path and moved into place.
+    """
+    svd_file = Path(svd_file)
+    n_keep = basis.s.size if n_keep is None else min(int(n_keep), basis.s.size)
+    counts = basis.block_counts(n_keep)
+
+    tmp_file = svd_file.with_name(svd_file.name + ".tmp")
+    with h5py.File(tmp_file, "w") as hf:
+        hf.attrs["format_version"] = FORMAT_VERSION
+        hf.attrs["method"] = basis.method
+        hf.attrs["size"] = basis.size
+        hf.attrs["total"] = basis.total
+        hf.attrs["error_bound"] = basis.error_bound
+        hf.attrs["n_stored"] = n_keep
+        hf.create_dataset("s", data=basis.s)
+        hf.create_dataset("component_block", data=basis.component_block)
+
+        blocks = hf.create_group("blocks")
+        for b, (rows, u, m) in enumerate(zip(basis.rows, basis.u, counts)):
+            group = blocks.create_group(str(b))
+            group.create_dataset("rows", data=rows)
+            u = np.asarray(u[:, :m], dtype=dtype)
+            group.create_dataset(
+                "u", data=u, chunks=_column_chunks(u.shape) if u.size else None,
+                compression=compression,
+            )
+
+        if layout is not None:
+            _write_layout(hf, layout)
+
+    os.replace(tmp_file, svd_file)
+
+
+def _write_layout(hf: h5py.File, layout: PerturbationLayout) -> None:
+    if "layout" in hf:
+        del hf["layout"]
+    group = hf.create_group("layout")
+    group.attrs["mat"] = layout.mat
+    group.create_dataset("mts", data=np.array(layout.mts, dtype=int))
+    group.create_dataset("energy_grid", data=layout.energy_grid)
+    group.create_dataset("offsets", data=layout.offsets)
+    if layout.valid_mts is not None:
+        group.create_dataset("valid_mts", data=layout.valid_mts)
+
+
+def write_layout(svd_file: str | Path, layout: PerturbationLayout) -> None:
+    """Add (or replace) the perturbation layout of an existing SVD file, of any format version."""
+    with h5py.File(svd_file, "a") as hf:
+        _write_layout(hf, layout)
+
+
+def read_layout(svd_file: str | Path) -> PerturbationLayout | None:
+    """The perturbation layout stored in an SVD file, or None for files written without one."""
+    with h5py.File(svd_file, "r") as hf:
+        if "layout" not in hf:
+            return None
+        group = hf["layout"]
+        valid_mts = np.array(group["valid_mts"]) if "valid_mts" in group else None
+        return PerturbationLayout(
+            int(group.attrs["mat"]), np.array(group["mts"]).tolist(), np.array(group["energy_grid"]), valid_mts
+        )
+
+
+def read_svd_info(svd_file: str | Path) -> dict:
+    """
+    Read the spectrum and metadata of an SVD file without touching `u`,
+    including the untruncated `dimension` (see `KLBasis.dimension`).
+    """
+    with h5py.File(svd_file, "r") as hf:
+        s = np.array(hf["s"])
+        version = int(hf.attrs.get("format_version", 1))
+        size = int(hf.attrs.get("size", s.size))
+        if version >= 3:
+            n_stored = int(hf.attrs["n_stored"])
+            dimension = sum(group["rows"].shape[0] for group in hf["blocks"].values())
+        else:
+            n_stored = hf["u"].shape[1]
+            dimension = size
+        return {
+            "format_version": version,
+            "s": s,
+            "total": float(hf.attrs.get("total", np.sum(s))),
+            "size": size,
+            "dimension": dimension,
+            "n_stored": n_stored,
+        }
+
+
+def read_kl_basis(svd_file: str | Path, n_trunc: int) -> KLBasis:
+    """
+    Read the first `n_trunc` components of an SVD file, touching only the
+    stored columns they need (hyperslab reads of each block's `u`).
+    """
+    info = read_svd_info(svd_file)
+    if n_trunc > info["n_stored"]:
+        raise ValueError(
+            f"{svd_file} stores {info['n_stored']} components but {n_trunc} were requested. "
+            "Re-run setup.py (or migrate the file) with a larger variance threshold."
+        )
+
+    with h5py.File(svd_file, "r") as hf:
+        method = hf.attrs.get("method", "full")
+        s = info["s"][:n_trunc]
+
+        if info["format_version"] < 3:
+            u = hf["u"][:, :n_trunc].astype(np.float64, copy=False)
+            rows, us = [np.arange(info["size"])], [u]
+            component_block = np.zeros(n_trunc, dtype=int)
+        else:
+            component_block = hf["component_block"][:n_trunc]
+            rows, us = [], []
+            n_blocks = len(hf["blocks"])
+            for b, m in enumerate(np.bincount(component_block, minlength=n_blocks)):
+                group = hf["blocks"][str(b)]
+                rows.append(np.array(group["rows"]))
+                us.append(group["u"][:, :m].astype(np.float64, copy=False))
+
+        basis = KLBasis(info["size"], rows, us, s, component_block, info["total"], method)
+        basis.error_bound = float(hf.attrs.get("error_bound", np.nan))
+
+    return basis
+
+
+def migrate_svd_file(
+    svd_file: str | Path,
+    total_var: float | None = None,
+    dtype=np.float64,
+    compression: str | None = None,
+) -> None:
+    """
+    Rewrite an SVD file in the current format.
+
+    If `total_var` is given only the components needed for it are kept,
+    otherwise all stored components are.
+    """
+    info = read_svd_info(svd_file)
+    basis = read_kl_basis(svd_file, info["n_stored"])
+    layout = read_layout(svd_file)
+
+    # Keep the whole spectrum, not just the stored part
+    with h5py.File(svd_file, "r") as hf:
+        if info["format_version"] >= 3:
+            component_block = np.array(hf["component_block"])
+        else:
+            component_block = np.zeros(info["s"].size, dtype=int)
+    basis.s, basis.component_block = info["s"], component_block
+
+    n_keep = info["n_stored"]
+    if total_var is not None:
+        n_keep = min(truncation_order(info["s"], info["total"], total_var), n_keep)
+
+    write_svd(svd_file, basis, n_keep=n_keep, dtype=dtype, compression=compression, layout=layout)
+    print(
+        f"Migrated {svd_file} from format {info['format_version']} to {FORMAT_VERSION} "
+        f"({n_keep} of {info['n_stored']} stored components kept)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate pre-processed *_SVD.h5 files to the current storage format."
+    )
+    parser.add_argument("files", nargs="+", help="SVD files or pre-processed directories")
+    parser.add_argument("--total-var", type=float, default=None,
+                        help="Only keep the components needed for this %% of variance")
+    parser.add_argument("--float32", action="store_true", help="Store u in single precision")
+    parser.add_argument("--compression", default=None, help="HDF5 compression filter, e.g. gzip")
+    args = parser.parse_args()
+
+    for path in map(Path, args.files):
+        files = sorted(path.glob("*_SVD.h5")) if path.is_dir() else [path]
+        for file in files:
+            migrate_svd_file(
+                file,
+                total_var=args.total_var,
+                dtype=np.float32 if args.float32 else np.float64,
+                compression=args.compression,
+            )
+
+
+if __name__ == "__main__":
+    main()
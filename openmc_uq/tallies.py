@@ -0,0 +1,114 @@
+from pathlib import Path
+import h5py
+import numpy as np
+
+from .profiling import traced
+
+
+def latest_statepoint(run_dir: str | Path) -> Path:
+    """Most recently written statepoint file in `run_dir`."""
+    statepoints = list(Path(run_dir).glob("statepoint.*.h5"))
+    if len(statepoints) == 0:
+        raise FileNotFoundError(f"No statepoint files found in {run_dir}")
+    return max(statepoints, key=lambda path: path.stat().st_mtime_ns)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class TallyResult:
+    """
+    Mean and standard deviation of one tally, read from a statepoint.
+
+    `mean` and `std` have shape (*filter_shape, n_nuclides, n_scores), with
+    one axis per filter in the tally's filter order. Mesh filters are
+    expanded into the mesh dimensions in reverse order, i.e. (nz, ny, nx),
+    since OpenMC numbers mesh bins with x varying fastest.
+    """
+
+    def __init__(self, name: str, nuclides: list[str], scores: list[str], filter_shape: tuple,
+                 n_realizations: int, mean: np.ndarray, std: np.ndarray):
+        self.name = name
+        self.nuclides = nuclides
+        self.scores = scores
+        self.filter_shape = filter_shape
+        self.n_realizations = n_realizations
+        self.mean = mean
+        self.std = std
+
+    def total(self) -> tuple[float, float]:
+        """
+        Sum over every bin. Standard deviations are combined in quadrature,
+        treating the bins as independent.
+        """
+        return float(self.mean.sum()), float(np.sqrt(np.sum(self.std**2)))
+
+
+def _filter_shape(tallies_group: h5py.Group, filter_ids) -> list[int]:
+    shape = []
+    for filter_id in filter_ids:
+        group = tallies_group["filters"][f"filter {filter_id}"]
+        if _decode(group["type"][()]) == "mesh":
+            mesh_id = int(np.atleast_1d(group["bins"][()])[0])
+            mesh = tallies_group["meshes"][f"mesh {mesh_id}"]
+            if "dimension" in mesh:
+                shape.extend(int(n) for n in mesh["dimension"][()][::-1])
+                continue
+        shape.append(int(group["n_bins"][()]))
+    return shape
+
+
+def _statistics(results: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and standard deviation of the mean from the stored sum and sum of squares."""
+    mean = results[..., 0] / n
+    if n < 2:
+        return mean, np.zeros_like(mean)
+    var = (results[..., 1] / n - mean**2) / (n - 1)
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+@traced("read_tallies")
+def read_tallies(statepoint: str | Path, names: list[str]) -> dict[str, TallyResult]:
+    """
+    Read the named tallies of a statepoint file.
+
+    Only the `results` datasets of the requested tallies are loaded, without
+    building OpenMC tally objects or DataFrames.
+    """
+    found = {}
+    with h5py.File(statepoint, "r") as f:
+        tallies_group = f["tallies"]
+        for tally_id in np.atleast_1d(tallies_group.attrs["ids"]):
+            group = tallies_group[f"tally {tally_id}"]
+            if group.attrs.get("internal", 0):
+                continue
+            name = _decode(group["name"][()]) if "name" in group else ""
+            if name not in names or name in found:
+                continue
+
+            n = int(group["n_realizations"][()])
+            nuclides = [_decode(nuc) for nuc in group["nuclides"][()]]
+            scores = [_decode(score) for score in group["score_bins"][()]]
+            filter_ids = group["filters"][()] if int(group["n_filters"][()]) > 0 else []
+            shape = _filter_shape(tallies_group, filter_ids)
+
+            results = group["results"][()]
+            mean, std = _statistics(results, n)
+            shape = (*shape, len(nuclides), len(scores))
+            found[name] = TallyResult(
+                name, nuclides, scores, shape[:-2], n, mean.reshape(shape), std.reshape(shape)
+            )
+
+    missing = [name for name in names if name not in found]
+    if missing:
+        raise ValueError(f"Tallies {missing} not found in {statepoint}")
+
+    return found
+
+
+def tally_totals(statepoint: str | Path, names: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Total mean and standard deviation (see `TallyResult.total`) of each named tally."""
+    tallies = read_tallies(statepoint, names)
+    totals = np.array([tallies[name].total() for name in names])
+    return totals[:, 0], totals[:, 1]
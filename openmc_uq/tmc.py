@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Total Monte Carlo (TMC) variance separation and particle budgeting.
+
+The spread of the tally means m_i across nuclear data samples combines the
+nuclear data (ND) variance and the statistical variance of each OpenMC run,
+
+    var(m) = sigma_ND^2 + E[s_i^2],
+
+where s_i is the statistical standard deviation of sample i ("fast TMC").
+With H active histories per sample the statistical variance is a / H, so
+for a per-sample cost c0 + c1 H (data generation and OpenMC start-up, plus
+tracking) the total cost of reaching a target precision is minimised by
+
+    H* = sqrt(a c0 / (sigma_ND^2 c1))
+
+when estimating the mean, and by a somewhat larger H* when estimating
+sigma_ND itself. `recommend` estimates sigma_ND, a, c0 and c1 from a results
+store and suggests (or sets, with --apply) the particles per batch:
+
+    python3 -m openmc_uq.tmc results_dir --settings model/settings.xml --target-rel-nd-se 0.05 --apply
+"""
+import argparse
+import hashlib
+import math
+from pathlib import Path
+import numpy as np
+
+from .results import DONE, load_results
+from .utils import read_settings, set_particles
+
+OBJECTIVES = ("mean", "nd_std")
+
+
+class TMCResult:
+    """Separated variance components of each QoI over a set of samples."""
+
+    def __init__(self, names: list[str], n: int, mean: np.ndarray, total_var: np.ndarray, stat_var: np.ndarray):
+        self.names = names
+        self.n = n
+        self.mean = mean
+        self.total_var = total_var
+        self.stat_var = stat_var
+
+    @property
+    def nd_var(self) -> np.ndarray:
+        """Nuclear data variance, clipped at zero."""
+        return np.maximum(self.total_var - self.stat_var, 0.0)
+
+    @property
+    def nd_std(self) -> np.ndarray:
+        return np.sqrt(self.nd_var)
+
+    @property
+    def nd_std_se(self) -> np.ndarray:
+        """Approximate standard error of `nd_std`, assuming normally distributed sample means."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var_se = self.total_var * np.sqrt(2.0 / max(self.n - 1, 1))
+            return var_se / (2 * self.nd_std)
+
+    @property
+    def stat_fraction(self) -> np.ndarray:
+        """Share of the observed variance due to OpenMC statistics."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.stat_var / self.total_var
+
+    def report(self) -> str:
+        lines = [f"{self.n} samples"]
+        lines.append(f"  {'QoI':<16}{'mean':>13}{'total std':>13}{'ND std':>13}{'ND std err':>13}{'stat share':>12}")
+        for i, name in enumerate(self.names):
+            lines.append(
+                f"  {name:<16}{self.mean[i]:>13.5e}{np.sqrt(self.total_var[i]):>13.5e}"
+                f"{self.nd_std[i]:>13.5e}{self.nd_std_se[i]:>13.5e}{self.stat_fraction[i]:>12.1%}"
+            )
+        return "\n".join(lines)
+
+
+def separate_variance(means: np.ndarray, stds: np.ndarray, names: list[str] | None = None) -> TMCResult:
+    """
+    Separate the ND and statistical variance of per-sample tally means
+    `means` with statistical standard deviations `stds`, both (N, n_qoi).
+    """
+    means = np.atleast_2d(np.asarray(means, dtype=np.float64))
+    stds = np.atleast_2d(np.asarray(stds, dtype=np.float64))
+    if means.shape[0] < 2:
+        raise ValueError("At least two samples are needed to separate variances.")
+    names = names or [f"qoi{i}" for i in range(means.shape[1])]
+    return TMCResult(names, means.shape[0], means.mean(axis=0), means.var(axis=0, ddof=1), np.mean(stds**2, axis=0))
+
+
+def optimal_histories(nd_var: float, a: float, c0: float, c1: float, objective: str = "mean") -> float:
+    """
+    Active histories per sample minimising the cost of a TMC estimate, for a
+    statistical variance a / H and a per-sample cost c0 + c1 H.
+
+    For `objective="mean"` the variance of the estimated mean, (nd_var + a/H) / N,
+    is targeted. For `objective="nd_std"` it is the variance of the estimated
+    ND variance, which scales as (nd_var + a/H)^2 / N.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'. Expected one of {OBJECTIVES}.")
+    if nd_var <= 0:
+        return math.inf
+    if objective == "mean":
+        return math.sqrt(a * c0 / (nd_var * c1))
+    # Root of nd_var c1 H^2 - a c1 H - 2 a c0 = 0
+    return (a * c1 + math.sqrt((a * c1) ** 2 + 8 * nd_var * c1 * a * c0)) / (2 * nd_var * c1)
+
+
+def samples_for_target(nd_var: float, stat_var: float, objective: str = "mean",
+                       target_se: float | None = None, target_rel_nd_se: float | None = None) -> float:
+    """
+    Samples needed at a given statistical variance per sample, either for a
+    standard error `target_se` of the mean or a relative standard error
+    `target_rel_nd_se` of the ND standard deviation.
+    """
+    total = nd_var + stat_var
+    if objective == "mean":
+        if target_se is None:
+            raise ValueError("The mean objective needs `target_se`.")
+        return math.ceil(total / target_se**2)
+    if target_rel_nd_se is None:
+        raise ValueError("The nd_std objective needs `target_rel_nd_se`.")
+    if nd_var <= 0:
+        return math.inf
+    # SE(sigma_ND) / sigma_ND ~ total / (sigma_ND^2 sqrt(2 (N - 1)))
+    return math.ceil(1 + total**2 / (2 * nd_var**2 * target_rel_nd_se**2))
+
+
+def sample_seed(sample: np.ndarray) -> int:
+    """
+    Deterministic OpenMC seed of a sample, so that every sample has its own
+    random number stream and reruns of a sample reproduce it.
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(sample, dtype=np.float64).tobytes()).digest()
+    return int.from_bytes(digest[:8], "little") % (2**63 - 1) + 1
+
+
+def fast_tmc_settings(sample: np.ndarray, particles: int | None = None, batches: int | None = None) -> dict:
+    """
+    settings.xml overrides of a fast-TMC run of `sample`: its own seed and,
+    optionally, reduced particles per batch and batches (see `run_openmc`).
+    The statistical noise left in each run averages out over the samples
+    and is removed by `separate_variance`.
+    """
+    settings = {"seed": sample_seed(sample)}
+    if particles is not None:
+        settings["particles"] = int(particles)
+    if batches is not None:
+        settings["batches"] = int(batches)
+    return settings
+
+
+def recommend(
+    results: str | Path,
+    settings_xml: str | Path,
+    qoi: str | None = None,
+    objective: str = "nd_std",
+    target_se: float | None = None,
+    target_rel_nd_se: float | None = None,
+    c0: float | None = None,
+    c1: float | None = None,
+    min_particles: int = 100,
+) -> dict:
+    """
+    Recommend the particles per batch of future samples from the results
+    stored so far, for the QoI `qoi` (default the first score).
+
+    Without explicit costs, c0 is the mean time spent generating data and
+    reading tallies and c1 the mean OpenMC time per active history (which
+    attributes OpenMC start-up to tracking, erring on more particles).
+    """
+    data = load_results(results)
+    ok = data["status"] == DONE
+    scores = [str(s) for s in data["attrs"].get("scores", [])]
+    names = scores if len(scores) == data["qoi/mean"].shape[1] else None
+    tmc = separate_variance(data["qoi/mean"][ok], data["qoi/std"][ok], names)
+
+    i = 0 if qoi is None else tmc.names.index(qoi)
+    settings = read_settings(settings_xml)
+    active = settings["batches"] - settings["inactive"]
+
+    # Active histories of each sample, which may differ after earlier recommendations
+    histories = np.full(tmc.n, settings["particles"] * active)
+    if "histories" in data:
+        histories = np.where(data["histories"][ok] > 0, data["histories"][ok], histories)
+    a = float(np.mean(data["qoi/std"][ok, i] ** 2 * histories))
+
+    if c0 is None:
+        c0 = 0.0
+        for stage in ("sampling", "tallies"):
+            if f"timing/{stage}" in data:
+                c0 += float(np.nanmean(data[f"timing/{stage}"][ok]))
+    if c1 is None:
+        if "timing/openmc" not in data:
+            raise ValueError("No OpenMC timings in the results, pass `c1` explicitly.")
+        c1 = float(np.nanmean(data["timing/openmc"][ok] / histories))
+
+    best = optimal_histories(tmc.nd_var[i], a, c0, c1, objective)
+    particles = max(min_particles, math.ceil(best / active)) if math.isfinite(best) else settings["particles"]
+    stat_var = a / (particles * active)
+
+    recommendation = {
+        "qoi": tmc.names[i],
+        "tmc": tmc,
+        "current_particles": settings["particles"],
+        "particles": particles,
+        "c0": c0,
+        "c1": c1,
+    }
+    if target_se is not None or target_rel_nd_se is not None:
+        n = samples_for_target(tmc.nd_var[i], stat_var, objective, target_se, target_rel_nd_se)
+        recommendation["samples"] = n
+        recommendation["remaining"] = max(n - tmc.n, 0)
+        recommendation["cost"] = n * (c0 + c1 * particles * active)
+    return recommendation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", help="Results directory (or file) written by openmc_uq.results")
+    parser.add_argument("--settings", required=True, help="settings.xml used for the samples")
+    parser.add_argument("--qoi", default=None, help="QoI to optimise for (default: the first score)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="nd_std")
+    parser.add_argument("--target-se", type=float, default=None, help="Target standard error of the mean")
+    parser.add_argument("--target-rel-nd-se", type=float, default=None,
+                        help="Target relative standard error of the ND standard deviation")
+    parser.add_argument("--c0", type=float, default=None, help="Fixed cost per sample in seconds")
+    parser.add_argument("--c1", type=float, default=None, help="Cost per active history in seconds")
+    parser.add_argument("--apply", action="store_true", help="Write the recommended particles to --settings")
+    args = parser.parse_args()
+
+    rec = recommend(
+        args.results, args.settings, args.qoi, args.objective,
+        args.target_se, args.target_rel_nd_se, args.c0, args.c1,
+    )
+    print(rec["tmc"].report())
+    print(f"Cost model: {rec['c0']:.3g} s per sample + {rec['c1']:.3g} s per history")
+    print(f"Particles per batch for {rec['qoi']}: {rec['current_particles']} -> {rec['particles']}")
+    if "samples" in rec:
+        print(f"Samples needed: {rec['samples']} ({rec['remaining']} more), about {rec['cost'] / 3600:.3g} hours of run time")
+
+    if args.apply:
+        set_particles(args.settings, rec["particles"])
+        print(f"Updated {args.settings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
-import re
-import h5py
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 import sandy
@@ -10,6 +10,14 @@ from pathlib import Path
 from scipy.linalg import svd
 import xml.etree.ElementTree as ET
 
+from .cache import CacheEntry, ParsedCache, default_cache
+from .covariance import BlockCov, PerturbationLayout
+from .endf_index import find_endf_file, get_endf_index
+from .model_xml import substitute_nuclides
+from .profiling import stage, traced
+from .decomposition import KLBasis, decompose, decompose_blocks, truncation_order
+from .svd_file import write_svd, write_layout, read_layout, read_svd_info
+
 
 def _unique_preserve_order(values: list[str]) -> list[str]:
     """Return unique values in first-seen order."""
@@ -86,78 +94,190 @@ def resolve_nuclides(nuclides, openmc_xml_dir: str | Path) -> list[str]:
 
 def get_nuclide_paths(endf_path: str, nuclides: list[str]) -> list[str]:
     """
-    Pattern-match nuclide names against files in endf_path and return their full paths.
+    Look up nuclides by (Z, A, metastable state) in an index of the files in
+    endf_path and return their full paths (see `endf_index.get_endf_index`).
     Returns an empty string for any nuclide with no match.
     """
     print("Searching for ENDF files...")
 
-    file_list = np.array(os.listdir(endf_path))
-    if len(file_list) == 0:
-        raise FileNotFoundError(f"{endf_path} is empty")
+    # The index is cached, so this does not rescan the directory
+    if not get_endf_index(endf_path):
+        raise FileNotFoundError(f"No ENDF files found in {endf_path}")
 
-    nuclide_paths = []
+    return [find_endf_file(endf_path, nuclide) for nuclide in nuclides]
 
-    for nuclide in nuclides:
-        atomic_sym = "".join(re.findall("[a-zA-Z]+", nuclide))
-        mass_num   = "".join(re.findall(r"\d+", nuclide))
 
-        matches = file_list[
-            np.array([atomic_sym in f for f in file_list]) &
-            np.array([mass_num   in f for f in file_list])
-        ]
+# NJOY parameters used by `process_with_njoy`, part of every parsed-data cache key
+NJOY_PARAMS = {"err": 0.001, "irespr": 0, "temperature": 0.0}
 
-        if len(matches) == 0:
-            print(f"  No files matched for {nuclide}")
-            nuclide_paths.append("")
 
-        elif len(matches) == 1:
-            path = str(Path(endf_path) / matches[0])
-            print(f"  Using {matches[0]} for {nuclide}")
-            nuclide_paths.append(path)
+def _read_single_nuclide(file: str) -> Endf6:
+    endf6 = Endf6.from_file(file)
+    if len(endf6.mat) != 1:
+        raise ValueError(
+            "ENDF file contains multiple nuclides (MAT numbers). "
+            "This function only supports files with a single nuclide."
+        )
+    return endf6
 
-        else:
-            shortest = min(matches, key=len)
-            print(f"  Multiple files matched for {nuclide}: {matches}. Using shortest: {shortest}")
-            nuclide_paths.append(str(Path(endf_path) / shortest))
 
-    return nuclide_paths
+@traced("njoy_errorr")
+def _run_errorr(endf6: Endf6):
+    return endf6.get_errorr(err=NJOY_PARAMS["err"], irespr=NJOY_PARAMS["irespr"])["errorr33"]
+
+
+@traced("njoy_preprocess")
+def _run_njoy(file: str):
+    """Run NJOY on a single-nuclide ENDF file and return the errorr and pendf outputs."""
+    endf6 = _read_single_nuclide(file)
+    error = _run_errorr(endf6)
+    pendf = endf6.get_pendf(err=NJOY_PARAMS["err"], verbose=True)
+
+    return error, pendf
 
 
-def process_with_njoy(nuclide: str, endf_path: str):
+def process_with_njoy(nuclide: str, endf_path: str, cache: ParsedCache | None = None):
     """
     Process an ENDF file with NJOY to produce errorr and pendf outputs.
     The ENDF file must contain exactly one nuclide (MAT number).
-    """
-    file = get_nuclide_paths(endf_path, [nuclide])[0]
-    endf6 = Endf6.from_file(file)
 
-    if len(endf6.mat) != 1:
-        raise ValueError(
-            "ENDF file contains multiple nuclides (MAT numbers). "
-            "This function only supports files with a single nuclide."
-        )
+    If a parsed-data cache is configured (see `cache.default_cache`), NJOY is
+    only run when the cache holds no outputs for this ENDF file.
+    """
+    cache = default_cache() if cache is None else cache
+    if cache is None:
+        return _run_njoy(get_nuclide_paths(endf_path, [nuclide])[0])
 
-    error = endf6.get_errorr(err=0.001, irespr=0)["errorr33"]
-    pendf = endf6.get_pendf(err=0.001, verbose=True)
+    entry = load_processed_data(nuclide, endf_path, cache)
+    error = sandy.errorr.Errorr.from_file(entry.file("errorr"))
+    pendf = sandy.endf6.Endf6.from_file(entry.file("pendf"))
 
     return error, pendf
 
 
-def _replace_in_xml(filepath: str, old: str, new: str) -> None:
-    """Replace all occurrences of `old` with `new` in an XML file, in place."""
-    path = Path(filepath)
-    path.write_text(path.read_text().replace(old, new))
+def get_valid_mts(error, pendf) -> np.ndarray:
+    """Return MT numbers present in both errorr and pendf, excluding MT 451."""
+    mts = np.array([mt for mt in error.mt if mt in pendf.mt])
+    return np.setdiff1d(mts, 451)  # MT 451 contains general info, not a reaction
+
+
+@traced("load_processed_data")
+def load_processed_data(
+    nuclide: str,
+    endf_path: str,
+    cache: ParsedCache,
+    save_path: str | Path | None = None,
+    force_processing: bool = False,
+) -> CacheEntry:
+    """
+    Return the parsed errorr/pendf data of a nuclide from `cache`.
+
+    The entry holds the NJOY tapes, the covariance blocks, energy grid, MT
+    lists and the pendf cross sections. On a miss the tapes are read from
+    `save_path` if they exist there, otherwise NJOY is run (writing the tapes
+    to `save_path` if given), and the result is parsed and stored.
+    """
+    file = get_nuclide_paths(endf_path, [nuclide])[0]
+    key = cache.key(file, **NJOY_PARAMS)
+
+    entry = None if force_processing else cache.get(key)
+    if entry is not None:
+        return entry
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tape_dir = Path(tmp) if save_path is None else Path(save_path).resolve()
+        error_file = tape_dir / f"{nuclide}.error"
+        pendf_file = tape_dir / f"{nuclide}.pendf"
+
+        if error_file.is_file() and pendf_file.is_file() and not force_processing:
+            error = sandy.errorr.Errorr.from_file(error_file)
+            pendf = sandy.endf6.Endf6.from_file(pendf_file)
+        else:
+            error, pendf = _run_njoy(file)
+            error.to_file(error_file)
+            pendf.to_file(pendf_file)
+
+        block_cov = get_block_cov(error)
+        pairs = list(block_cov.blocks)
+        xs = sandy.Xs.from_endf6(pendf).data
+
+        arrays = {
+            "energy_grid": block_cov.energy_grid,
+            "mts": np.array(block_cov.mts),
+            "cov_pairs": np.array(pairs, dtype=int).reshape(-1, 2),
+            "cov_blocks": np.array([block_cov.blocks[p] for p in pairs]).reshape(
+                -1, block_cov.ng, block_cov.ng
+            ),
+            "valid_mts": get_valid_mts(error, pendf),
+            "pendf_energy": xs.index.values,
+            "pendf_mts": np.array(xs.columns.get_level_values("MT")),
+            "pendf_xs": xs.values,
+        }
+        meta = {"nuclide": nuclide, "endf_file": str(file), "mat": int(block_cov.mat), **NJOY_PARAMS}
+
+        if force_processing:
+            shutil.rmtree(cache.cache_dir / key, ignore_errors=True)
+        return cache.put(key, arrays, meta, files={"errorr": error_file, "pendf": pendf_file})
+
+
+def block_cov_from_entry(entry: CacheEntry) -> BlockCov:
+    """Rebuild the block-sparse covariance from a cache entry (blocks stay memory-mapped)."""
+    blocks = {
+        (int(mt), int(mt1)): entry["cov_blocks"][i]
+        for i, (mt, mt1) in enumerate(entry["cov_pairs"])
+    }
+    return BlockCov(entry.meta["mat"], entry["mts"].tolist(), entry["energy_grid"], blocks)
+
+
+def xs_from_entry(entry: CacheEntry) -> sandy.Xs:
+    """Rebuild the pendf cross sections from a cache entry."""
+    columns = pd.MultiIndex.from_arrays(
+        [np.full(entry["pendf_mts"].size, entry.meta["mat"]), entry["pendf_mts"]],
+        names=["MAT", "MT"],
+    )
+    return sandy.Xs(pd.DataFrame(np.array(entry["pendf_xs"]), index=entry["pendf_energy"], columns=columns))
 
 
 def replace_nuclide_material(old_nuclide: str, new_nuclide: str) -> None:
     """Replace a nuclide name in materials.xml."""
-    _replace_in_xml("materials.xml", old_nuclide, new_nuclide)
+    substitute_nuclides("materials.xml", {old_nuclide: new_nuclide})
 
 
 def replace_nuclide_tally(old_nuclide: str, new_nuclide: str) -> None:
     """Replace a nuclide name in tallies.xml."""
-    _replace_in_xml("tallies.xml", old_nuclide, new_nuclide)
+    substitute_nuclides("tallies.xml", {old_nuclide: new_nuclide})
+
+
+def read_settings(settings_xml: str | Path) -> dict[str, int]:
+    """Read the particles, batches and inactive batches of an OpenMC settings.xml."""
+    root = ET.parse(settings_xml).getroot()
+    settings = {}
+    for key in ("particles", "batches", "inactive", "seed"):
+        element = root.find(key)
+        if element is not None and element.text:
+            settings[key] = int(element.text)
+    settings.setdefault("inactive", 0)
+    return settings
+
+
+def update_settings(settings_xml: str | Path, **values) -> None:
+    """
+    Set top-level values of an OpenMC settings.xml in place, e.g.
+    `update_settings("settings.xml", particles=10000, seed=42)`.
+    """
+    tree = ET.parse(settings_xml)
+    root = tree.getroot()
+    for key, value in values.items():
+        element = root.find(key)
+        if element is None:
+            element = ET.SubElement(root, key)
+        element.text = str(value)
+    tree.write(settings_xml, xml_declaration=True, encoding="utf-8")
+
 
+def set_particles(settings_xml: str | Path, particles: int) -> None:
+    """Set the number of particles per batch in settings.xml."""
+    update_settings(settings_xml, particles=int(particles))
 
 
 def check_covariance(endf_file: str) -> bool:
@@ -175,30 +295,46 @@ def check_covariance(endf_file: str) -> bool:
     return True
 
 
-def _build_cov_matrix(error) -> np.ndarray:
-    """Build the full covariance matrix from an errorr object."""
-    eg = pd.IntervalIndex.from_breaks(error.get_energy_grid())
-
-    ix = pd.DataFrame(
-        error.filter_by(listmf=[31, 33]).data.keys(),
-        columns=["MAT", "MF", "MT"]
-    )[["MAT", "MT"]]
-    ix["IMIN"] = ix.index * eg.size
-    ix["IMAX"] = (ix.index + 1) * eg.size
-
-    nsize = ix.shape[0] * eg.size
-    c = np.zeros((nsize, nsize))
+@traced("get_block_cov")
+def get_block_cov(error) -> BlockCov:
+    """Read the MF31/33 covariance blocks of an errorr object into a block-sparse structure."""
+    section_keys = list(error.filter_by(listmf=[31, 33]).data)
+    mat = section_keys[0][0]
+    mts = [mt for _, _, mt in section_keys]
 
-    for mat, mf, mt in error.filter_by(listmf=[31, 33]).data:
+    blocks = {}
+    for _, _, mt in section_keys:
         mf33 = sandy.errorr.read_mf33(error, mat, mt)
         for mt1, cov in mf33["COVS"].items():
-            ivals = ix.query("MAT==@mat & MT==@mt").squeeze()
-            jvals = ix.query("MAT==@mat & MT==@mt1").squeeze()
-            c[ivals.IMIN:ivals.IMAX, jvals.IMIN:jvals.IMAX] = cov
-            if mt != mt1:
-                c[jvals.IMIN:jvals.IMAX, ivals.IMIN:ivals.IMAX] = cov.T
+            if mt1 not in mts:
+                print(f"Skipping covariance between MT{mt} and MT{mt1}: MT{mt1} not in errorr")
+                continue
+            blocks[(mt, mt1)] = cov
+
+    return BlockCov(mat, mts, error.get_energy_grid(), blocks)
+
+
+def get_perturbation_layout(error, pendf=None) -> PerturbationLayout:
+    """
+    Perturbation layout of an errorr object, from its MF31/33 section list and
+    energy grid only (the covariance blocks are not read). With the `pendf`,
+    the perturbed MTs are recorded as well.
+    """
+    section_keys = list(error.filter_by(listmf=[31, 33]).data)
+    mats = {mat for mat, _, _ in section_keys}
+    if len(mats) != 1:
+        raise ValueError(
+            "ENDF file contains multiple nuclides (MAT numbers). "
+            "This function only supports files with a single nuclide."
+        )
+    valid_mts = None if pendf is None else get_valid_mts(error, pendf)
+    return PerturbationLayout(mats.pop(), [mt for _, _, mt in section_keys], error.get_energy_grid(), valid_mts)
+
 
-    return c, ix, eg, mat
+def _build_cov_matrix(error, dtype=np.float64) -> tuple[np.ndarray, BlockCov]:
+    """Build the full covariance matrix from an errorr object."""
+    block_cov = get_block_cov(error)
+    return block_cov.to_dense(dtype), block_cov
 
 
 def _fix_negative_variances(c: np.ndarray) -> np.ndarray:
@@ -213,7 +349,8 @@ def _fix_negative_variances(c: np.ndarray) -> np.ndarray:
     return c
 
 
-def get_cov(error) -> sandy.CategoryCov:
+@traced("get_cov")
+def get_cov(error, dtype=np.float64) -> sandy.CategoryCov:
     """Return the covariance matrix, correcting negative variances if needed."""
     try:
         return error.get_cov()
@@ -223,13 +360,10 @@ def get_cov(error) -> sandy.CategoryCov:
             "Falling back to manual construction with absolute variances."
         )
 
-    c, ix, eg, mat = _build_cov_matrix(error)
+    c, block_cov = _build_cov_matrix(error, dtype)
     c = _fix_negative_variances(c)
 
-    idx = pd.MultiIndex.from_tuples(
-        [(mat, mt, e) for _, (mat, mt) in ix[["MAT", "MT"]].iterrows() for e in eg],
-        names=["MAT", "MT", "E"],
-    )
+    idx = block_cov.index()
 
     return sandy.CategoryCov(c, index=idx, columns=idx)
 
@@ -251,36 +385,82 @@ def svd_expand(cov: np.ndarray, truncation_order: int):
     return u_truncated, s_truncated, vh
 
 
-def get_number_of_dimensions(nuclide: str, endf_path: str, total_var: float = 99.9) -> tuple[int, int]:
-    """Return the number of SVD dimensions needed to capture `total_var`% of variance."""
-    file = get_nuclide_paths(endf_path, [nuclide])[0]
-    endf6 = Endf6.from_file(file)
+@traced("decompose")
+def decompose_cov(
+    block_cov: BlockCov,
+    method: str = "eigh",
+    total_var: float = 99.9,
+    block_diagonal: bool = True,
+) -> KLBasis:
+    """
+    Decompose a block-sparse covariance into a KL basis.
 
-    if len(endf6.mat) != 1:
-        raise ValueError(
-            "ENDF file contains multiple nuclides (MAT numbers). "
-            "This function only supports files with a single nuclide."
-        )
+    With `block_diagonal` the MTs are split into groups without
+    cross-covariance and each group is decomposed separately.
+    """
+    if block_diagonal:
+        return decompose_blocks(block_cov, method=method, total_var=total_var)
 
-    cov = get_cov(endf6.get_errorr(err=0.001, irespr=0)["errorr33"]).data.values
-    u, s, vh = svd(cov, check_finite=False)
+    cov = _fix_negative_variances(block_cov.to_dense())
+    return KLBasis.from_decomposition(decompose(cov, method=method, total_var=total_var))
 
-    n_truncated = np.sum(np.cumsum(s / np.sum(s)) * 100 <= total_var)
-    print(f"Dimension reduced from {s.size} to {n_truncated} for {nuclide}")
 
-    return n_truncated, s.size
+@traced("get_number_of_dimensions")
+def get_number_of_dimensions(
+    nuclide: str,
+    endf_path: str,
+    total_var: float = 99.9,
+    method: str = "eigh",
+    block_diagonal: bool = True,
+    cache: ParsedCache | None = None,
+) -> tuple[int, int]:
+    """
+    Return the number of SVD dimensions needed to capture `total_var`% of
+    variance and the full dimension (`KLBasis.dimension`), as
+    `svd_and_save_error` does. See `decompose_cov` for `method` and
+    `block_diagonal`.
+    """
+    cache = default_cache() if cache is None else cache
+    if cache is not None:
+        block_cov = block_cov_from_entry(load_processed_data(nuclide, endf_path, cache))
+    else:
+        # Only the covariance is needed, so the PENDF reconstruction is skipped
+        endf6 = _read_single_nuclide(get_nuclide_paths(endf_path, [nuclide])[0])
+        block_cov = get_block_cov(_run_errorr(endf6))
 
+    basis = decompose_cov(block_cov, method, total_var, block_diagonal)
 
+    n_truncated = basis.n_truncated(total_var)
+    print(f"Dimension reduced from {basis.dimension} (matrix size {basis.size}) to {n_truncated} for {nuclide}")
+
+    return n_truncated, basis.dimension
+
+
+@traced("svd_and_save_error")
 def svd_and_save_error(
     nuclide: str,
     endf_path: str,
     save_path: str,
     force_processing: bool = False,
     total_var: float = 99.9,
+    method: str = "eigh",
+    block_diagonal: bool = True,
+    truncate_storage: bool = True,
+    dtype=np.float64,
+    compression: str | None = None,
+    cache: ParsedCache | None = None,
 ) -> tuple[int, int]:
     """
     Process a nuclide's ENDF file: compute or load errorr/pendf outputs and SVD,
-    then return the truncated and full SVD dimension counts.
+    then return the truncated and full SVD dimension counts (see
+    `KLBasis.dimension` and `decomposition.truncation_order`).
+
+    `method` selects the decomposition backend and `block_diagonal` whether
+    independent MT groups are decomposed separately (see `decompose_cov`).
+    With `truncate_storage` only the basis needed for `total_var` is written,
+    optionally as `dtype` (e.g. float32) with HDF5 `compression`
+    (see `svd_file.write_svd`). Parsed errorr/pendf data is taken from the
+    parsed-data cache when one is configured (see `cache.default_cache`).
     """
     save_path = Path(save_path).resolve()
     save_path.mkdir(exist_ok=True)
@@ -290,39 +470,58 @@ def svd_and_save_error(
     svd_file   = save_path / f"{nuclide}_SVD.h5"
 
     # Load or compute errorr/pendf
-    if error_file.is_file() and pendf_file.is_file() and not force_processing:
-        error = sandy.errorr.Errorr.from_file(error_file)
-        pendf = sandy.endf6.Endf6.from_file(pendf_file)
+    cache = default_cache() if cache is None else cache
+    if cache is not None:
+        entry = load_processed_data(nuclide, endf_path, cache, save_path, force_processing)
+        # The sampling step reads the tapes from save_path
+        for name, target in (("errorr", error_file), ("pendf", pendf_file)):
+            if not target.is_file():
+                shutil.copyfile(entry.file(name), target)
+        mts = np.asarray(entry["valid_mts"])
     else:
-        error, pendf = process_with_njoy(nuclide, endf_path)
-        error.to_file(error_file)
-        pendf.to_file(pendf_file)
+        entry = None
+        if error_file.is_file() and pendf_file.is_file() and not force_processing:
+            error = sandy.errorr.Errorr.from_file(error_file)
+            pendf = sandy.endf6.Endf6.from_file(pendf_file)
+        else:
+            error, pendf = process_with_njoy(nuclide, endf_path, cache)
+            error.to_file(error_file)
+            pendf.to_file(pendf_file)
+        mts = get_valid_mts(error, pendf)
 
-    # Load or compute SVD
+    # Load or compute SVD. A stored file is reused if it holds enough components
+    n_truncated = -1
     if svd_file.is_file() and not force_processing:
-        with h5py.File(svd_file, "r") as hf:
-            u  = np.array(hf["u"])
-            s  = np.array(hf["s"])
-            vh = np.array(hf["vh"])
-    else:
-        print("Performing SVD...")
-        cov = get_cov(error).data.values
-        u, s, vh = svd(cov, check_finite=False)
-
-        with h5py.File(svd_file, "w") as hf:
-            hf.create_dataset("u",  data=u)
-            hf.create_dataset("s",  data=s)
-            hf.create_dataset("vh", data=vh)
-
-    n_truncated = np.sum(np.cumsum(s / np.sum(s)) * 100 < total_var)
-
-    # Determine valid MTs present in both error and pendf
-    mts = np.array([mt for mt in error.mt if mt in pendf.mt])
-    mts = np.setdiff1d(mts, 451)  # MT 451 contains general info, not a reaction
+        info = read_svd_info(svd_file)
+        s, total, size, dimension = info["s"], info["total"], info["size"], info["dimension"]
+        n_truncated = truncation_order(s, total, total_var)
+        n_needed = n_truncated if truncate_storage else s.size
+        if info["n_stored"] < n_needed:
+            print(f"{svd_file} stores too few components, recomputing")
+            n_truncated = -1
+
+    if n_truncated < 0:
+        print(f"Performing SVD ({method})...")
+        block_cov = block_cov_from_entry(entry) if entry is not None else get_block_cov(error)
+        basis = decompose_cov(block_cov, method, total_var, block_diagonal)
+        s, total, size, dimension = basis.s, basis.total, basis.size, basis.dimension
+        n_truncated = truncation_order(s, total, total_var)
+
+        n_keep = n_truncated if truncate_storage else None
+        with stage("write_svd"):
+            write_svd(svd_file, basis, n_keep=n_keep, dtype=dtype, compression=compression,
+                      layout=block_cov.layout(mts))
+    elif read_layout(svd_file) is None:
+        # SVD files from before the layout was stored with them
+        if entry is not None:
+            layout = block_cov_from_entry(entry).layout(mts)
+        else:
+            layout = get_perturbation_layout(error, pendf)
+        write_layout(svd_file, layout)
 
     reaction_names = [openmc.data.reaction.REACTION_NAME[mt] for mt in mts]
     print(f"Sampling MTs: {mts}")
     print(f"Reactions:    {reaction_names}")
-    print(f"Dimension reduced from {s.size} to {n_truncated} for {nuclide}")
+    print(f"Dimension reduced from {dimension} (matrix size {size}) to {n_truncated} for {nuclide}")
 
-    return n_truncated, s.size
+    return n_truncated, dimension
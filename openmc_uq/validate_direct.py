@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Validate direct HDF5 sampling against the NJOY sampling path.
+
+For each nuclide a random KL sample is generated with both modes of
+`sample_nuclide_KL`, along with an unperturbed NJOY reference (a zero sample).
+The cross sections are compared per MT on the NJOY energy grid, both as
+absolute values and as perturbation ratios (perturbed / unperturbed), the
+latter removing differences in how the reference library was processed.
+
+    python3 -m openmc_uq.validate_direct config.json --nuclides Li6 W184
+"""
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+
+import openmc.data
+
+from .direct import load_reference, perturb_incident_neutron
+from .sample_nuclide import sample_nuclide_KL
+from .svd_file import read_layout
+
+
+def _common_temperature(*datasets) -> str:
+    temperatures = set.intersection(*[set(d.temperatures) for d in datasets])
+    if len(temperatures) == 0:
+        raise ValueError("The libraries being compared have no temperature in common.")
+    return sorted(temperatures)[0]
+
+
+def _max_rel_diff(a: np.ndarray, b: np.ndarray) -> float:
+    mask = np.abs(a) > 0
+    if not np.any(mask):
+        return 0.0
+    return float(np.max(np.abs(b[mask] - a[mask]) / np.abs(a[mask])))
+
+
+def compare_libraries(
+    njoy_h5: str | Path,
+    direct_h5: str | Path,
+    njoy_nominal_h5: str | Path,
+    reference: openmc.data.IncidentNeutron,
+) -> dict[int, dict[str, float]]:
+    """
+    Compare an NJOY and a direct sample, returning the maximum relative
+    difference of the cross section (`xs`) and of the perturbation ratio
+    (`ratio`) for each MT present in both.
+    """
+    njoy = openmc.data.IncidentNeutron.from_hdf5(njoy_h5)
+    direct = openmc.data.IncidentNeutron.from_hdf5(direct_h5)
+    nominal = openmc.data.IncidentNeutron.from_hdf5(njoy_nominal_h5)
+
+    T = _common_temperature(njoy, direct, nominal, reference)
+    energy = njoy.energy[T]
+
+    results = {}
+    for mt in sorted(set(njoy.reactions) & set(direct.reactions) & set(reference.reactions)):
+        xs_njoy = njoy.reactions[mt].xs[T](energy)
+        xs_direct = direct.reactions[mt].xs[T](energy)
+        xs_nominal = nominal.reactions[mt].xs[T](energy)
+        xs_reference = reference.reactions[mt].xs[T](energy)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio_njoy = np.where(xs_nominal > 0, xs_njoy / xs_nominal, 1.0)
+            ratio_direct = np.where(xs_reference > 0, xs_direct / xs_reference, 1.0)
+
+        results[mt] = {
+            "xs": _max_rel_diff(xs_njoy, xs_direct),
+            "ratio": _max_rel_diff(ratio_njoy, ratio_direct),
+        }
+
+    return results
+
+
+def check_redundant_factors(
+    reference: openmc.data.IncidentNeutron,
+    energy_grid: np.ndarray,
+    factors: dict[int, np.ndarray],
+) -> dict[int, float]:
+    """
+    Check that factors of redundant MTs (e.g. MT1 and MT4 in the same
+    covariance) are dropped as in the NJOY path: perturbing with all
+    `factors` must give the same data as perturbing without the factors of
+    redundant MTs that have components. Returns the maximum relative
+    difference per MT.
+    """
+    partial = {
+        mt: f for mt, f in factors.items()
+        if mt in reference.reactions and (
+            not reference.reactions[mt].redundant
+            or all(c == mt for c in reference.get_reaction_components(mt))
+        )
+    }
+    full = perturb_incident_neutron(reference, energy_grid, factors)
+    expected = perturb_incident_neutron(reference, energy_grid, partial)
+
+    T = _common_temperature(full, expected)
+    energy = expected.energy[T]
+    return {
+        mt: _max_rel_diff(expected.reactions[mt].xs[T](energy), full.reactions[mt].xs[T](energy))
+        for mt in sorted(expected.reactions)
+    }
+
+
+def validate_direct_sampling(
+    nuclides: list[str],
+    dims: list[int],
+    endf_path: str,
+    pre_processed_path: str,
+    cross_sections_xml: str,
+    n_samples: int = 1,
+    seed: int = 0,
+    out_dir: str | Path = "direct_validation",
+) -> dict[str, list[dict]]:
+    """
+    Run both sampling modes for each nuclide and compare the results. For
+    nuclides whose covariance has both MT1 and MT4, the "redundant" entry
+    also holds the `check_redundant_factors` differences of each sample.
+    """
+    rng = np.random.default_rng(seed)
+    check_rng = np.random.default_rng(seed + 1)
+    out_dir = Path(out_dir).resolve()
+    out_dir.mkdir(exist_ok=True)
+
+    results = {}
+    for nuclide, n_trunc in zip(nuclides, dims):
+        nuc_dir = out_dir / nuclide
+        nuc_dir.mkdir(exist_ok=True)
+        reference = load_reference(nuclide, cross_sections_xml)
+        layout = read_layout(Path(pre_processed_path) / f"{nuclide}_SVD.h5")
+
+        nominal = sample_nuclide_KL(
+            nuclide, endf_path, pre_processed_path, n_trunc, np.zeros(n_trunc),
+            out_dir=nuc_dir / "njoy_nominal",
+        )
+
+        results[nuclide] = []
+        for i in range(n_samples):
+            sample = rng.standard_normal(n_trunc)
+            njoy = sample_nuclide_KL(
+                nuclide, endf_path, pre_processed_path, n_trunc, sample,
+                out_dir=nuc_dir / f"njoy_{i}",
+            )
+            direct = sample_nuclide_KL(
+                nuclide, endf_path, pre_processed_path, n_trunc, sample,
+                mode="direct", cross_sections_xml=cross_sections_xml,
+                out_dir=nuc_dir / f"direct_{i}",
+            )
+            comparison = compare_libraries(njoy.path, direct.path, nominal.path, reference)
+            if layout is not None and {1, 4} <= set(layout.mts):
+                factors = layout.factor_dict(layout.factors(check_rng.normal(0.0, 0.05, layout.size)))
+                comparison["redundant"] = check_redundant_factors(reference, layout.energy_grid, factors)
+            results[nuclide].append(comparison)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_file", help="Solver config (as written for run_model.py)")
+    parser.add_argument("--nuclides", nargs="+", default=None, help="Subset of nuclides to validate")
+    parser.add_argument("--samples", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Maximum accepted relative difference of perturbation ratios")
+    args = parser.parse_args()
+
+    with open(args.input_file) as handle:
+        inputs_dict = json.load(handle)
+
+    nuclides = inputs_dict["nuclides"]
+    dims = dict(zip(nuclides, inputs_dict["dimensions"]["dims"]))
+    if args.nuclides is not None:
+        nuclides = args.nuclides
+
+    results = validate_direct_sampling(
+        nuclides,
+        [dims[nuc] for nuc in nuclides],
+        inputs_dict["endf_dir"],
+        inputs_dict["pre_processed_dir"],
+        inputs_dict["cross_section_path"],
+        n_samples=args.samples,
+        seed=args.seed,
+    )
+
+    failed = False
+    for nuclide, samples in results.items():
+        for i, per_mt in enumerate(samples):
+            redundant = per_mt.pop("redundant", None)
+            if redundant is not None:
+                worst = max(redundant.values(), default=0.0)
+                status = "OK" if worst <= 1e-12 else "FAIL"
+                failed |= status == "FAIL"
+                print(f"{nuclide:>8} sample {i} MT1+MT4 redundant factors dropped: max diff {worst:.3e}  {status}")
+            for mt, diff in per_mt.items():
+                status = "OK" if diff["ratio"] <= args.tolerance else "FAIL"
+                failed |= status == "FAIL"
+                print(
+                    f"{nuclide:>8} sample {i} MT{mt:<4} "
+                    f"xs diff {diff['xs']:.3e}  ratio diff {diff['ratio']:.3e}  {status}"
+                )
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ kwargs = {
     'name': 'openmc_uq',
     'version': '0.0.1',
     'packages': find_packages(include=['openmc_uq']),
+    'install_requires': ['threadpoolctl'],
     'author': 'Ander Gray',
     'author_email': 'ander.gray@ukaea.uk',
     'license' : 'MIT',
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from openmc_uq.covariance import BlockCov
+from openmc_uq.decomposition import METHODS, decompose, decompose_blocks
+
+
+def spd_matrix(n: int, decay: float = 8.0, seed: int = 0) -> np.ndarray:
+    """Random SPD matrix with an exponentially decaying spectrum."""
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(rng.standard_normal((n, n)))
+    return (q * np.exp(-np.arange(n) / decay)) @ q.T
+
+
+def block_cov(ng: int = 6, seed: int = 1) -> BlockCov:
+    """Covariance of four MTs: MT 2 and 4 correlated, MT 102 independent, MT 51 without variance."""
+    rng = np.random.default_rng(seed)
+    c = spd_matrix(3 * ng, decay=4.0, seed=seed)
+    blocks = {
+        (2, 2): c[:ng, :ng],
+        (2, 4): c[:ng, ng:2 * ng],
+        (4, 4): c[ng:2 * ng, ng:2 * ng],
+        (51, 51): np.zeros((ng, ng)),
+        (102, 102): c[2 * ng:, 2 * ng:] + np.diag(rng.uniform(0.1, 1.0, ng)),
+    }
+    return BlockCov(9228, [2, 4, 51, 102], np.logspace(-5, 7, ng + 1), blocks)
+
+
+@pytest.mark.parametrize("total_var", [90.0, 99.0, 99.9])
+def test_backends_agree_on_spd(total_var):
+    cov = spd_matrix(300)
+    decs = {method: decompose(cov, method=method, total_var=total_var, seed=0, verbose=False) for method in METHODS}
+
+    reference = decs["eigh"]
+    n = reference.n_truncated(total_var)
+    assert n > 1
+    for method, dec in decs.items():
+        assert dec.n_truncated(total_var) == n, method
+        assert dec.total == pytest.approx(np.trace(cov), rel=1e-10), method
+        assert dec.error_bound == pytest.approx(reference.error_bound, rel=1e-6), method
+        np.testing.assert_allclose(dec.s[:n], reference.s[:n], rtol=1e-8, err_msg=method)
+
+
+def test_error_bound_is_truncation_residual():
+    cov = spd_matrix(100)
+    dec = decompose(cov, method="eigh", total_var=99.0, verbose=False)
+    n = dec.n_truncated(99.0)
+    residual = cov - (dec.u[:, :n] * dec.s[:n]) @ dec.u[:, :n].T
+    assert dec.error_bound == pytest.approx(np.linalg.norm(residual), rel=1e-8)
+
+
+@pytest.mark.parametrize("method", ["full", "eigh"])
+def test_blocks_expand_to_covariance(method):
+    cov = block_cov()
+    basis = decompose_blocks(cov, method=method, total_var=99.9)
+
+    # Zero-variance MT 51 is dropped from the basis
+    assert basis.dimension == cov.size - cov.ng
+    assert basis.s.size == basis.dimension
+
+    # Columns of U diag(sqrt(s)), whose outer product is the covariance
+    factor = basis.expand(np.eye(basis.s.size))
+    np.testing.assert_allclose(factor @ factor.T, cov.to_dense(), atol=1e-12)
+
+
+def test_truncated_blocks_match_dense_truncation():
+    cov = block_cov()
+    basis = decompose_blocks(cov, method="eigh", total_var=99.0)
+    dense = decompose(cov.to_dense(), method="eigh", total_var=99.0, verbose=False)
+
+    n = basis.n_truncated(99.0)
+    assert n == dense.n_truncated(99.0)
+    np.testing.assert_allclose(basis.s[:n], dense.s[:n], rtol=1e-10)
+    assert basis.error_bound == pytest.approx(dense.error_bound, rel=1e-6)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from openmc_uq.statistics import P2Quantile, RunningMoments
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    # Skewed, correlated and offset far from zero, where naive sums lose precision
+    x = rng.gamma(2.0, 1.0, size=(2000, 3))
+    x[:, 1] += 0.5 * x[:, 0]
+    return 1e6 + x
+
+
+def assert_moments(moments, x):
+    assert moments.n == x.shape[0]
+    np.testing.assert_allclose(moments.mean, x.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(moments.variance, x.var(axis=0, ddof=1), rtol=1e-8)
+    np.testing.assert_allclose(moments.covariance, np.cov(x, rowvar=False), rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(moments.skewness, stats.skew(x, axis=0), rtol=1e-6)
+    np.testing.assert_allclose(moments.kurtosis, stats.kurtosis(x, axis=0), rtol=1e-6)
+    np.testing.assert_allclose(moments.standard_error, x.std(axis=0, ddof=1) / np.sqrt(x.shape[0]), rtol=1e-8)
+
+
+def test_welford_updates(samples):
+    moments = RunningMoments(samples.shape[1])
+    for x in samples:
+        moments.update(x)
+    assert_moments(moments, samples)
+
+
+def test_block_updates(samples):
+    moments = RunningMoments(samples.shape[1])
+    for block in np.array_split(samples, [1, 7, 500, 501, 1300]):
+        moments.update(block)
+    assert_moments(moments, samples)
+
+
+def test_merge(samples):
+    a = RunningMoments.from_samples(samples[:700])
+    b = RunningMoments(samples.shape[1])
+    for x in samples[700:]:
+        b.update(x)
+    a.merge(b)
+    assert_moments(a, samples)
+
+    empty = RunningMoments(samples.shape[1])
+    empty.merge(a)
+    assert_moments(empty, samples)
+
+
+def test_too_few_samples():
+    moments = RunningMoments(2)
+    moments.update(np.array([1.0, 2.0]))
+    assert np.all(np.isnan(moments.variance))
+    assert np.all(np.isnan(moments.covariance))
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+def test_p2_quantile(samples, p):
+    quantile = P2Quantile(p)
+    for x in samples[:, 0]:
+        quantile.update(x)
+    exact = np.quantile(samples[:, 0], p)
+    assert quantile.value == pytest.approx(exact, abs=0.05 * samples[:, 0].std())
@@ -0,0 +1,128 @@
+import h5py
+import numpy as np
+import pytest
+
+from openmc_uq.covariance import PerturbationLayout
+from openmc_uq.decomposition import decompose_blocks
+from openmc_uq.svd_file import (
+    FORMAT_VERSION,
+    migrate_svd_file,
+    read_kl_basis,
+    read_layout,
+    read_svd_info,
+    write_svd,
+)
+
+from test_decomposition import block_cov
+
+TOTAL_VAR = 99.0
+
+
+@pytest.fixture
+def basis():
+    return decompose_blocks(block_cov(), method="eigh", total_var=TOTAL_VAR)
+
+
+def dense_u(basis) -> np.ndarray:
+    """Eigenvectors of every component as columns of the full matrix."""
+    u = np.zeros((basis.size, basis.s.size))
+    for b, (rows, block_u) in enumerate(zip(basis.rows, basis.u)):
+        u[np.ix_(rows, np.flatnonzero(basis.component_block == b)[:block_u.shape[1]])] = block_u
+    return u
+
+
+def write_v1(path, basis):
+    """Contiguous u, s and vh of the full SVD, without metadata."""
+    # The SVD of the whole matrix also has the zero singular values of the dropped rows
+    n_zero = basis.size - basis.s.size
+    u = np.hstack([dense_u(basis), np.zeros((basis.size, n_zero))])
+    with h5py.File(path, "w") as hf:
+        hf.create_dataset("u", data=u)
+        hf.create_dataset("s", data=np.concatenate([basis.s, np.zeros(n_zero)]))
+        hf.create_dataset("vh", data=u.T)
+
+
+def write_v2(path, basis, n_keep):
+    """Truncated, column-chunked u of the full matrix and metadata attributes."""
+    with h5py.File(path, "w") as hf:
+        hf.attrs["format_version"] = 2
+        hf.attrs["method"] = basis.method
+        hf.attrs["size"] = basis.size
+        hf.attrs["total"] = basis.total
+        hf.attrs["error_bound"] = basis.error_bound
+        hf.create_dataset("u", data=dense_u(basis)[:, :n_keep], chunks=(basis.size, 1))
+        hf.create_dataset("s", data=basis.s)
+
+
+def write_v3(path, basis, n_keep):
+    """Format 4 without the layout group."""
+    write_svd(path, basis, n_keep=n_keep)
+    with h5py.File(path, "a") as hf:
+        hf.attrs["format_version"] = 3
+
+
+def assert_same_expansion(a, b, n):
+    z = np.random.default_rng(0).standard_normal((n, 5))
+    np.testing.assert_allclose(a.truncate(n).expand(z), b.expand(z), atol=1e-12)
+
+
+def test_round_trip(tmp_path, basis):
+    cov = block_cov()
+    layout = cov.layout([2, 4, 102])
+    n = basis.n_truncated(TOTAL_VAR)
+    path = tmp_path / "U235_SVD.h5"
+    write_svd(path, basis, n_keep=n, layout=layout)
+
+    info = read_svd_info(path)
+    assert info["format_version"] == FORMAT_VERSION
+    assert info["n_stored"] == n
+    assert info["size"] == basis.size
+    assert info["dimension"] == basis.dimension
+    np.testing.assert_array_equal(info["s"], basis.s)
+
+    read = read_kl_basis(path, n)
+    assert read.total == basis.total
+    assert read.error_bound == basis.error_bound
+    assert_same_expansion(basis, read, n)
+
+    stored = read_layout(path)
+    assert isinstance(stored, PerturbationLayout)
+    assert (stored.mat, stored.mts) == (layout.mat, layout.mts)
+    np.testing.assert_array_equal(stored.energy_grid, layout.energy_grid)
+
+    with pytest.raises(ValueError):
+        read_kl_basis(path, n + 1)
+
+
+def test_float32_storage(tmp_path, basis):
+    n = basis.n_truncated(TOTAL_VAR)
+    path = tmp_path / "U235_SVD.h5"
+    write_svd(path, basis, n_keep=n, dtype=np.float32, compression="gzip")
+
+    z = np.random.default_rng(0).standard_normal(n)
+    np.testing.assert_allclose(read_kl_basis(path, n).expand(z), basis.truncate(n).expand(z), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("version", [1, 2, 3])
+def test_migrate(tmp_path, basis, version):
+    n = basis.n_truncated(TOTAL_VAR)
+    path = tmp_path / "U235_SVD.h5"
+    if version == 1:
+        write_v1(path, basis)
+    elif version == 2:
+        write_v2(path, basis, n + 2)
+    else:
+        write_v3(path, basis, n + 2)
+
+    # Old files are read as they are
+    assert read_svd_info(path)["format_version"] == version
+    assert_same_expansion(basis, read_kl_basis(path, n), n)
+
+    migrate_svd_file(path, total_var=TOTAL_VAR)
+
+    info = read_svd_info(path)
+    assert info["format_version"] == FORMAT_VERSION
+    assert info["n_stored"] == n
+    # The whole spectrum is kept, so truncation orders can still be recomputed
+    np.testing.assert_array_equal(info["s"][:basis.s.size], basis.s)
+    assert_same_expansion(basis, read_kl_basis(path, n), n)